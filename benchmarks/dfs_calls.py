@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Latency benchmark of the DFS clients.
+
+Compare the mean time of the calls of dfs.exists() and dfs.read() on a small
+file with the command line client, which starts a JVM at each call, and with
+the WebHDFS client, which keeps its HTTP connections alive. The benchmark
+needs a Hadoop installation and the address of the HTTP server of its
+NameNode:
+
+    $ python dfs_calls.py namenode:50070 /path/to/small/file
+"""
+__docformat__ = "restructuredtext en"
+
+## Copyright (c) 2010 Emmanuel Goossaert 
+##
+## This file is part of Prince, an extra-light Python module to run
+## MapReduce tasks in the Hadoop framework. MapReduce is a patented
+## software framework introduced by Google, and Hadoop is a registered
+## trademark of the Apache Software Foundation.
+##
+## Prince is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## Prince is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Prince.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import time
+
+from prince import dfs
+
+
+def measure(client, filename, nb_calls):
+    """Return the mean time in milliseconds of exists() and read() calls"""
+    dfs.set_client(client)
+    times = []
+    for call in [dfs.exists, dfs.read]:
+        start = time.time()
+        for i in xrange(nb_calls):
+            # Measure the calls to the DFS, not the cache of the metadata
+            dfs.invalidate()
+            call(filename)
+        times.append((time.time() - start) * 1000.0 / nb_calls)
+    return times
+
+
+if __name__ == "__main__":
+    address  = sys.argv[1]
+    filename = sys.argv[2]
+    nb_calls = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    for (name, client) in [('command line', dfs.CommandClient()),
+                           ('webhdfs', dfs.WebHDFSClient(address))]:
+        (exists, read) = measure(client, filename, nb_calls)
+        print '%s: exists %.1f ms, read %.1f ms per call' % (name, exists, read)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Throughput benchmark of the bulk transfers of the DFS.
+
+Compare the time to read the part files of an output at once with
+dfs.read(), and in parallel with dfs.read_many() for several numbers of
+threads. The benchmark needs a Hadoop installation, and the address of
+the HTTP server of its NameNode to use the WebHDFS client:
+
+    $ python dfs_transfers.py 'output/part-*' [namenode:50070]
+"""
+__docformat__ = "restructuredtext en"
+
+## Copyright (c) 2010 Emmanuel Goossaert 
+##
+## This file is part of Prince, an extra-light Python module to run
+## MapReduce tasks in the Hadoop framework. MapReduce is a patented
+## software framework introduced by Google, and Hadoop is a registered
+## trademark of the Apache Software Foundation.
+##
+## Prince is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## Prince is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Prince.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import time
+
+import prince
+from prince import dfs
+
+
+def measure(pattern, threads):
+    """Return the time in seconds to read the files, in parallel if threads"""
+    start = time.time()
+    if threads:
+        for (path, content) in dfs.read_many(pattern, threads):
+            pass
+    else:
+        dfs.read(pattern)
+    return time.time() - start
+
+
+if __name__ == "__main__":
+    pattern = sys.argv[1]
+    if len(sys.argv) > 2:
+        prince.config.webhdfs_address = sys.argv[2]
+    print 'read: %.2f s' % measure(pattern, None)
+    for threads in [1, 4, 16]:
+        print 'read_many with %d threads: %.2f s' % (threads, measure(pattern, threads))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Throughput benchmark of the output of the mapper and reducer tasks.
+
+Compare the number of lines written per second by the former output, which
+printed each item, with the buffered job.OutputWriter, for items with
+integer values and for items with string values.
+"""
+__docformat__ = "restructuredtext en"
+
+## Copyright (c) 2010 Emmanuel Goossaert 
+##
+## This file is part of Prince, an extra-light Python module to run
+## MapReduce tasks in the Hadoop framework. MapReduce is a patented
+## software framework introduced by Google, and Hadoop is a registered
+## trademark of the Apache Software Foundation.
+##
+## Prince is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## Prince is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Prince.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import time
+
+from prince import job
+
+
+def output_print(pairs, separator='\t'):
+    """Former output: one formatted print per item"""
+    for (key, value) in pairs:
+        print '%s%s%s' % (str(key), separator, str(value).rstrip())
+
+
+def output_writer(pairs, separator='\t'):
+    """Buffered output with job.OutputWriter"""
+    writer = job.OutputWriter(sys.stdout, separator)
+    writer.write_pairs(pairs)
+    writer.close()
+
+
+def measure(output, pairs):
+    """Return the number of lines per second written by an output method"""
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        start = time.time()
+        output(pairs)
+        duration = time.time() - start
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return len(pairs) / duration
+
+
+if __name__ == "__main__":
+    nb_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    datasets = [('int values', [('word%d' % (i % 1000), 1) for i in xrange(nb_lines)]),
+                ('str values', [('word%d' % (i % 1000), 'value %d' % i) for i in xrange(nb_lines)])]
+    for (name, pairs) in datasets:
+        before = measure(output_print, pairs)
+        after  = measure(output_writer, pairs)
+        print '%s: print %.0f lines/s, OutputWriter %.0f lines/s (x%.2f)' % (name, before, after, after / before)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+Startup latency benchmark of the streaming tasks.
+
+Hadoop launches one Python process per task, so the time spent before the
+first record is read is paid once per task. Compare the mean startup time of
+an empty interpreter, of a task of a reference version of prince, such as
+the baseline of the repository, started as ``python -m <module> --pmapper
+<function>``, and of a task of this version started through the lean entry
+point ``python -m prince.task --pmapper <module>:<function>``. Both packages
+are compiled beforehand, as the tasks following the first one on a node find
+their bytecode. The reference version may need $HADOOP_HOME to be set:
+
+    $ git archive <commit> prince | tar -x -C /tmp/reference
+    $ python startup.py /tmp/reference [nb_runs] [nb_tasks]
+"""
+__docformat__ = "restructuredtext en"
+
+## Copyright (c) 2010 Emmanuel Goossaert 
+##
+## This file is part of Prince, an extra-light Python module to run
+## MapReduce tasks in the Hadoop framework. MapReduce is a patented
+## software framework introduced by Google, and Hadoop is a registered
+## trademark of the Apache Software Foundation.
+##
+## Prince is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## Prince is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Prince.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import compileall
+import subprocess
+import sys
+import tempfile
+import time
+
+
+CALLER = '''import prince
+
+def startup_mapper(key, value):
+    yield key, value
+
+if __name__ == "__main__":
+    prince.init()
+'''
+
+
+def measure(command, nb_runs, env, cwd):
+    """Return the mean wall time in milliseconds of a command with empty input"""
+    devnull = open(os.devnull, 'r+')
+    try:
+        start = time.time()
+        for i in xrange(nb_runs):
+            subprocess.check_call(command, stdin=devnull, stdout=devnull, env=env, cwd=cwd)
+        duration = time.time() - start
+    finally:
+        devnull.close()
+    return duration * 1000.0 / nb_runs
+
+
+if __name__ == "__main__":
+    reference = sys.argv[1]
+    nb_runs  = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    nb_tasks = int(sys.argv[3]) if len(sys.argv) > 3 else 10000
+    current = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    directory = tempfile.mkdtemp()
+    try:
+        file_caller = open(os.path.join(directory, 'startup_caller.py'), 'w')
+        file_caller.write(CALLER)
+        file_caller.close()
+        commands = [('empty interpreter', [sys.executable, '-c', 'pass'], None)]
+        for (name, path, arguments) in [('reference, python -m module', reference,
+                                         ['-m', 'startup_caller', '--pmapper', 'startup_mapper']),
+                                        ('current, python -m prince.task', current,
+                                         ['-m', 'prince.task', '--pmapper', 'startup_caller:startup_mapper'])]:
+            path_package = os.path.join(directory, name.split(',')[0])
+            shutil.copytree(os.path.join(path, 'prince'), os.path.join(path_package, 'prince'))
+            compileall.compile_dir(path_package, quiet=True)
+            env = dict(os.environ)
+            env['PYTHONPATH'] = os.pathsep.join([path_package, directory])
+            commands.append((name, [sys.executable] + arguments, env))
+        times = [(name, measure(command, nb_runs, env, directory)) for (name, command, env) in commands]
+    finally:
+        shutil.rmtree(directory)
+    for (name, mean) in times:
+        print '%s: %.1f ms per task' % (name, mean)
+    saving = times[1][1] - times[2][1]
+    print 'prince.task saves %.1f ms per task, %.1f s over %d tasks' % (saving, saving * nb_tasks / 1000.0, nb_tasks)
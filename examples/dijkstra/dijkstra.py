@@ -45,23 +45,30 @@ def node_info(value):
         return (None, None, None)
 
 
-def frontier_mapper(key, value):
+class FrontierMapper(prince.Task):
     """Expand the frontier of one hop."""
-    (node, d_previous, d_current) = node_info(value)
-    if node != None:
-        yield node, '%d %d' % (d_current, d_current) # reinject itself
-        if d_current != d_previous: # expand only if distance has changed
-            graph = read_graph(prince.get_parameters('graph'))
-            for node_adjacent in graph[node]:
-                yield node_adjacent, '%d %d' % (sys.maxint, d_current + 1)
 
+    def setup(self):
+        """Load the graph once for the whole mapper task"""
+        # The graph is parsed once per node and memory-mapped by the tasks
+        self.graph = prince.sidedata.adjacency(prince.params.graph)
+
+    def map(self, key, value):
+        (node, d_previous, d_current) = node_info(value)
+        if node != None:
+            yield node, (d_current, d_current) # reinject itself
+            if d_current != d_previous: # expand only if distance has changed
+                for node_adjacent in self.graph[node]:
+                    yield node_adjacent, (sys.maxint, d_current + 1)
 
-def frontier_reducer(node, values):
+
+@prince.reiterable_reducer()
+def frontier_reducer(node, distances):
     """Keep the minimum to follow Dijkstra's algorithm"""
     try:
-        distances = [v for v in values]
-        d_previous = min([int(d.split()[0]) for d in distances])
-        d_current  = min([int(d.split()[1]) for d in distances])
+        # The distances are iterated over twice without being copied
+        d_previous = min(d[0] for d in distances)
+        d_current  = min(d[1] for d in distances)
         yield node, '%d %d' % (d_previous, d_current)
     except ValueError:
         pass
@@ -78,26 +85,13 @@ def term_mapper(key, value):
 def term_reducer(key, changed):
     """Check whether any of the distances have changed"""
     try:
-        if any(int(c) for c in changed):
+        if any(changed):
             return 0, 0 # must perform another iteration
     except ValueError:
         pass # the algorithm is stopped in case of error
     return 1, 1
 
 
-def read_graph(filename):
-    """Create a file with only the starting node of the graph."""
-    with open(filename, 'r') as file:
-        # Existence of the file voluntarily not tested to help debugging
-        adlists = [line.split(None, 1) for line in file]
-    graph = {}
-    for adlist in adlists:
-        node_source = int(adlist[0])
-        nodes_adjacent = [int(n) for n in adlist[1].split()] if len(adlist) > 1 else []
-        graph[node_source] = nodes_adjacent
-    return graph
-
-
 def display_usage():
     print 'usage: %s graph source_node output [iteration_max] [iteration_start]' % sys.argv[0]
     print '  graph: graph file on local hard drive: each line begin with the id of a node, and it'
@@ -141,14 +135,14 @@ if __name__ == "__main__":
         frontier_current  = frontier % iteration
         term_current      = term % iteration
 
-        # Compute the new frontier
-        prince.run(frontier_mapper, frontier_reducer, frontier_previous + suffix, frontier_current,
-                   filename_graph, options, 'text', 'text')
+        # Compute the new frontier, distances being passed as tuples of integers
+        prince.run(FrontierMapper, frontier_reducer, frontier_previous + suffix, frontier_current,
+                   filename_graph, options, 'text', 'text', valuecodec='ints')
         print prince.dfs.read(frontier_current + suffix)
 
         # Termination: check if all distances are stable
         prince.run(term_mapper, term_reducer, frontier_current + suffix, term_current,
-                   filename_graph, options, 'text', 'text')
+                   filename_graph, options, 'text', 'text', valuecodec='int')
         print prince.dfs.read(term_current + suffix)
         term_value = prince.dfs.read(term_current + suffix)
         stop = int(term_value.split()[1])
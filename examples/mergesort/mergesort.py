@@ -2,9 +2,8 @@
 """
 Distributed merge sort on integer numbers using MapReduce/Hadoop.
 
-Quite inefficient because of Python, because Prince handles keys and values as
-strings, and because reducers have to handle increasing number of values as
-the sort goes on. But it is interesting as it shows how to code such a sort
+Quite inefficient because of Python, and because reducers have to handle
+increasing number of values as the sort goes on. But it is interesting as it shows how to code such a sort
 algorithm using the MapReduce paradigm.
 The overall complexity is O(n lg n) as for any merge sort. On top of the sort
 itself, two additional map/reduce iterations are necessary: one to detect
@@ -86,7 +85,7 @@ def init_reducer(key, values):
     of values in an initial bucket is limited by the number of mappers m
     (roughly 1 <= m < 200), any sort algorithm can be used here.
     """
-    values_sorted = sorted(str_to_int([v for v in values]))
+    values_sorted = sorted(values)
     yield key, ' '.join(int_to_str(values_sorted))
 
 
@@ -94,21 +93,20 @@ def merge_mapper(key, value):
     """Group two buckets together by dividing their ids by 2 to get same id"""
     (id_bucket, numbers) = value.split(None, 1)
     id_bucket_new = (int(id_bucket) + 1) / 2 
-    yield id_bucket_new, numbers
+    yield id_bucket_new, str_to_int(numbers.split())
 
 
 def merge_reducer(key, values):
     """Merge two buckets of same id together"""
     buckets = [v for v in values]
-    if int(key) > 0:
+    if key > 0:
         if len(buckets) == 2:
-            bucket_sorted = merge_lists(str_to_int(buckets[0].split()),
-                                        str_to_int(buckets[1].split()))
+            bucket_sorted = merge_lists(list(buckets[0]), list(buckets[1]))
             yield key, ' '.join(int_to_str(bucket_sorted))
         else:
             # Only one bucket here, so just return it
-            yield key, buckets[0]
-            if int(key) == 1:
+            yield key, ' '.join(int_to_str(buckets[0]))
+            if key == 1:
                 # Termination: there is only one bucket with id 1
                 # An invalid id 0 is returned to stop the sorting loop
                 yield 0, 1
@@ -118,13 +116,13 @@ def split_mapper(key, value):
     """Forward the list of numbers to the reducer for final arrangement"""
     (id_bucket, numbers) = value.split(None, 1)
     if int(id_bucket) > 0:
-        yield id_bucket, numbers
+        yield id_bucket, str_to_int(numbers.split())
 
 
 def split_reducer(key, values):
     """Format the sorted numbers with only one number per tuple"""
     buckets = [v for v in values]
-    numbers = str_to_int(buckets[0].split())
+    numbers = buckets[0]
     for index, number in enumerate(numbers):
         yield index + 1, number
 
@@ -148,8 +146,10 @@ if __name__ == "__main__":
     sorted = sys.argv[2] + '_sorted'
     suffix  = '/part*'
 
-    # Create the initial buckets from the data
-    prince.run(init_mapper, init_reducer, input, output % 0, inputformat='text', outputformat='text')
+    # Create the initial buckets from the data, numbers being passed to the
+    # reducers as integers, and buckets as tuples of integers afterwards
+    prince.run(init_mapper, init_reducer, input, output % 0, inputformat='text', outputformat='text',
+               valuecodec='int')
 
     stop = False
     iteration = 1
@@ -157,7 +157,8 @@ if __name__ == "__main__":
         # Merge current buckets
         previous = output % (iteration - 1)
         current  = output % iteration
-        prince.run(merge_mapper, merge_reducer, previous + suffix, current, inputformat='text', outputformat='text')
+        prince.run(merge_mapper, merge_reducer, previous + suffix, current, inputformat='text', outputformat='text',
+                   keycodec='int', valuecodec='ints')
  
         # Check if sort is done
         state = prince.dfs.read(current + suffix, last=1) 
@@ -166,4 +167,5 @@ if __name__ == "__main__":
         iteration += 1
 
     # Organize the sorted numbers, one per tuple
-    prince.run(split_mapper, split_reducer, current + suffix, sorted, inputformat='text', outputformat='text')
+    prince.run(split_mapper, split_reducer, current + suffix, sorted, inputformat='text', outputformat='text',
+               valuecodec='ints')
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Distributed sort of integer numbers in a single MapReduce pass.
+
+Unlike the merge sort example, the numbers are not merged over several
+iterations: the total order partitioner samples the input to split the range
+of the numbers into one range per reducer, and the sort of Hadoop does the
+rest. Numbers are used as keys with the 'sortint' codec, so that their order
+as strings is the numerical order, and the output files put one after the
+other are sorted.
+"""
+__docformat__ = "restructuredtext en"
+
+## Copyright (c) 2010 Emmanuel Goossaert 
+##
+## This file is part of Prince, an extra-light Python module to run
+## MapReduce tasks in the Hadoop framework. MapReduce is a patented
+## software framework introduced by Google, and Hadoop is a registered
+## trademark of the Apache Software Foundation.
+##
+## Prince is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## Prince is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Prince.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import prince
+
+
+def sort_mapper(key, value):
+    """Use each number as key"""
+    for number in value.split():
+        yield int(number), 1
+
+
+def sort_reducer(key, values):
+    """Output each number with its number of occurrences"""
+    yield key, sum([int(v) for v in values])
+
+
+def display_usage():
+    print 'usage: %s input output reducers' % sys.argv[0]
+    print '  input: input file on the DFS'
+    print '  output: output file on the DFS'
+    print '  reducers: number of reducer tasks'
+
+
+if __name__ == "__main__":
+    # Always call prince.init() at the beginning of the program
+    prince.init()
+
+    if len(sys.argv) != 4:
+        display_usage()
+        sys.exit(0)
+
+    input    = sys.argv[1]
+    output   = sys.argv[2]
+    reducers = int(sys.argv[3])
+
+    prince.run(sort_mapper, sort_reducer, input, output, inputformat='text', outputformat='text',
+               keycodec='sortint', partitioner='totalorder', reducers=reducers)
@@ -57,24 +57,24 @@ def pagerank_mapper(key, value):
         nb_nodes = len(nodes_adjacent)
         for node_adjacent in nodes_adjacent:
             # Map the normalized PageRank value to the node that needs it
-            yield node_adjacent, pr_current / nb_nodes
-        yield (node, 'infos ' + make_value(pr_current, pr_current, nodes_adjacent))
+            yield (node_adjacent, 1), pr_current / nb_nodes
+        # The second field of the key puts the 'infos' value first
+        yield (node, 0), ['infos', pr_current, nodes_adjacent]
 
 
-def pagerank_reducer(node, values):
+def pagerank_reducer(key, values):
     """Compute the new PageRank for the node"""
     try:
-        # sort because we want the 'infos' value at the end of the list
-        values = sorted([v for v in values]) # as values is a generator
-        damping = float(prince.get_parameters('damping'))
-        infos = values[-1].split()
-
-        pr_previous = float(infos[2])
-        nodes_adjacent = [int(n) for n in infos[3:]]
-        pageranks = [float(v) for v in values[:-1]]
-
-        nb_nodes = float(prince.get_parameters('nb_nodes'))
-        pr_new = (1.0 - damping) / nb_nodes + damping * sum(pageranks)
+        # Values are grouped on the node, the 'infos' value coming first
+        # thanks to the secondary sort, so the PageRank values of the other
+        # nodes are summed as they are read
+        node = key[0]
+        values = iter(values)
+        (infos, pr_previous, nodes_adjacent) = values.next()
+        # Parameters are decoded into floats and integers once per task
+        damping = prince.params.damping
+        nb_nodes = prince.params.nb_nodes
+        pr_new = (1.0 - damping) / nb_nodes + damping * sum(values)
         yield (node, make_value(pr_previous, pr_new, nodes_adjacent))
     except ValueError:
         pass
@@ -90,8 +90,8 @@ def term_mapper(key, value):
 def term_reducer(key, pagerank_changes):
     """Check whether the values are converging using the quadratic norm"""
     try:
-        precision = float(prince.get_parameters('precision'))
-        if sum([float(p) ** 2 for p in pagerank_changes]) > precision ** 2:
+        precision = prince.params.precision
+        if sum([p ** 2 for p in pagerank_changes]) > precision ** 2:
             return 0, 0 # let's do another iteration
     except ValueError:
         pass # the algorithm is stopped in case of error
@@ -123,7 +123,7 @@ def handle_dandling_nodes(graph):
 def make_value(pr_previous, pr_current, nodes):
     """Build a value to be used in an item (key, value)"""
     adjacency_list = ' '.join([str(n) for n in nodes])
-    return '%.40f %.40f %s' % (pr_previous, pr_current, adjacency_list)
+    return '%r %r %s' % (pr_previous, pr_current, adjacency_list)
 
 
 def initial_pagerank(graph, pr_init):
@@ -171,7 +171,7 @@ if __name__ == "__main__":
     # Create the initial values
     pagerank_current = pagerank % iteration_start
     if iteration_start == 1:
-        pagerank_values = [(n, make_value(pr_init, pr_init, n_adjacent)) for n, n_adjacent in graph.items()]
+        pagerank_values = ((n, make_value(pr_init, pr_init, n_adjacent)) for n, n_adjacent in graph.iteritems())
         prince.dfs.write(pagerank_current + part, pagerank_values)
         iteration_start += 1
 
@@ -183,13 +183,15 @@ if __name__ == "__main__":
         pagerank_current  = pagerank % iteration
         term_current      = term % iteration
 
-        # Compute the new PageRank values
+        # Compute the new PageRank values, the keys being passed to the
+        # reducers as (node, order) tuples, grouped on the node, and the
+        # values as floats or lists
         prince.run(pagerank_mapper, pagerank_reducer, pagerank_previous + suffix, pagerank_current,
-                   [], options, 'text', 'text')
+                   [], options, 'text', 'text', keycodec='ints', valuecodec='json', group_fields=1)
 
         # Termination: check if all PageRank values are stable
         prince.run(term_mapper, term_reducer, pagerank_current + suffix, term_current,
-                   [], options, 'text', 'text')
+                   [], options, 'text', 'text', valuecodec='float')
         term_value = prince.dfs.read(term_current + suffix)
         stop = int(term_value.split()[1])
 
@@ -46,10 +46,9 @@ def count_mapper(key, value):
         yield (key + index) % nb_buckets, 1
 
 
-def count_reducer(key, values):
-    """Sum up the items of same key"""
-    try:                yield key, sum([int(v) for v in values])
-    except ValueError:  pass # discard non-numerical values
+def count_aggregator(count1, count2):
+    """Aggregate the counts of same key in the mapper"""
+    return count1 + count2
 
 
 def sum_mapper(key, value):
@@ -63,9 +62,13 @@ def count_items(input, output):
     # Intermediate file name
     inter = output + '_inter'
 
-    # Run the task with specified mapper and reducer methods
-    prince.run(count_mapper, count_reducer, input, inter, inputformat='text', outputformat='text', files=__file__)
-    prince.run(sum_mapper, count_reducer, inter + '/part*', output, inputformat='text', outputformat='text', files=__file__)
+    # Run the task with specified mapper method, the counts of same key being
+    # summed up by the built-in aggregator prince.aggregate.sum
+    # As count_mapper() outputs a very large number of items on few keys, they
+    # are aggregated in the mapper tasks before being sent to the reducers
+    prince.run(count_mapper, prince.aggregate.sum, input, inter, inputformat='text', outputformat='text', files=__file__,
+               aggregator=count_aggregator)
+    prince.run(sum_mapper, prince.aggregate.sum, inter + '/part*', output, inputformat='text', outputformat='text', files=__file__)
 
     # Read the output file and print it 
     file = prince.dfs.read(output + '/part*', first=1)
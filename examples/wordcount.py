@@ -37,7 +37,7 @@ def wc_mapper(key, value):
 def wc_reducer(key, values):
     """Reducer method with 'key' a string and 'values' a generator of strings"""
     try:                yield key, sum([int(v) for v in values])
-    except ValueError:  pass # discard non-numerical values
+    except ValueError:  prince.counter('Wordcount', 'Invalid counts') # discard non-numerical values
 
 
 def display_usage():
@@ -57,8 +57,14 @@ if __name__ == "__main__":
     input  = sys.argv[1]
     output = sys.argv[2]
 
-    # Run the task with specified mapper and reducer methods
-    prince.run(wc_mapper, wc_reducer, input, output, inputformat='text', outputformat='text')
+    # Run the task with specified mapper and reducer methods, the reducer
+    # being also used as combiner to sum up the counts on the mapper side
+    job = prince.run(wc_mapper, wc_reducer, input, output, inputformat='text', outputformat='text',
+                     combiner=wc_reducer)
+
+    # Print the counters of the job, maintained by Prince in the tasks
+    for (name, value) in sorted(job.counters.get(prince.config.counter_group, {}).items()):
+        print '%s: %d' % (name, value)
 
     # Read the output file and print it 
     file = prince.dfs.read(output + '/part*')
@@ -1,3 +1,10 @@
 #__all__ = ["prince"]
-from prince import init, get_parameters, run
+from prince import init, get_parameters, params, run, collect_traces
+from job import Task, register_task, batch_mapper, batch_reducer, reiterable_reducer
+from report import counter, status
 import dfs
+import codec
+import aggregate
+import partition
+import sidedata
+import profile
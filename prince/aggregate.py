@@ -0,0 +1,146 @@
+"""
+Prince aggregate module.
+
+Named aggregators that can be given to run() in place of a reducer method.
+"""
+__docformat__ = "restructuredtext en"
+
+## Copyright (c) 2010 Emmanuel Goossaert 
+##
+## This file is part of Prince, an extra-light Python module to run
+## MapReduce tasks in the Hadoop framework. MapReduce is a patented
+## software framework introduced by Google, and Hadoop is a registered
+## trademark of the Apache Software Foundation.
+##
+## Prince is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## Prince is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Prince.  If not, see <http://www.gnu.org/licenses/>.
+
+import __builtin__
+
+
+def number(string):
+    """Parse a string as an integer, or as a float if it is not an integer"""
+    try:                return int(string)
+    except ValueError:  return float(string)
+
+
+def convert(values, function=None):
+    """
+    Convert a list of values, discarding the values that cannot be
+    converted.
+
+    :Parameters:
+        values : list
+            Values to convert.
+        function : method
+            Method converting a value, raising ValueError for invalid values.
+            If None, values are parsed as numbers.
+
+    :Return:
+        Converted values.
+
+    :ReturnType:
+        List
+    """
+    # Fast path, in which all values are valid
+    try:
+        return map(function or int, values)
+    except ValueError:
+        pass
+    function = function or number
+    converted = []
+    for value in values:
+        try:                converted.append(function(value))
+        except ValueError:  pass # discard invalid values
+    return converted
+
+
+class Aggregator(object):
+    """
+    Aggregation of all the values of a key into a single value. Aggregators
+    are run by the framework in an optimized loop, and can serve as their
+    own combiner.
+    """
+
+    def __init__(self, name, function, numeric=True, combinable=True):
+        """
+        :Parameters:
+            name : string
+                Name of the aggregator.
+            function : method
+                Method aggregating a list of values into a single value.
+            numeric : boolean
+                If True, values are parsed as numbers before being
+                aggregated, or decoded with the value codec of the task if
+                any. Invalid values are discarded.
+            combinable : boolean
+                If True, the aggregator is also used as combiner, as its
+                output can be aggregated again.
+        """
+        self.name = name
+        self.function = function
+        self.numeric = numeric
+        self.combiner = self if combinable else None
+        # Name under which the aggregator is passed to the tasks
+        self.__name__ = 'aggregate.' + name
+
+    def combine(self, value1, value2):
+        """
+        Aggregate two values, so that a combinable aggregator can be given
+        as aggregator of the mapper tasks, see job.MapperAggregator.
+        """
+        return self.function([value1, value2])
+
+
+aggregators = {}
+
+
+def register(name, function, numeric=True, combinable=True):
+    """
+    Register an aggregator under a given name, see Aggregator.
+
+    :Return:
+        The aggregator registered.
+
+    :ReturnType:
+        Aggregator
+    """
+    aggregators[name] = Aggregator(name, function, numeric, combinable)
+    return aggregators[name]
+
+
+def get(name):
+    """
+    Get an aggregator from the name under which it is passed to the tasks.
+
+    :Parameters:
+        name : string
+            Name of the aggregator, with or without the 'aggregate.' prefix.
+
+    :Return:
+        The aggregator if it is found, None otherwise.
+
+    :ReturnType:
+        Aggregator
+    """
+    if name.startswith('aggregate.'):
+        name = name[len('aggregate.'):]
+    return aggregators.get(name)
+
+
+sum   = register('sum',   __builtin__.sum)
+min   = register('min',   __builtin__.min)
+max   = register('max',   __builtin__.max)
+# The counts output by a combiner could not be told apart from the values,
+# therefore 'count' cannot be its own combiner
+count = register('count', len, numeric=False, combinable=False)
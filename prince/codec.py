@@ -0,0 +1,163 @@
+"""
+Prince codec module.
+"""
+__docformat__ = "restructuredtext en"
+
+## Copyright (c) 2010 Emmanuel Goossaert 
+##
+## This file is part of Prince, an extra-light Python module to run
+## MapReduce tasks in the Hadoop framework. MapReduce is a patented
+## software framework introduced by Google, and Hadoop is a registered
+## trademark of the Apache Software Foundation.
+##
+## Prince is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## Prince is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Prince.  If not, see <http://www.gnu.org/licenses/>.
+
+import marshal
+import binascii
+
+
+class Codec(object):
+    """
+    Conversion between the Python objects handled by the mapper and reducer
+    methods and the strings written between the mapper and reducer tasks.
+    """
+
+    def __init__(self, name, encode, decode):
+        """
+        :Parameters:
+            name : string
+                Name of the codec, used to select it in run().
+            encode : method
+                Method converting an object into a string. The string must
+                not contain any tab or newline character.
+            decode : method
+                Method converting a string back into an object.
+        """
+        self.name = name
+        self.encode = encode
+        self.decode = decode
+
+
+codecs = {}
+
+
+def register(name, encode, decode):
+    """
+    Register a codec under a given name. Custom codecs have to be registered
+    when the module of the mapper and reducer methods is imported, so that
+    they are also available in the tasks.
+
+    :Parameters:
+        name : string
+            Name of the codec.
+        encode : method
+            Method converting an object into a string.
+        decode : method
+            Method converting a string back into an object.
+
+    :Return:
+        The codec registered.
+
+    :ReturnType:
+        Codec
+    """
+    codecs[name] = Codec(name, encode, decode)
+    return codecs[name]
+
+
+def get(name):
+    """
+    Get a codec from its name.
+
+    :Parameters:
+        name : string
+            Name of the codec.
+
+    :Return:
+        The codec, or None if the name is None.
+
+    :ReturnType:
+        Codec
+    """
+    if name == None:
+        return None
+    if name not in codecs and name in loaders:
+        loaders[name]()
+    if name not in codecs:
+        raise ValueError('Unknown codec: %s' % name)
+    return codecs[name]
+
+
+def encode_ints(numbers):
+    """Encode a sequence of integers as space-separated integers"""
+    return ' '.join([str(n) for n in numbers])
+
+
+def encode_floats(numbers):
+    """Encode a sequence of floats as space-separated floats"""
+    return ' '.join([repr(n) for n in numbers])
+
+
+def decode_ints(string):
+    """Decode space-separated integers into a tuple"""
+    return tuple([int(n) for n in string.split()])
+
+
+def decode_floats(string):
+    """Decode space-separated floats into a tuple"""
+    return tuple([float(n) for n in string.split()])
+
+
+def encode_sortint(number):
+    """
+    Encode an integer so that encoded integers sort as strings in the same
+    order as the integers, for absolute values below 10^19
+    """
+    if number < 0:  return '-%019d' % (number + 10 ** 19)
+    else:           return '0%019d' % number
+
+
+def decode_sortint(string):
+    """Decode an integer encoded by encode_sortint()"""
+    if string[0] == '-':    return int(string[1:]) - 10 ** 19
+    else:                   return int(string)
+
+
+def encode_binary(obj):
+    """Encode an object in the compact marshal format, base64-encoded to be text-safe"""
+    return binascii.b2a_base64(marshal.dumps(obj))[:-1]
+
+
+def decode_binary(string):
+    """Decode an object encoded by encode_binary()"""
+    return marshal.loads(binascii.a2b_base64(string))
+
+
+register('str',    str,              str)
+register('int',    str,              int)
+register('float',  repr,             float)
+register('sortint', encode_sortint,   decode_sortint)
+register('ints',   encode_ints,      decode_ints)
+register('floats', encode_floats,    decode_floats)
+register('binary', encode_binary,    decode_binary)
+
+
+def load_json():
+    """Register the JSON codec, importing the json module when it is used"""
+    import json
+    register('json', json.dumps, json.loads)
+
+
+# Codecs registered on their first use, as their modules are slow to import
+loaders = {'json': load_json}
@@ -31,14 +31,136 @@ inputformats = {'text': 'org.apache.hadoop.mapred.TextInputFormat',
 outputformats = {'text': 'org.apache.hadoop.mapred.TextOutputFormat',
                  'auto': 'org.apache.hadoop.mapred.SequenceFileOutputFormat'}
 
-mapreduce_path      = os.environ.get('HADOOP_HOME') + '/'
-mapreduce_program   = mapreduce_path + 'bin/hadoop'
+# Location of Hadoop, found from $HADOOP_HOME the first time it is needed, so
+# that importing Prince in the tasks does not look for it. The values can be
+# set to bypass the search.
+mapreduce_path      = None
+mapreduce_program   = None
 
 mapreduce_dirstreaming = 'contrib/streaming/'
-mapreduce_streaming = mapreduce_dirstreaming + os.listdir(mapreduce_path + mapreduce_dirstreaming)[0]
+mapreduce_streaming = None
 
-option_mapper  = 'pmapper'
-option_reducer = 'preducer'
+
+def get_mapreduce_path():
+    """Return the installation directory of Hadoop, ending with a slash."""
+    global mapreduce_path
+    if mapreduce_path == None:
+        mapreduce_path = os.environ.get('HADOOP_HOME') + '/'
+    return mapreduce_path
+
+
+def get_mapreduce_program():
+    """Return the path to the hadoop program."""
+    global mapreduce_program
+    if mapreduce_program == None:
+        mapreduce_program = get_mapreduce_path() + 'bin/hadoop'
+    return mapreduce_program
+
+
+def get_mapreduce_streaming():
+    """Return the path to the jar of Hadoop streaming, relative to Hadoop's."""
+    global mapreduce_streaming
+    if mapreduce_streaming == None:
+        directory = get_mapreduce_path() + mapreduce_dirstreaming
+        mapreduce_streaming = mapreduce_dirstreaming + os.listdir(directory)[0]
+    return mapreduce_streaming
+
+option_mapper   = 'pmapper'
+option_reducer  = 'preducer'
+option_combiner = 'pcombiner'
+option_aggregator         = 'paggregator'
+option_aggregator_entries = 'paggregator_entries'
+option_aggregator_bytes   = 'paggregator_bytes'
+option_buffer_size        = 'pbuffer_size'
+option_keycodec           = 'pkeycodec'
+option_valuecodec         = 'pvaluecodec'
+option_io                 = 'pio'
+option_group_fields       = 'pgroup_fields'
+option_parameter_types    = 'pparameter_types'
+option_skip_bad_records   = 'pskip_bad_records'
+option_bad_records        = 'pbad_records'
 separator = '\t'
 
+# Separator of the fields of the keys, for the partitioners, comparators and
+# grouping on key fields
+key_field_separator = ' '
+
+# Options used internally to configure the tasks, hidden from get_parameters()
+options_internal = [option_mapper, option_reducer, option_combiner,
+                    option_aggregator, option_aggregator_entries,
+                    option_aggregator_bytes, option_buffer_size,
+                    option_keycodec, option_valuecodec, option_io,
+                    option_group_fields, option_parameter_types,
+                    option_skip_bad_records, option_bad_records]
+
+# Default budget of the in-mapper aggregation table before it is flushed
+aggregator_entries = 100000
+aggregator_bytes   = 64 * 1024 * 1024
+
+# Default number of values or keys per call of batch mappers and reducers
+batch_size = 1000
+
+# Default number of values kept in memory by the reducers iterating several
+# times over their values
+reiterable_window = 10000
+
+# Directory of the cache of the side data, default is a directory
+# 'prince-sidedata' in the temporary directory of the system
+sidedata_directory = None
+
+# Maximum size in bytes of the input of a mapper task with the local engine
+local_split_size = 64 * 1024 * 1024
+
+# Approximate size in bytes of the lines sorted in memory by a task of the
+# local engine before they are spilled to disk, and compression level of the
+# spill files when they are compressed
+shuffle_memory = 256 * 1024 * 1024
+shuffle_compresslevel = 1
+
+# Maximum number of files of sorted lines opened at once to merge them, more
+# files being merged in several passes
+shuffle_merge_factor = 64
+
+# Default number of input lines sampled to compute the boundaries of the
+# total order partitioner
+partition_samples = 10000
+
+# Default number of lines of the buffer in which the tasks write their output
+output_buffer_size = 8192
+
+
+
+# Address 'host:port' of the HTTP server of the NameNode, to access the DFS
+# with WebHDFS instead of the command line of Hadoop, name of the user of the
+# requests, default is the user running the program, and timeout in seconds
+# of the connections
+webhdfs_address = None
+webhdfs_user    = None
+webhdfs_timeout = 60
+
+# Size in bytes of the blocks in which the files of the DFS are streamed
+dfs_block_size = 1024 * 1024
+
+# Time in seconds during which the listings of the directories of the DFS
+# are kept in a cache, to get the metadata of the files
+dfs_cache_ttl = 10.0
+
+# Number of threads transferring files at the same time with the functions
+# dfs.read_many(), dfs.get_many() and dfs.put_many(), and number of times
+# the transfer of a file is tried again if it fails
+dfs_threads = 8
+dfs_retries = 2
+
+# Suffix of the output of a job giving the directory of the records skipped
+# by its tasks, and maximum size in bytes of the records kept by a task
+bad_records_suffix = '_badrecords'
+bad_records_bytes  = 1024 * 1024
+
+# Size in bytes of the blocks in which the tasks read their text input
+input_block_size = 64 * 1024
 
+# Group of the counters maintained automatically by the tasks, and minimum
+# number of seconds between two reports of the counters and status of a task
+# to Hadoop
+counter_group = 'Prince'
+report_interval = 5.0
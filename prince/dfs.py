@@ -1,5 +1,24 @@
 """
 Prince DFS module.
+
+The functions of the module access the DFS through a client, which is
+chosen the first time it is needed:
+
+- WebHDFSClient, if config.webhdfs_address is set, which uses the WebHDFS
+  REST API of Hadoop over persistent HTTP connections,
+- CommandClient otherwise, which runs the command line of Hadoop and thus
+  starts a JVM at each call.
+
+Any object with the same methods can be used as client, with set_client().
+
+The content of files can be streamed with open(), iter_lines() and
+iter_pairs(), so that large outputs are read with a bounded memory.
+
+The metadata of the files, given by stat(), stat_many(), listdir() and
+exists(), are kept in a cache for config.dfs_cache_ttl seconds.
+
+Many files, such as the part files of the output of a job, can be
+transferred in parallel with read_many(), get_many() and put_many().
 """
 __docformat__ = "restructuredtext en"
 
@@ -23,10 +42,685 @@ __docformat__ = "restructuredtext en"
 ## You should have received a copy of the GNU General Public License
 ## along with Prince.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
+import errno
+import __builtin__
+
 import prince
 import config
 
 
+class FileStatus(object):
+    """
+    Metadata of a file or a directory of the DFS.
+    """
+
+    def __init__(self, path, type, size, mtime):
+        """
+        :Parameters:
+            path : string
+                Absolute path of the file.
+            type : string
+                'file' or 'directory'.
+            size : int
+                Size in bytes, 0 for a directory.
+            mtime : float
+                Time of the last modification, in seconds since the epoch.
+        """
+        self.path = path
+        self.type = type
+        self.size = size
+        self.mtime = mtime
+
+    def isdir(self):
+        """Test if the path is a directory."""
+        return self.type == 'directory'
+
+    def __repr__(self):
+        return 'FileStatus(%r, %r, %r, %r)' % (self.path, self.type, self.size, self.mtime)
+
+
+class DFSFile(object):
+    """
+    Read-only file over the content of files of the DFS, read one after the
+    other as they are streamed, so that the memory used is bounded. Closing
+    the file before the end stops the remote read.
+    """
+
+    def read(self, size=-1):
+        """Read at most size bytes, or all the remaining bytes."""
+        raise NotImplementedError
+
+    def close(self):
+        """Stop the read."""
+        raise NotImplementedError
+
+    def __iter__(self):
+        """Iterate over the lines, read by blocks."""
+        tail = ''
+        while True:
+            block = self.read(config.dfs_block_size)
+            if not block:
+                break
+            lines = (tail + block).split('\n')
+            # The last line is continued in the next block
+            tail = lines.pop()
+            for line in lines:
+                yield line + '\n'
+        if tail:
+            yield tail
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, trace):
+        self.close()
+
+
+class CommandFile(DFSFile):
+    """
+    File over the output of the command line of Hadoop. The command is
+    checked when the file is closed, unless it is stopped before the end.
+    """
+
+    def __init__(self, commandline):
+        """
+        :Parameters:
+            commandline : list of strings
+                Command line printing the content of the files.
+        """
+        import subprocess
+        self.commandline = commandline
+        self.child = subprocess.Popen(commandline, stdout=subprocess.PIPE)
+        self.finished = False   # True once the whole output is read
+
+    def read(self, size=-1):
+        data = self.child.stdout.read(size)
+        if size < 0 or len(data) < size:
+            self.finished = True
+        return data
+
+    def __iter__(self):
+        for line in self.child.stdout:
+            yield line
+        self.finished = True
+
+    def close(self):
+        """
+        Stop the read.
+
+        :Raise IOError: if the whole output was read and the command failed.
+        """
+        if not self.finished and self.child.poll() == None:
+            self.child.kill()
+        self.child.stdout.close()
+        status = self.child.wait()
+        if status != 0 and self.finished:
+            raise IOError(status, 'Command failed', ' '.join(self.commandline))
+
+
+class WebHDFSFile(DFSFile):
+    """
+    File over files read with WebHDFS, each of them being requested when the
+    previous one is read.
+    """
+
+    def __init__(self, client, paths):
+        """
+        :Parameters:
+            client : WebHDFSClient
+                Client of the DFS.
+            paths : list of strings
+                Paths of the files, without glob patterns.
+        """
+        self.client = client
+        self.paths = list(paths)
+        self.response = None
+
+    def read(self, size=-1):
+        chunks = []
+        while size != 0:
+            if self.response == None:
+                if not self.paths:
+                    break
+                try:
+                    opened = self.client.call('GET', self.paths[0], 'OPEN', stream=True)
+                except IOError:
+                    if chunks:
+                        break   # raised by the next read, after the data read
+                    raise
+                self.paths.pop(0)
+                (self.address, self.connection, self.response) = opened
+            chunk = self.response.read(size) if size > 0 else self.response.read()
+            if chunk:
+                chunks.append(chunk)
+                size -= len(chunk)
+            if not chunk or size < 0:
+                # End of the file
+                self.client.finish(self.address, self.connection, self.response)
+                self.response = None
+        return ''.join(chunks)
+
+    def close(self):
+        if self.response != None:
+            self.client.finish(self.address, self.connection, self.response)
+            self.response = None
+        self.paths = []
+
+
+class CommandClient(object):
+    """
+    Client of the DFS running the command line of Hadoop.
+    """
+
+    def read(self, filenames):
+        """Return the content of files, see dfs.read()."""
+        options = {'mapreduce': config.get_mapreduce_program(),
+                   'filenames': ' '.join(filenames) }
+        return prince.run_program('%(mapreduce)s dfs -cat %(filenames)s', options)
+
+    def open(self, filenames):
+        """Open files to stream their content, see dfs.open()."""
+        return CommandFile([config.get_mapreduce_program(), 'dfs', '-cat'] + filenames)
+
+    def write(self, filename, blocks):
+        """Write blocks of data to a file, see dfs.write()."""
+        import sys
+        import subprocess
+        child = subprocess.Popen([config.get_mapreduce_program(), 'dfs', '-put', '-', filename],
+                                 stdin=subprocess.PIPE, stdout=sys.stderr.fileno())
+        try:
+            for block in blocks:
+                child.stdin.write(block)
+        finally:
+            child.stdin.close()
+            status = child.wait()
+        if status != 0:
+            raise IOError(status, 'Cannot write the file', filename)
+
+    def call(self, arguments, path):
+        """
+        Run a command of 'hadoop dfs', without going through a shell. Its
+        output goes to the standard error, as the standard output of a
+        task is its output.
+
+        :Raise IOError: if the command fails.
+        """
+        import sys
+        import subprocess
+        status = subprocess.call([config.get_mapreduce_program(), 'dfs'] + arguments,
+                                 stdout=sys.stderr.fileno())
+        if status != 0:
+            raise IOError(status, 'Command dfs %s failed' % arguments[0], path)
+
+    def put(self, filename_local, filename):
+        """Copy a local file to the DFS, see dfs.put()."""
+        self.call(['-put', filename_local, filename], filename)
+
+    def get(self, filenames, directory_local):
+        """Copy files to a local directory, see dfs.get()."""
+        self.call(['-get'] + filenames + [directory_local], ' '.join(filenames))
+
+    def exists(self, path):
+        """Test if a path exists, see dfs.exists()."""
+        options = {'mapreduce': config.get_mapreduce_program(),
+                   'path':      path}
+        found = prince.run_program('%(mapreduce)s dfs -ls %(path)s', options)
+        return True if found else False
+
+    def absolute(self, path):
+        """
+        Return the path if it is absolute, or None for a relative path or
+        an URI: Hadoop resolves them with the user and the file system of
+        its configuration, such as HADOOP_USER_NAME, a proxy user or
+        Kerberos, which are not known here. Their metadata are therefore
+        not cached, but read with stat() and list() on the path as it is.
+        """
+        if path.startswith('/'):
+            return path
+        return None
+
+    def stat(self, path):
+        """
+        Get the metadata of a path with 'dfs -stat', on the path as given.
+
+        :Return:
+            Status of the path, or None if it does not exist.
+
+        :ReturnType:
+            FileStatus
+        """
+        import subprocess
+        child = subprocess.Popen([config.get_mapreduce_program(), 'dfs', '-stat', '%F %b %Y', path],
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        (output, errors) = child.communicate()
+        lines = output.splitlines()
+        if child.returncode != 0 or not lines:
+            return None
+        (type, size, mtime) = lines[0].rsplit(None, 2)
+        type = 'directory' if type == 'directory' else 'file'
+        return FileStatus(path, type, int(size), int(mtime) / 1000.0)
+
+    def list(self, paths):
+        """List directories with a single command, see WebHDFSClient.list()."""
+        import subprocess
+        child = subprocess.Popen([config.get_mapreduce_program(), 'dfs', '-ls'] + paths,
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        (output, errors) = child.communicate()
+        return self.parse_listing(paths, output, errors)
+
+    def parse_listing(self, paths, output, errors):
+        """
+        Parse the output of 'dfs -ls' on paths. A directory is listed after
+        a line 'Found n items', and a file is listed alone, whose path is
+        then the path given. The entries of a directory are thus attributed
+        to their parent even when a directory and one of its subdirectories
+        are both listed, such as '/a' and '/a/b', whose line for '/a/b' is
+        in the listing of '/a'. When a single path is listed, all the
+        entries are its own, so that it can be relative or an URI.
+
+        :Parameters:
+            paths : list of strings
+                Absolute paths listed, or a single path.
+            output : string
+                Standard output of the command.
+            errors : string
+                Standard error of the command, giving the missing paths.
+
+        :Return:
+            Status of the files by path listed, see WebHDFSClient.list().
+
+        :ReturnType:
+            Dictionary
+        """
+        import re
+        import time
+        import urlparse
+        import posixpath
+        listings = dict((path, []) for path in paths)
+        remaining = 0   # entries left in the listing of the current directory
+        for line in output.splitlines():
+            match = re.match(r'Found (\d+) items?$', line)
+            if match:
+                remaining = int(match.group(1))
+                continue
+            fields = line.split(None, 7)
+            if len(fields) != 8 or len(fields[0]) != 10:
+                continue
+            (permissions, replication, owner, group, size, day, minute, path) = fields
+            if '://' in path:
+                path = urlparse.urlsplit(path).path
+            mtime = time.mktime(time.strptime(day + ' ' + minute, '%Y-%m-%d %H:%M'))
+            type = 'directory' if permissions.startswith('d') else 'file'
+            status = FileStatus(path, type, int(size), mtime)
+            if len(paths) == 1:
+                parent = paths[0]
+            elif remaining > 0:
+                parent = posixpath.dirname(path)
+            else:
+                parent = path
+            remaining = max(remaining - 1, 0)
+            if parent in listings:
+                listings[parent].append(status)
+        # 'Cannot access path:' for Hadoop 0.20, '`path':' for later versions
+        for match in re.finditer(r"^ls: (?:Cannot access (.+?)|`(.+?)'): No such file", errors, re.M):
+            listings[match.group(1) or match.group(2)] = None
+        return listings
+
+
+class WebHDFSClient(object):
+    """
+    Client of the DFS using the WebHDFS REST API of Hadoop. The HTTP
+    connections to the NameNode and to the DataNodes to which it redirects
+    the requests are kept alive in a pool, shared by the threads, so that a
+    call costs a round trip instead of the start of a JVM. Glob patterns in
+    the paths are expanded with directory listings, as Hadoop does.
+    """
+
+    def __init__(self, address, user=None, timeout=None):
+        """
+        :Parameters:
+            address : string
+                Address 'host:port' of the HTTP server of the NameNode.
+            user : string
+                Name of the user for the requests. Default is the user
+                running the program.
+            timeout : float
+                Timeout in seconds of the connections. Default is
+                config.webhdfs_timeout.
+        """
+        import threading
+        if user == None:
+            import getpass
+            user = getpass.getuser()
+        self.address = address
+        self.user = user
+        self.timeout = timeout or config.webhdfs_timeout
+        self.idle = {}      # idle connections by address
+        self.lock = threading.Lock()
+
+    def acquire(self, address, reuse=True):
+        """Take an idle connection to an address, or open a new one."""
+        with self.lock:
+            connections = self.idle.get(address)
+            if connections and reuse:
+                return connections.pop(), True
+        import httplib
+        return httplib.HTTPConnection(address, timeout=self.timeout), False
+
+    def release(self, address, connection):
+        """Put a connection back in the pool."""
+        with self.lock:
+            self.idle.setdefault(address, []).append(connection)
+
+    def close(self):
+        """Close the idle connections."""
+        with self.lock:
+            for connections in self.idle.values():
+                for connection in connections:
+                    connection.close()
+            self.idle.clear()
+
+    def request(self, method, address, url, body=None):
+        """
+        Send a request on a connection of the pool. A request failing on a
+        connection that was idle is sent again on a new connection, as the
+        server may have closed it in the meantime. A body that cannot be
+        sent again, such as a file, is thus always sent on a new connection.
+        An iterable body is sent in chunks, as it is read.
+
+        :Parameters:
+            method : string
+                HTTP method.
+            address : string
+                Address 'host:port' of the server.
+            url : string
+                Path and query of the request.
+            body : string, file descriptor or iterable of strings
+                Body of the request, if any.
+
+        :Return:
+            Connection and response, whose body is not read yet.
+
+        :ReturnType:
+            Tuple (httplib.HTTPConnection, httplib.HTTPResponse)
+        """
+        import httplib
+        import socket
+        headers = {'Content-Type': 'application/octet-stream'} if body is not None else {}
+        replayable = body is None or isinstance(body, str)
+        while True:
+            (connection, reused) = self.acquire(address, replayable)
+            try:
+                if replayable or hasattr(body, 'read'):
+                    connection.request(method, url, body, headers)
+                else:
+                    connection.putrequest(method, url)
+                    for header in headers.items():
+                        connection.putheader(*header)
+                    connection.putheader('Transfer-Encoding', 'chunked')
+                    connection.endheaders()
+                    for chunk in body:
+                        if chunk:
+                            connection.send('%x\r\n%s\r\n' % (len(chunk), chunk))
+                    connection.send('0\r\n\r\n')
+                return connection, connection.getresponse()
+            except (httplib.HTTPException, socket.error):
+                connection.close()
+                if reused:
+                    continue
+                raise
+
+    def finish(self, address, connection, response):
+        """
+        Put back in the pool the connection of a response read entirely, or
+        close it if the server closes it or if the response is not read
+        entirely.
+        """
+        if connection == None:
+            return
+        if response.will_close or not response.isclosed():
+            connection.close()
+        else:
+            self.release(address, connection)
+
+    def send(self, method, address, url, body=None):
+        """
+        Send a request, see request(), and read the response.
+
+        :Return:
+            Status, location header and body of the response.
+
+        :ReturnType:
+            Tuple (int, string, string)
+        """
+        (connection, response) = self.request(method, address, url, body)
+        try:
+            content = response.read()
+        finally:
+            self.finish(address, connection, response)
+        return response.status, response.getheader('location'), content
+
+    def call(self, method, path, operation, body=None, stream=False, **parameters):
+        """
+        Call an operation of WebHDFS on a path, following the redirection to
+        a DataNode if any. The body is only sent after the redirection.
+
+        :Parameters:
+            method : string
+                HTTP method.
+            path : string
+                Path on the DFS.
+            operation : string
+                Name of the operation.
+            body : string, file descriptor or iterable of strings
+                Data to send, if any.
+            stream : boolean
+                If True, the body of the response is not read.
+            parameters : dictionary
+                Other parameters of the operation.
+
+        :Return:
+            Body of the response or, with stream, address of the server,
+            connection and response to read the body from, to be given to
+            finish() once read. The connection is None if the body is
+            already read.
+
+        :ReturnType:
+            String, or tuple (string, httplib.HTTPConnection, file)
+
+        :Raise IOError: if the operation fails.
+        """
+        import urllib
+        import urlparse
+        import cStringIO
+        parameters['op'] = operation
+        parameters['user.name'] = self.user
+        url = '/webhdfs/v1%s?%s' % (urllib.quote(self.absolute(path)), urllib.urlencode(parameters))
+        (status, location, content) = self.send(method, self.address, url)
+        if status == 307 and location:
+            location = urlparse.urlsplit(location)
+            address = location.netloc
+            url = location.path + ('?' + location.query if location.query else '')
+            if stream:
+                (connection, response) = self.request(method, address, url, body)
+                if response.status < 400:
+                    return address, connection, response
+                (status, content) = (response.status, response.read())
+                self.finish(address, connection, response)
+            else:
+                (status, location, content) = self.send(method, address, url, body)
+        if status >= 400:
+            raise IOError(status, self.error(content), path)
+        if stream:
+            return self.address, None, cStringIO.StringIO(content)
+        return content
+
+    def error(self, content):
+        """Get the message of an error returned by WebHDFS."""
+        import json
+        try:
+            exception = json.loads(content)['RemoteException']
+            return '%s: %s' % (exception['exception'], exception['message'])
+        except (ValueError, KeyError, TypeError):
+            return content
+
+    def absolute(self, path):
+        """Make a path absolute, relative paths being in the home directory."""
+        if path.startswith('/'):
+            return path
+        return '/user/%s/%s' % (self.user, path)
+
+    def list(self, paths):
+        """
+        List directories.
+
+        :Parameters:
+            paths : list of strings
+                Absolute paths of the directories.
+
+        :Return:
+            Status of the files of each directory by path, the status of
+            the file itself if the path is a file, or None if the path does
+            not exist.
+
+        :ReturnType:
+            Dictionary of lists of FileStatus
+        """
+        import posixpath
+        listings = {}
+        for path in paths:
+            try:
+                statuses = self.list_status(path)
+            except IOError, error:
+                if error.errno != 404:
+                    raise
+                listings[path] = None
+                continue
+            # The suffix of a file listed itself is empty
+            listings[path] = [FileStatus(posixpath.join(path, status['pathSuffix']) if status['pathSuffix'] else path,
+                                         status['type'].lower(), status['length'],
+                                         status['modificationTime'] / 1000.0)
+                              for status in statuses]
+        return listings
+
+    def list_status(self, path):
+        """
+        List a directory.
+
+        :Return:
+            Status of the files of the directory, or of the file itself.
+
+        :ReturnType:
+            List of dictionaries, as returned by WebHDFS.
+        """
+        import json
+        content = self.call('GET', path, 'LISTSTATUS')
+        return json.loads(content)['FileStatuses']['FileStatus']
+
+    def expand(self, pattern):
+        """
+        Expand a glob pattern.
+
+        :Return:
+            Paths matching the pattern, in order, or the path itself if it
+            is not a pattern.
+
+        :ReturnType:
+            List of strings
+        """
+        import glob
+        import fnmatch
+        if not glob.has_magic(pattern):
+            return [pattern]
+        paths = ['']
+        for part in self.absolute(pattern).strip('/').split('/'):
+            if not glob.has_magic(part):
+                paths = [path + '/' + part for path in paths]
+                continue
+            matches = []
+            for path in paths:
+                try:
+                    statuses = self.list_status(path or '/')
+                except IOError:
+                    continue
+                matches.extend(path + '/' + status['pathSuffix'] for status in statuses
+                               if fnmatch.fnmatchcase(status['pathSuffix'], part))
+            paths = matches
+        return sorted(paths)
+
+    def read(self, filenames):
+        """Return the content of files, see dfs.read()."""
+        return ''.join([self.call('GET', path, 'OPEN')
+                        for filename in filenames for path in self.expand(filename)])
+
+    def open(self, filenames):
+        """Open files to stream their content, see dfs.open()."""
+        return WebHDFSFile(self, [path for filename in filenames for path in self.expand(filename)])
+
+    def write(self, filename, blocks):
+        """Write blocks of data to a file, see dfs.write()."""
+        self.call('PUT', filename, 'CREATE', blocks, overwrite='false')
+
+    def put(self, filename_local, filename):
+        """Copy a local file to the DFS, see dfs.put()."""
+        with __builtin__.open(filename_local, 'rb') as file:
+            self.call('PUT', filename, 'CREATE', file, overwrite='false')
+
+    def get(self, filenames, directory_local):
+        """Copy files to a local directory, see dfs.get()."""
+        for filename in filenames:
+            for path in self.expand(filename):
+                with __builtin__.open(os.path.join(directory_local, os.path.basename(path)), 'wb') as file:
+                    with WebHDFSFile(self, [path]) as input:
+                        for block in iter(lambda: input.read(config.dfs_block_size), ''):
+                            file.write(block)
+
+    def exists(self, path):
+        """Test if a path exists, see dfs.exists()."""
+        import glob
+        if glob.has_magic(path):
+            return bool(self.expand(path))
+        try:
+            self.call('GET', path, 'GETFILESTATUS')
+        except IOError, error:
+            if error.errno == 404:
+                return False
+            raise
+        return True
+
+
+client = None   # client of the DFS, see get_client()
+cache = {}      # listings of directories with their time, see list_directories()
+def get_client():
+    """
+    Get the client of the DFS, created the first time from the
+    configuration.
+
+    :ReturnType:
+        WebHDFSClient or CommandClient
+    """
+    global client
+    if client == None:
+        if config.webhdfs_address:
+            client = WebHDFSClient(config.webhdfs_address, config.webhdfs_user)
+        else:
+            client = CommandClient()
+    return client
+
+
+def set_client(new_client):
+    """
+    Set the client of the DFS.
+
+    :Parameters:
+        new_client : object
+            Client with the methods of CommandClient.
+    """
+    global client
+    client = new_client
+
+
 def read(filenames, first=None, last=None):
     """
     Read the content of files on the DFS. Multiple file names can be
@@ -43,56 +737,614 @@ def read(filenames, first=None, last=None):
             Number of lines to read at the end of the file
 
     :Return:
-        Lines of the file(s) on the DFS.
+        Lines of the file(s) on the DFS. As with 'dfs -cat', the reading
+        stops at the first file that cannot be read, such as a missing file,
+        and the lines read before it are returned.
 
     :ReturnType:
         List of strings.
     """
+    from collections import deque
     if not isinstance(filenames, list): filenames = [filenames]
-    options = {'mapreduce': config.mapreduce_program,
-               'filenames': ' '.join(filenames) }
-    if first:   truncate = ' | head -n %s' % first
-    elif last:  truncate = ' | tail -n %s' % last
-    else:       truncate = ''
-    commandline = '%(mapreduce)s dfs -cat %(filenames)s' + truncate
-    return prince.run_program(commandline, options)
+    lines = deque([], last) if last and not first else []
+    try:
+        if first or last:
+            lines.extend(iter_lines(filenames, first))
+        else:
+            return get_client().read(filenames)
+    except IOError:
+        pass
+    return ''.join(lines)
 
 
-def write(filename, content):
+def open(filenames):
     """
-    Write text to a file on the DFS
+    Open files on the DFS to stream their content, one file after the other.
+    The files matching a glob pattern are read in the order of their names,
+    such as the part files of the output of a job. Closing the file stops
+    the read, without reading the rest of the files.
+
+    :Parameters:
+        filenames : string or list of strings
+            Files to read from on the DFS.
+
+    :Return:
+        Read-only file, with the methods read() and close(), iterating over
+        lines, and usable in a 'with' statement.
+
+    :ReturnType:
+        DFSFile
+
+    :Examples:
+        with dfs.open('output/part-*') as file:
+            header = file.read(1024)
+    """
+    if not isinstance(filenames, list): filenames = [filenames]
+    return get_client().open(filenames)
+
+
+def iter_lines(filenames, first=None):
+    """
+    Iterate over the lines of files on the DFS, with a bounded memory.
+
+    :Parameters:
+        filenames : string or list of strings
+            Files to read from on the DFS.
+        first : int
+            Number of lines to read at the beginning of the files, if not
+            all of them. The read is stopped once they are read.
+
+    :Return:
+        Lines of the files, with their newlines.
+
+    :ReturnType:
+        Generator of strings.
+    """
+    from itertools import islice
+    with open(filenames) as file:
+        for line in islice(file, first):
+            yield line
+
+
+def iter_pairs(filenames, keycodec=None, valuecodec=None, separator=None, first=None):
+    """
+    Iterate over the items (key, value) of files on the DFS, such as the
+    output of a job, with a bounded memory.
+
+    :Parameters:
+        filenames : string or list of strings
+            Files to read from on the DFS.
+        keycodec : string
+            Name of the codec of the keys, if any, as given to prince.run().
+        valuecodec : string
+            Name of the codec of the values, if any.
+        separator : string
+            Separator of the key and the value. Default is config.separator.
+        first : int
+            Number of items to read, if not all of them.
+
+    :Return:
+        Items (key, value), as strings if they have no codec.
+
+    :ReturnType:
+        Generator of two-item tuples.
+    """
+    import codec
+    decode_key   = codec.get(keycodec).decode if keycodec else None
+    decode_value = codec.get(valuecodec).decode if valuecodec else None
+    separator = separator or config.separator
+    for line in iter_lines(filenames, first):
+        (key, found, value) = line.rstrip('\r\n').partition(separator)
+        if decode_key:      key = decode_key(key)
+        if decode_value:    value = decode_value(value)
+        yield key, value
+
+
+def iter_blocks(content):
+    """
+    Convert the content given to write() into blocks of lines of about
+    config.dfs_block_size bytes.
+
+    :ReturnType:
+        Generator of strings.
+    """
+    if isinstance(content, (basestring, tuple)):
+        content = [content]
+    separator = config.separator
+    lines = []
+    size = 0
+    for item in content:
+        if isinstance(item, basestring):
+            line = item if item.endswith('\n') else item + '\n'
+        else:
+            line = '%s%s%s\n' % (item[0], separator, item[1])
+        lines.append(line)
+        size += len(line)
+        if size >= config.dfs_block_size:
+            yield ''.join(lines)
+            lines = []
+            size = 0
+    if lines:
+        yield ''.join(lines)
+
+
+def compress_blocks(blocks):
+    """
+    Compress blocks of data into the blocks of a gzip file.
+
+    :ReturnType:
+        Generator of strings.
+    """
+    import zlib
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def write(filename, content, compress=None):
+    """
+    Write text to a file on the DFS. The text is streamed by blocks, without
+    going through a shell, so that it can be larger than the memory and
+    contain any character.
 
     :Parameters:
         filename : string
             File name where to write the text on the DFS
-        content : string or list of two-item tuples
-            If it is a string, the text is just written as it is.
-            If it is a list of tuples, each tuple is written as a MapReduce
-            entry (key, value), separated by the default separator.
+        content : string, two-item tuple, or iterable of them
+            A string is written as a line, followed by a newline if it does
+            not end with one. A tuple is written as a MapReduce entry (key,
+            value), separated by the default separator. An iterable, such as
+            a list or a generator, is written item by item as it is read.
+        compress : boolean
+            If True, the file is compressed with gzip, and it is then read
+            as text by Hadoop if its name ends with '.gz'. Default is True
+            if the name ends with '.gz'.
+
+    :Raise IOError: if the file cannot be written, for instance if it
+        already exists.
+
+    :Examples:
+        dfs.write('foo', 'String of text')
+        dfs.write('foo', (0, 0))
+        dfs.write('foo', [(0, 1), (1, 1)])
+        dfs.write('foo.gz', ((node, 1.0) for node in xrange(10000000)))
+    """
+    if compress == None:
+        compress = filename.endswith('.gz')
+    blocks = iter_blocks(content)
+    if compress:
+        blocks = compress_blocks(blocks)
+    try:
+        get_client().write(filename, blocks)
+    finally:
+        invalidate(filename)
+
+
+def put(filename_local, filename):
+    """
+    Copy a local file to the DFS. Unlike write(), any content can be copied,
+    including binary data.
+
+    :Parameters:
+        filename_local : string
+            Path of the local file to copy.
+        filename : string
+            File name where to copy the file on the DFS.
+    """
+    try:
+        get_client().put(filename_local, filename)
+    finally:
+        invalidate(filename)
+
+
+def get(filenames, directory_local):
+    """
+    Copy files of the DFS to a local directory.
+
+    :Parameters:
+        filenames : string or list of strings
+            Files to copy from the DFS, glob patterns being allowed.
+        directory_local : string
+            Path of the local directory where to copy the files.
+    """
+    if not isinstance(filenames, list): filenames = [filenames]
+    get_client().get(filenames, directory_local)
+
+
+def list_directories(paths):
+    """
+    List directories of the DFS, with the client or from the cache if they
+    were listed less than config.dfs_cache_ttl seconds ago. The directories
+    not in the cache are listed in a single call.
+
+    :Parameters:
+        paths : list of strings
+            Absolute paths of the directories.
+
+    :Return:
+        Status of the files by path, for each directory, or None if the
+        directory does not exist.
+
+    :ReturnType:
+        Dictionary of dictionaries of FileStatus
+    """
+    import time
+    now = time.time()
+    listings = {}
+    for path in paths:
+        if path in cache and now - cache[path][0] < config.dfs_cache_ttl:
+            listings[path] = cache[path][1]
+    missing = sorted(set(paths) - set(listings))
+    if missing:
+        for path, statuses in get_client().list(missing).items():
+            if statuses != None:
+                statuses = dict((status.path, status) for status in statuses)
+            cache[path] = (now, statuses)
+            listings[path] = statuses
+    return listings
+
+
+def invalidate(path=None):
+    """
+    Remove from the cache of the metadata a path changed, with its parent
+    directories and its content, or all the paths. The functions of the
+    module writing to the DFS call it, and prince.run() after a job.
+
+    :Parameters:
+        path : string
+            Path changed on the DFS. Default is all the paths, which are
+            also removed for a path that the client does not resolve.
+    """
+    import posixpath
+    if path != None:
+        path = get_client().absolute(path)
+    if path == None:
+        cache.clear()
+        return
+    path = posixpath.normpath(path)
+    for cached in cache.keys():
+        if cached.startswith(path + '/'):
+            cache.pop(cached, None)
+    while True:
+        cache.pop(path, None)
+        if path == '/':
+            break
+        path = posixpath.dirname(path)
+
+
+def stat_many(paths):
+    """
+    Get the metadata of files on the DFS, listing their directories in a
+    single call. The metadata are kept in a cache, see list_directories(),
+    except for the paths that the client does not resolve, such as the
+    relative paths and the URIs with the command line client, which are
+    read one by one.
+
+    :Parameters:
+        paths : list of strings
+            Paths of the files or directories on the DFS.
+
+    :Return:
+        Status by path, or None if the path does not exist.
+
+    :ReturnType:
+        Dictionary of FileStatus
+    """
+    import posixpath
+    client = get_client()
+    statuses = {}
+    absolutes = {}
+    for path in paths:
+        absolute = client.absolute(path)
+        if absolute == None:
+            statuses[path] = client.stat(path)
+        else:
+            absolutes[path] = posixpath.normpath(absolute)
+    listings = list_directories([posixpath.dirname(path) for path in absolutes.values() if path != '/'])
+    for path, absolute in absolutes.items():
+        if absolute == '/':
+            statuses[path] = FileStatus('/', 'directory', 0, 0.0)
+        else:
+            listing = listings[posixpath.dirname(absolute)]
+            statuses[path] = listing.get(absolute) if listing else None
+    return statuses
+
+
+def stat(path):
+    """
+    Get the metadata of a file on the DFS.
+
+    :Parameters:
+        path : string
+            Path of the file or directory on the DFS.
+
+    :Return:
+        Status of the path, with its type, size and time of modification.
+
+    :ReturnType:
+        FileStatus
+
+    :Raise IOError: if the path does not exist.
 
     :Examples:
-        dfs_write('foo', 'String of text')
-        dfs_write('foo', (0, 0))
-        dfs_write('foo', [(0, 1), (1, 1)])
+        if dfs.stat('input').size > 1024 * 1024 * 1024:
+            reducers = 10
     """
-    if not isinstance(content, str):
-        if not isinstance(content, list):
-            content = [content]
-        content = '\n'.join(['%s%s%s' % (str(item[0]), '\t', str(item[1])) for item in content])
-    options = {'content':   content,
-               'mapreduce': config.mapreduce_program,
-               'filename':  filename }
-    prince.run_program('echo "%(content)s" | %(mapreduce)s dfs -put - %(filename)s', options)
+    status = stat_many([path])[path]
+    if status == None:
+        raise IOError(errno.ENOENT, 'No such file or directory', path)
+    return status
+
+
+def listdir(path):
+    """
+    List a directory on the DFS.
+
+    :Parameters:
+        path : string
+            Path of the directory on the DFS.
 
+    :Return:
+        Status of the files and directories of the directory, by path, or
+        the status of the file itself if the path is a file.
+
+    :ReturnType:
+        List of FileStatus
+
+    :Raise IOError: if the path does not exist.
+    """
+    import posixpath
+    client = get_client()
+    absolute = client.absolute(path)
+    if absolute == None:
+        listing = client.list([path])[path]
+    else:
+        absolute = posixpath.normpath(absolute)
+        listing = list_directories([absolute])[absolute]
+        listing = listing.values() if listing != None else None
+    if listing == None:
+        raise IOError(errno.ENOENT, 'No such file or directory', path)
+    return sorted(listing, key=lambda status: status.path)
+
+
+def expand(patterns):
+    """
+    Expand glob patterns on the DFS, listing the directories matched by each
+    level of a pattern in a single call, see list_directories().
+
+    :Parameters:
+        patterns : string or list of strings
+            Glob patterns, such as 'output/part-*'.
+
+    :Return:
+        Absolute paths matching the patterns, in the order of the patterns
+        and then of the names. A path without glob pattern is kept as it
+        is, whether it exists or not, as is a pattern that the client does
+        not resolve, which Hadoop expands when it is read.
+
+    :ReturnType:
+        List of strings
+    """
+    import glob
+    import fnmatch
+    import posixpath
+    if not isinstance(patterns, list): patterns = [patterns]
+    client = get_client()
+    expanded = []
+    for pattern in patterns:
+        absolute = client.absolute(pattern)
+        if not glob.has_magic(pattern) or absolute == None:
+            expanded.append(pattern)
+            continue
+        paths = ['/']
+        for part in absolute.strip('/').split('/'):
+            if not glob.has_magic(part):
+                paths = [posixpath.join(path, part) for path in paths]
+                continue
+            listings = list_directories(paths)
+            paths = [status.path for path in paths for status in (listings[path] or {}).values()
+                     if posixpath.dirname(status.path) == path
+                     and fnmatch.fnmatchcase(posixpath.basename(status.path), part)]
+        expanded.extend(sorted(paths))
+    return expanded
+
+
+def transfer(name, function, items, threads=None, retries=None, exists=None):
+    """
+    Apply a transfer function to items with a pool of threads, trying it
+    again on an item for which it fails, and print the throughput of the
+    transfers on the standard error once they are all done. With the
+    command line client, each file is transferred by a command starting its
+    own JVM, which pays off for large files only: many small files are
+    transferred faster with the WebHDFS client.
+
+    :Parameters:
+        name : string
+            Name of the transfer, printed with its throughput.
+        function : method
+            Method transferring an item, returning its result and the
+            number of bytes transferred.
+        items : list
+            Items to transfer.
+        threads : int
+            Number of threads. Default is config.dfs_threads. At most twice
+            as many items are transferred ahead of the result yielded.
+        retries : int
+            Number of times the transfer of an item is tried again if it
+            raises an EnvironmentError. Default is config.dfs_retries.
+        exists : method
+            Method testing if an item exists, called when its transfer
+            fails. The transfer of a missing item is not tried again.
+
+    :Return:
+        Results of the transfers, in the order of the items.
+
+    :Raise IOError: if an item does not exist.
+
+    :ReturnType:
+        Generator
+    """
+    import sys
+    import time
+    from collections import deque
+    from multiprocessing.pool import ThreadPool
+    if retries == None: retries = config.dfs_retries
+
+    def attempt(item):
+        for retry in xrange(retries + 1):
+            try:
+                return function(item)
+            except EnvironmentError, error:
+                # 404 is the status of a missing path with WebHDFS
+                if error.errno in (errno.ENOENT, 404):
+                    raise
+                if exists and not exists(item):
+                    raise IOError(errno.ENOENT, 'No such file or directory', item)
+                if retry == retries:
+                    raise
+                time.sleep(retry + 1)
+
+    start = time.time()
+    threads = max(1, min(threads or config.dfs_threads, len(items)))
+    pool = ThreadPool(threads)
+    try:
+        size = 0
+        # The items are submitted by a window of twice the number of threads
+        # ahead of the result yielded, so that the results waiting to be
+        # yielded, such as the contents of files, are bounded in memory
+        pending = deque()
+        for item in items:
+            pending.append(pool.apply_async(attempt, [item]))
+            if len(pending) < 2 * threads:
+                continue
+            (result, nb_bytes) = pending.popleft().get()
+            size += nb_bytes
+            yield result
+        while pending:
+            (result, nb_bytes) = pending.popleft().get()
+            size += nb_bytes
+            yield result
+    finally:
+        pool.terminate()
+    duration = max(time.time() - start, 1e-6)
+    # The standard output of a task is its output
+    sys.stderr.write('TRANSFER: %s %d files, %d bytes in %.2f s, %.2f MB/s\n'
+                     % (name, len(items), size, duration, size / duration / (1024 * 1024)))
+
+
+def read_many(filenames, threads=None, retries=None):
+    """
+    Read files on the DFS in parallel, such as the part files of the output
+    of a job, see transfer().
+
+    :Parameters:
+        filenames : string or list of strings
+            Files to read from on the DFS, glob patterns being expanded.
+        threads : int
+            Number of files read at the same time.
+        retries : int
+            Number of times the read of a file is tried again if it fails.
+
+    :Return:
+        Path and content of each file, in the order of the paths.
+
+    :ReturnType:
+        Generator of tuples (string, string)
+
+    :Examples:
+        content = ''.join(content for path, content in dfs.read_many('output/part-*'))
+    """
+    client = get_client()
+
+    def read_file(path):
+        # Read through open(), whose file raises an error if the read fails
+        with client.open([path]) as file:
+            content = file.read()
+        return (path, content), len(content)
+    return transfer('read', read_file, expand(filenames), threads, retries, client.exists)
+
+
+def get_many(filenames, directory_local, threads=None, retries=None):
+    """
+    Copy files in parallel from the DFS to a local directory, see transfer().
+    Files with the same name overwrite each other, as with get().
+
+    :Parameters:
+        filenames : string or list of strings
+            Files to copy from the DFS, glob patterns being expanded.
+        directory_local : string
+            Local directory where to copy the files.
+        threads : int
+            Number of files copied at the same time.
+        retries : int
+            Number of times the copy of a file is tried again if it fails.
+
+    :Return:
+        Local paths of the files, in the order of the paths on the DFS.
+
+    :ReturnType:
+        List of strings
+    """
+    import posixpath
+    client = get_client()
+
+    def get_file(path):
+        client.get([path], directory_local)
+        filename_local = os.path.join(directory_local, posixpath.basename(path))
+        return filename_local, os.path.getsize(filename_local)
+    return list(transfer('get', get_file, expand(filenames), threads, retries, client.exists))
+
+
+def put_many(filenames_local, directory, threads=None, retries=None):
+    """
+    Copy local files in parallel to a directory on the DFS, see transfer().
+
+    :Parameters:
+        filenames_local : string or list of strings
+            Local files to copy, glob patterns being expanded.
+        directory : string
+            Directory where to copy the files on the DFS.
+        threads : int
+            Number of files copied at the same time.
+        retries : int
+            Number of times the copy of a file is tried again if it fails.
+
+    :Return:
+        Paths of the files on the DFS, in the order of the local files.
+
+    :ReturnType:
+        List of strings
+    """
+    import glob
+    import posixpath
+    if not isinstance(filenames_local, list): filenames_local = [filenames_local]
+    filenames_local = [filename for pattern in filenames_local
+                       for filename in (sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern])]
+    client = get_client()
+
+    def put_file(filename_local):
+        filename = posixpath.join(directory, os.path.basename(filename_local))
+        client.put(filename_local, filename)
+        return filename, os.path.getsize(filename_local)
+    try:
+        return list(transfer('put', put_file, filenames_local, threads, retries, os.path.exists))
+    finally:
+        invalidate(directory)
 
 
 def exists(path):
     """
-    Test if a path exists on the DFS.
-    NOTE: The current implementation is based on 'dfs -ls' and is therefore
-          *very* slow. This is due to the fact that the implementation of
-          'dfs -test -e' in the current Hadoop version (0.20.1) is buggy
-          and cannot be used properly.
+    Test if a path exists on the DFS. The result is read from the cache of
+    the metadata, see stat_many(), unless the path is a glob pattern or a
+    path that the client does not resolve, such as a relative path or an
+    URI with the command line client.
+    NOTE: The implementation of CommandClient is based on 'dfs -ls' and is
+          therefore slow when the cache is missed. This is due to the fact
+          that the implementation of 'dfs -test -e' in the current Hadoop
+          version (0.20.1) is buggy and cannot be used properly.
 
     :Parameters:
         path : string
@@ -104,8 +1356,8 @@ def exists(path):
     :ReturnType:
         Boolean
     """
-    options = {'mapreduce': config.mapreduce_program,
-               'path':      path}
-    found = prince.run_program('%(mapreduce)s dfs -ls %(path)s', options)
-    return True if found else False
-
+    import glob
+    client = get_client()
+    if glob.has_magic(path) or client.absolute(path) == None:
+        return client.exists(path)
+    return stat_many([path])[path] != None
@@ -23,7 +23,586 @@ __docformat__ = "restructuredtext en"
 ## You should have received a copy of the GNU General Public License
 ## along with Prince.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import sys
+import time
+import types
+
+import config
+import report
+import aggregate
+import typedbytes
+
+
+def get_task_attempt():
+    """
+    Get the id of the attempt of the current task, from the environment set
+    by Hadoop streaming, or an id made of the host name and the process id
+    outside of Hadoop.
+
+    :Return:
+        Id of the task attempt.
+
+    :ReturnType:
+        String
+    """
+    for name in ['mapreduce_task_attempt_id', 'mapred_task_id']:
+        if os.environ.get(name):
+            return os.environ[name]
+    import socket
+    return '%s_%d' % (socket.gethostname(), os.getpid())
+
+
+def get_task_name(tasktype=None):
+    """
+    Get a unique name for a file written by the current task, made of the id
+    of the task attempt, the type of the task and a timestamp in
+    microseconds, so that files can be named without checking which names
+    are already taken on the DFS.
+
+    :Parameters:
+        tasktype : string
+            Type of the task, if known.
+
+    :Return:
+        Name unique for each task, including the combiner tasks run by a
+        same mapper attempt.
+
+    :ReturnType:
+        String
+    """
+    names = [get_task_attempt()] + ([tasktype] if tasktype else [])
+    names.append('%d' % (time.time() * 1000000))
+    return '-'.join(names)
+
+
+def get_task_filename(directory, tasktype, extension=''):
+    """
+    Get the name of a file written by the current task in a directory, see
+    get_task_name().
+
+    :Parameters:
+        directory : string
+            Directory of the file.
+        tasktype : string
+            Type of the task.
+        extension : string
+            Extension of the file name.
+
+    :Return:
+        Path of the file.
+
+    :ReturnType:
+        String
+    """
+    return '%s/%s%s' % (directory.rstrip('/'), get_task_name(tasktype), extension)
+
+
+class OutputWriter(object):
+    """
+    Buffered writer of (key, value) items. Items are formatted into a buffer
+    of lines that is written out in bulk when it is full, instead of being
+    printed one by one.
+    """
+
+    def __init__(self, file=None, separator='\t', buffer_size=None,
+                 keycodec=None, valuecodec=None):
+        """
+        :Parameters:
+            file : file descriptor
+                File to write to, default is the standard output.
+            separator : string
+                Character or string used to separate the key from the value.
+            buffer_size : int
+                Number of lines of the buffer. Default is
+                config.output_buffer_size.
+            keycodec : Codec
+                Codec used to encode the keys, if any.
+            valuecodec : Codec
+                Codec used to encode the values, if any.
+        """
+        self.file = file or sys.stdout
+        self.separator = separator
+        self.buffer_size = buffer_size or config.output_buffer_size
+        self.buffer = []
+        self.count = 0      # number of items written
+        self.bytes = 0      # number of bytes written
+        self.encode_key = keycodec.encode if keycodec else None
+        self.encode_value = valuecodec.encode if valuecodec else None
+
+    def write_pairs(self, pairs, sequence=None):
+        """
+        Write items. Keys and values are encoded with the codecs of the
+        writer if any, otherwise they are formatted only if they are not
+        already strings.
+
+        :Parameters:
+            pairs : iterable of two-item tuples
+                Items (key, value) to write.
+            sequence : int
+                If given, items with a None key are written with sequential
+                keys, starting at this number.
+
+        :Return:
+            Number of items written.
+
+        :ReturnType:
+            int
+        """
+        buffer = self.buffer
+        append = buffer.append
+        separator = self.separator
+        buffer_size = self.buffer_size
+        encode_key = self.encode_key
+        encode_value = self.encode_value
+        count = 0
+        for (key, value) in pairs:
+            if key is None and sequence is not None:
+                key = sequence + count
+            if encode_key:                  key = encode_key(key)
+            elif key.__class__ is not str:  key = str(key)
+            if encode_value:                value = encode_value(value)
+            elif value.__class__ is str:    value = value.rstrip()
+            else:                           value = str(value).rstrip()
+            append(key + separator + value + '\n')
+            count += 1
+            if len(buffer) >= buffer_size:
+                self.flush()
+        self.count += count
+        return count
+
+    def write(self, key, value):
+        """Write a single item."""
+        self.write_pairs(((key, value),))
+
+    def flush(self):
+        """Write out the content of the buffer."""
+        self.bytes += sum(map(len, self.buffer))
+        self.file.writelines(self.buffer)
+        del self.buffer[:]
+
+    def close(self):
+        """Write out the content of the buffer and flush the file."""
+        self.flush()
+        self.file.flush()
+
+
+class Task(object):
+    """
+    Base class of class-based tasks. A mapper class defines a method
+    map(key, value), and a reducer or combiner class a method
+    reduce(key, values), with the same prototypes as mapper and reducer
+    methods. The class is instantiated once per task, setup() is called
+    before the first item and close() after the last one, so that the state
+    of the task can be kept in the object.
+    """
+
+    def setup(self):
+        """Prepare the task, for instance by loading side data."""
+        pass
+
+    def close(self):
+        """
+        Finish the task.
+
+        :Return:
+            Items to output after all the others, if any, as returned by
+            map() or reduce().
+        """
+        return None
+
+
+tasks = {}
+def register_task(method):
+    """
+    Decorator registering a mapper, reducer or combiner method or class under
+    its name qualified by its module, as 'module:method', so that the tasks
+    find it once its module is imported even if it is not an attribute of the
+    module, such as a method created by a factory.
+
+    :Examples:
+        @prince.register_task
+        def wc_mapper(key, value):
+            ...
+    """
+    tasks['%s:%s' % (method.__module__, method.__name__)] = method
+    return method
+
+
+def start_task(task, method):
+    """
+    Start a task. Classes are instantiated and their setup() method called.
+
+    :Parameters:
+        task : method or class
+            Method or class of the task.
+        method : string
+            Name of the method called on the items by a class-based task,
+            'map' or 'reduce'.
+
+    :Return:
+        Method to call on the items, and method to call at the end of the
+        task, returning items to output.
+
+    :ReturnType:
+        Tuple of two methods
+    """
+    if not isinstance(task, (type, types.ClassType)):
+        return task, lambda: None
+    instance = task()
+    if hasattr(instance, 'setup'):
+        instance.setup()
+    return getattr(instance, method), getattr(instance, 'close', lambda: None)
+
+
+def batch_mapper(size=None, numpy=False):
+    """
+    Decorator declaring a mapper method as a batch mapper. Instead of being
+    called on each item, a batch mapper is called on a list of input values,
+    which avoids the overhead of one call per item and allows vectorized
+    computations. The prototype of the mapper becomes map(values), and it
+    returns an iterable of (key, value) items as a regular mapper does.
+
+    :Parameters:
+        size : int
+            Number of input values per call. Default is config.batch_size.
+        numpy : boolean
+            If True, each input value is a line of space-separated numbers,
+            all lines having the same number of columns, and the mapper
+            receives them as a two-dimensional NumPy array of floats instead
+            of a list of strings.
+
+    :Examples:
+        @prince.batch_mapper(size=10000)
+        def length_mapper(lines):
+            yield 0, sum([len(line) for line in lines])
+    """
+    def decorator(mapper_fct):
+        mapper_fct.batch_size = size or config.batch_size
+        mapper_fct.batch_numpy = numpy
+        return mapper_fct
+    return decorator
+
+
+def batch_reducer(size=None):
+    """
+    Decorator declaring a reducer method as a batch reducer. Instead of
+    being called on each key, a batch reducer is called on a list of groups
+    (key, values), 'values' being a list. The prototype of the reducer
+    becomes reduce(groups), and it returns an iterable of (key, value)
+    items as a regular reducer does.
+
+    :Parameters:
+        size : int
+            Number of keys per call. Default is config.batch_size.
+    """
+    def decorator(reducer_fct):
+        reducer_fct.batch_size = size or config.batch_size
+        return reducer_fct
+    return decorator
+
+
+def reiterable_reducer(window=None):
+    """
+    Decorator declaring a reducer method as iterating several times over its
+    values. The values are then given as a ReiterableValues object instead
+    of a generator, which keeps a bounded number of values in memory and
+    spills the others to a local temporary file.
+
+    :Parameters:
+        window : int
+            Number of values kept in memory. Default is
+            config.reiterable_window.
+    """
+    def decorator(reducer_fct):
+        reducer_fct.reiterable_window = window or config.reiterable_window
+        return reducer_fct
+    return decorator
+
+
+class BadRecords(object):
+    """
+    Bounded side output of the records on which the method of a task failed,
+    with their errors. Records are counted beyond the size of the side
+    output, until their number exceeds the limit.
+    """
+
+    def __init__(self, limit, directory=None, max_bytes=None):
+        """
+        :Parameters:
+            limit : int
+                Maximum number of records skipped by the task.
+            directory : string
+                Directory where the records are written by the runner of the
+                task, if any.
+            max_bytes : int
+                Maximum size in bytes of the records kept. Default is
+                config.bad_records_bytes.
+        """
+        self.limit = limit
+        self.directory = directory
+        self.max_bytes = max_bytes or config.bad_records_bytes
+        self.count = 0
+        self.lines = []
+        self.size = 0
+
+    def add(self, record, error):
+        """
+        Add a record, kept if the side output is not full.
+
+        :Return:
+            True if the number of records exceeds the limit.
+
+        :ReturnType:
+            Boolean
+        """
+        self.count += 1
+        if self.size < self.max_bytes:
+            line = '%s\t%s\n' % (' '.join(str(record).splitlines())[:self.max_bytes],
+                                  ' '.join(error.splitlines()))
+            self.lines.append(line)
+            self.size += len(line)
+        return self.count > self.limit
+
+    def write(self, file):
+        """Write the records kept, one '<record>\\t<error>' per line."""
+        file.writelines(self.lines)
+
+
+def skip_records(function, bad_records, index, counter_name):
+    """
+    Wrap the method of a task so that the records on which it fails are
+    skipped and added to a side output, until there are too many of them.
+    The output of the method for a record is generated before it is written,
+    so that nothing is written for a record that is skipped.
+
+    :Parameters:
+        function : method
+            Method of the task.
+        bad_records : BadRecords
+            Side output of the records skipped.
+        index : int
+            Index of the argument of the method added to the side output, the
+            value for a mapper and the key for a reducer.
+        counter_name : string
+            Name of the counter of the records skipped.
+
+    :Return:
+        Wrapped method, whose output is None for a record skipped.
+
+    :ReturnType:
+        method
+    """
+    group = config.counter_group
+    def call(*args):
+        try:
+            pairs = function(*args)
+            if pairs and not isinstance(pairs, tuple):
+                pairs = list(pairs)
+            return pairs
+        except Exception:
+            (type, value) = sys.exc_info()[:2]
+            report.counter(group, counter_name)
+            if bad_records.add(args[index], '%s: %s' % (type.__name__, value)):
+                raise # too many bad records, the task fails
+            return None
+    return call
+
+
+def numeric_array(lines):
+    """
+    Parse lines of space-separated numbers into a NumPy array.
+
+    :Parameters:
+        lines : list of strings
+            Lines to parse, all having the same number of columns.
+
+    :Return:
+        Array with one row per line.
+
+    :ReturnType:
+        numpy.ndarray
+    """
+    import numpy
+    array = numpy.fromstring(' '.join(lines), sep=' ')
+    return array.reshape(len(lines), -1)
+
+
+def read_batches(data, size):
+    """
+    Group the items of an iterable into lists.
+
+    :Parameters:
+        data : iterable
+            Items to group.
+        size : int
+            Maximum number of items per list.
+
+    :Return:
+        Lists of items.
+
+    :ReturnType:
+        Generator of lists.
+    """
+    from itertools import islice
+    while True:
+        batch = list(islice(data, size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_output(writer, pairs):
+    """
+    Write the output of a mapper or reducer method.
+
+    :Parameters:
+        writer : OutputWriter
+            Writer of the output.
+        pairs : iterable of two-item tuples, or single tuple
+            Output of the method, can be None.
+    """
+    if pairs:
+        if isinstance(pairs, tuple):
+            # Simple tuple, so we make it a tuple in a list
+            pairs = [pairs]
+        writer.write_pairs(pairs)
+
+
+def create_writer(io='text', separator='\t', buffer_size=None,
+                  keycodec=None, valuecodec=None, file=None):
+    """
+    Create the writer of the output of a task.
+
+    :Parameters:
+        io : string
+            Format of the data exchanged with Hadoop streaming, either
+            'text' or 'typedbytes'.
+        separator : string
+            Character or string used to separate the key from the value.
+        buffer_size : int
+            Number of lines of the output buffer.
+        keycodec : Codec
+            Codec used to encode the keys in text format, if any.
+        valuecodec : Codec
+            Codec used to encode the values in text format, if any.
+        file : file descriptor
+            File to write to, default is the standard output.
+
+    :Return:
+        Writer of the output.
+
+    :ReturnType:
+        OutputWriter or typedbytes.TypedBytesWriter
+    """
+    if io == 'typedbytes':
+        return typedbytes.TypedBytesWriter(file or sys.stdout, buffer_size)
+    return OutputWriter(file, separator, buffer_size, keycodec, valuecodec)
+
+
+def read_lines(file, sizes):
+    """
+    Read the lines of the text input of a task, counting the lines and bytes
+    read. A file is read by blocks split into lines, so that they are counted
+    without a Python loop.
+
+    :Parameters:
+        file : file descriptor or iterable of lines
+            Input to read from.
+        sizes : list
+            The number of lines read is added to sizes[0], and the number of
+            bytes to sizes[1].
+
+    :Return:
+        Lines read from the input. The lines read from a file do not end
+        with a newline.
+
+    :ReturnType:
+        Iterator of strings.
+    """
+    from itertools import chain
+
+    if not hasattr(file, 'read'):
+        def lines():
+            for line in file:
+                sizes[0] += 1
+                sizes[1] += len(line)
+                yield line
+        return lines()
+
+    def blocks():
+        tail = ''
+        while True:
+            block = file.read(config.input_block_size)
+            if not block:
+                break
+            lines = (tail + block).split('\n')
+            # The last line is continued in the next block
+            tail = lines.pop()
+            sizes[0] += len(lines)
+            sizes[1] += len(block)
+            yield lines
+        if tail:
+            sizes[0] += 1
+            yield [tail]
+    return chain.from_iterable(blocks())
+
+
+def count_items(data):
+    """
+    Count the items of an iterable as they are read, without a Python loop.
+
+    :Parameters:
+        data : iterable
+            Items to count.
+
+    :Return:
+        Items of the iterable, and a counter such that counter.next() is the
+        number of items read so far.
+
+    :ReturnType:
+        Tuple (iterator, itertools.count)
+    """
+    from itertools import imap, izip, count
+    from operator import itemgetter
+
+    counter = count()
+    # izip() reads the item first, so the counter only moves on for items
+    return imap(itemgetter(0), izip(data, counter)), counter
+
+
+def report_task(name, records, size, writer, duration=None, groups=None):
+    """
+    Report the counters maintained automatically for a task, and all the
+    counters and the status not reported yet.
+
+    :Parameters:
+        name : string
+            Prefix of the names of the counters, such as 'Map'.
+        records : int
+            Number of input records.
+        size : int
+            Number of input bytes, if known.
+        writer : OutputWriter or typedbytes.TypedBytesWriter
+            Writer of the output of the task.
+        duration : float
+            Time in seconds spent in the method of the task, including the
+            reading of its values and the writing of its output, if any.
+        groups : int
+            Number of input groups of a reducer.
+    """
+    counter = report.reporter.counter
+    group = config.counter_group
+    counter(group, name + ' input records', records)
+    if size:
+        counter(group, name + ' input bytes', size)
+    if groups is not None:
+        counter(group, name + ' input groups', groups)
+    counter(group, name + ' output records', writer.count)
+    counter(group, name + ' output bytes', writer.bytes)
+    if duration is not None:
+        counter(group, name + ' method milliseconds', int(duration * 1000))
+    report.flush()
 
 
 def read_input_reducer(file, separator='\t'):
@@ -37,50 +616,354 @@ def read_input_reducer(file, separator='\t'):
             Character or string used to split the key from the value.
 
     :Return:
-        Lines read from the descriptor.
+        Items ['<key>', '<value>'] read from the descriptor.
 
     :ReturnType:
-        Generator of strings.
+        Iterator of lists of strings.
+    """
+    from itertools import imap
+    from operator import methodcaller
+    # imap() does the splitting without a Python loop
+    return imap(methodcaller('split', separator, 1), imap(str.rstrip, file))
+
+
+def valuesof(items, decode=None):
+    """
+    Create a generator of the values of items.
+
+    :Parameters:
+        items : iterable of ['<key>', '<value>'] items
+            Items of which to get the values.
+        decode : method
+            If given, method used to decode the values.
+
+    :Return:
+        Values of the items.
+
+    :ReturnType:
+        Generator.
+    """
+    if decode:
+        for k, v in items:
+            yield decode(v)
+    else:
+        for k, v in items:
+            yield v
+
+
+class ReiterableValues(object):
+    """
+    Values of a key that can be iterated over several times. The values are
+    read from their source at the first iteration, the first ones being kept
+    in memory, and the others being pickled by chunks in a temporary file
+    from which they are read again at each iteration.
     """
-    for line in file:
-        yield line.rstrip().split(separator, 1)
 
+    def __init__(self, values, window=None):
+        """
+        :Parameters:
+            values : iterable
+                Source of the values, read only once.
+            window : int
+                Number of values kept in memory, and of values per chunk in
+                the temporary file. Default is config.reiterable_window.
+        """
+        self.source = values
+        self.window = window or config.reiterable_window
+        self.buffer = []
+        self.filename = None
+        self.chunks = 0
+        self.count = 0
 
-def valuesof(items):
-    for k, v in items:
-        yield v
+    def read_source(self):
+        """Read all the values from the source, spilling them if necessary."""
+        window = self.window
+        buffer = self.buffer
+        file = None
+        try:
+            for value in self.source:
+                buffer.append(value)
+                if len(buffer) >= window:
+                    if file == None:
+                        import cPickle
+                        import tempfile
+                        (fd, self.filename) = tempfile.mkstemp(prefix='values-')
+                        file = os.fdopen(fd, 'wb')
+                    cPickle.dump(buffer, file, cPickle.HIGHEST_PROTOCOL)
+                    self.chunks += 1
+                    self.count += len(buffer)
+                    del buffer[:]
+        finally:
+            if file != None:
+                file.close()
+        self.count += len(buffer)
+        self.source = None
 
+    def __iter__(self):
+        if self.source != None:
+            self.read_source()
+        if self.chunks:
+            # Each iteration has its own file descriptor, so that iterations
+            # can be nested
+            import cPickle
+            with open(self.filename, 'rb') as file:
+                for index in xrange(self.chunks):
+                    for value in cPickle.load(file):
+                        yield value
+        for value in self.buffer:
+            yield value
 
-def reducer_wrapper(reducer_fct, separator='\t'):
+    def __len__(self):
+        if self.source != None:
+            self.read_source()
+        return self.count
+
+    def close(self):
+        """Delete the temporary file, if any."""
+        if self.filename != None:
+            os.remove(self.filename)
+            self.filename = None
+
+
+def group_items(data, fields=None):
+    """
+    Group sorted items by key, or by the first fields of their keys, fields
+    being separated by config.key_field_separator.
+
+    :Parameters:
+        data : iterable of ['<key>', '<value>'] items
+            Items sorted by key.
+        fields : int
+            Number of fields of the keys on which to group the items. Default
+            is to group them on the whole key.
+
+    :Return:
+        Key and items of each group. When grouping on fields, the key of a
+        group is the key of its first item, as in Hadoop.
+
+    :ReturnType:
+        Iterator of tuples (key, iterator of items)
+    """
+    from itertools import groupby, chain
+    from operator import itemgetter
+
+    if not fields:
+        return groupby(data, itemgetter(0))
+    separator = config.key_field_separator
+    prefix = lambda item: item[0].split(separator, fields)[:fields]
+
+    def groups():
+        for (fields_group, items) in groupby(data, prefix):
+            item = items.next()
+            yield item[0], chain([item], items)
+    return groups()
+
+
+def aggregate_items(data, aggregator, decode=None, decode_key=None, group_fields=None,
+                    counts=None):
+    """
+    Aggregate the values of sorted items by key.
+
+    :Parameters:
+        data : iterable of ['<key>', '<value>'] items
+            Items sorted by key.
+        aggregator : aggregate.Aggregator
+            Aggregator to apply on the values of each key.
+        decode : method
+            Method used to decode the values of numeric aggregators, if any.
+            Otherwise the values are parsed as numbers.
+        decode_key : method
+            Method used to decode the keys, if any.
+        group_fields : int
+            Number of fields of the keys on which to group the items, if not
+            the whole key.
+        counts : list
+            If given, the number of groups read is added to counts[0].
+
+    :Return:
+        Keys and the aggregation of their values.
+
+    :ReturnType:
+        Generator of two-item tuples.
+    """
+    from operator import itemgetter
+
+    # The values of each key are aggregated with built-in methods only
+    function = aggregator.function
+    numeric = aggregator.numeric
+    getvalue = itemgetter(1)
+    for (key, items) in group_items(data, group_fields):
+        if counts is not None: counts[0] += 1
+        values = map(getvalue, items)
+        if numeric:
+            values = aggregate.convert(values, decode)
+            if not values:
+                continue
+        yield (decode_key(key) if decode_key else key), function(values)
+
+
+def reducer_wrapper(reducer_fct, separator='\t', buffer_size=None,
+                    keycodec=None, valuecodec=None, encode=False, io='text',
+                    input=None, output=None, group_fields=None,
+                    counter_prefix='Reduce', bad_records=None):
     """
     General reducer function, that call reducer_fct() to perform
     the reducing job on a items of same key. Results are printed
-    to the standard output.
+    to the standard output. The records and bytes read and written and the
+    time spent in reducer_fct() are counted, see report_task().
 
     :Parameters:
-        reducer_fct : method
-            Reducer method to call on each tuple (<key>, (<value>, ...)).
+        reducer_fct : method or aggregate.Aggregator
+            Reducer method to call on each tuple (<key>, (<value>, ...)),
+            or on lists of such tuples if it is declared with
+            batch_reducer(). If it is declared with reiterable_reducer(),
+            the values are given as a ReiterableValues object. If it is an
+            aggregator, the values are aggregated in an optimized loop
+            instead.
         separator : string
             Character or string used to split the key from the value.
+        buffer_size : int
+            Number of lines of the output buffer.
+        keycodec : Codec
+            Codec used to decode the keys of the input, if any.
+        valuecodec : Codec
+            Codec used to decode the values of the input, if any.
+        encode : boolean
+            If True, the output is encoded with the same codecs as the input,
+            as needed by a combiner.
+        io : string
+            Format of the data exchanged with Hadoop streaming, either
+            'text' or 'typedbytes'. With 'typedbytes', keys and values are
+            read and written as Python objects, and codecs are not used.
+        input : file descriptor or iterable of lines
+            Input of the task, default is the standard input.
+        output : file descriptor
+            Output of the task, default is the standard output.
+        group_fields : int
+            Number of fields of the keys on which the items are grouped, for
+            a secondary sort on the other fields. The reducer method is then
+            called once per group, with the key of the first item of the
+            group and the values of all the items in the order of the sort.
+            Default is to group the items on the whole key.
+        counter_prefix : string
+            Prefix of the names of the counters of the task.
+        bad_records : BadRecords
+            If given, the groups on which reducer_fct() fails are skipped and
+            their keys added to bad_records, see skip_records(), until there
+            are too many of them. Aggregators are not concerned.
     """
-    from itertools import groupby
-    from operator import itemgetter
-
     # As Prince uses Hadoop streaming, input data come from the standard input
-    data = read_input_reducer(sys.stdin, separator=separator)
+    if input is None: input = sys.stdin
+    sizes = [0, 0]
+    if io == 'typedbytes':
+        (data, records) = count_items(typedbytes.read_pairs(input))
+        keycodec = valuecodec = None
+    else:
+        data = read_input_reducer(read_lines(input, sizes), separator=separator)
+    if encode:  writer = create_writer(io, separator, buffer_size, keycodec, valuecodec, output)
+    else:       writer = create_writer(io, separator, buffer_size, file=output)
+    decode_key = keycodec.decode if keycodec else None
+    decode_value = valuecodec.decode if valuecodec else None
+
+    if isinstance(reducer_fct, aggregate.Aggregator):
+        if io == 'typedbytes':
+            # Values are already Python objects
+            decode_value = lambda value: value
+        counts = [0]
+        start = time.time()
+        writer.write_pairs(aggregate_items(data, reducer_fct, decode_value, decode_key,
+                                           group_fields, counts))
+        duration = time.time() - start
+        writer.close()
+        if io == 'typedbytes': sizes[0] = records.next()
+        report_task(counter_prefix, sizes[0], sizes[1], writer, duration, counts[0])
+        return
 
-    # groupby() groups items by key, and creates an iterator on the items
+    (reducer_fct, close_fct) = start_task(reducer_fct, 'reduce')
+
+    # Batch reducers are called on lists of groups (key, values)
+    batch_size = getattr(reducer_fct, 'batch_size', None)
+    groups = []
+    # Reducers iterating several times over their values get them in a
+    # ReiterableValues object
+    window = getattr(reducer_fct, 'reiterable_window', None)
+    if bad_records:
+        reducer_fct = skip_records(reducer_fct, bad_records, 0, counter_prefix + ' bad records')
+
+    clock = time.time
+    duration = 0.0
+    nb_groups = 0
+    # group_items() groups items by key, and creates an iterator on the items
     #   key:   key of the current item
     #   items: iterator yielding all ['<key>', '<value>'] items
-    for (key, items) in groupby(data, itemgetter(0)):
+    for (key, items) in group_items(data, group_fields):
         #if not key: continue  # in case of invalid key
-        pairs =  reducer_fct(key, valuesof(items))
-        if pairs:
-            if isinstance(pairs, tuple):
-                # Simple tuple, so we make it a tuple in a list
-                pairs = [pairs]
-            for (key_r, value_r) in pairs:
-                print "%s%s%s" % (str(key_r), separator, str(value_r).rstrip())
+        nb_groups += 1
+        if decode_key: key = decode_key(key)
+        if batch_size:
+            groups.append((key, list(valuesof(items, decode_value))))
+            if len(groups) >= batch_size:
+                start = clock()
+                write_output(writer, reducer_fct(groups))
+                duration += clock() - start
+                groups = []
+        elif window:
+            start = clock()
+            values = ReiterableValues(valuesof(items, decode_value), window)
+            try:
+                write_output(writer, reducer_fct(key, values))
+            finally:
+                values.close()
+            duration += clock() - start
+        else:
+            start = clock()
+            write_output(writer, reducer_fct(key, valuesof(items, decode_value)))
+            duration += clock() - start
+    start = clock()
+    if groups:
+        write_output(writer, reducer_fct(groups))
+    write_output(writer, close_fct())
+    duration += clock() - start
+    writer.close()
+    if io == 'typedbytes': sizes[0] = records.next()
+    report_task(counter_prefix, sizes[0], sizes[1], writer, duration, nb_groups)
+
+
+def combiner_wrapper(combiner_fct, separator='\t', buffer_size=None,
+                     keycodec=None, valuecodec=None, io='text',
+                     input=None, output=None, bad_records=None):
+    """
+    General combiner function, that call combiner_fct() to pre-aggregate
+    the output of a mapper task on items of same key. Hadoop sorts the
+    output of the mapper before handing it to the combiner, therefore a
+    combiner is run exactly as a reducer is. Results are printed to the
+    standard output.
+
+    :Parameters:
+        combiner_fct : method
+            Combiner method to call on each tuple (<key>, (<value>, ...)).
+        separator : string
+            Character or string used to split the key from the value.
+        buffer_size : int
+            Number of lines of the output buffer.
+        keycodec : Codec
+            Codec used to decode and encode the keys, if any.
+        valuecodec : Codec
+            Codec used to decode and encode the values, if any.
+        io : string
+            Format of the data exchanged with Hadoop streaming, either
+            'text' or 'typedbytes'.
+        input : file descriptor or iterable of lines
+            Input of the task, default is the standard input.
+        output : file descriptor
+            Output of the task, default is the standard output.
+        bad_records : BadRecords
+            If given, the groups on which combiner_fct() fails are skipped,
+            see reducer_wrapper().
+    """
+    reducer_wrapper(combiner_fct, separator, buffer_size, keycodec, valuecodec,
+                    encode=True, io=io, input=input, output=output,
+                    counter_prefix='Combine', bad_records=bad_records)
 
 
 def read_input_mapper(file):
@@ -100,29 +983,164 @@ def read_input_mapper(file):
     for line in file:
         yield line
 
- 
-def mapper_wrapper(mapper_fct, separator='\t'):
+
+class MapperAggregator(object):
+    """
+    Bounded hash table aggregating the output of a mapper by key, with an
+    associative aggregation method. The entries are written out when the
+    number of keys or the approximate memory size of the table reaches its
+    budget, and when the mapper is done.
+    """
+
+    def __init__(self, aggregator_fct, writer, max_entries=None, max_bytes=None):
+        """
+        :Parameters:
+            aggregator_fct : method or aggregate.Aggregator
+                Associative method aggregate(value1, value2) that combines
+                two values of same key, or a combinable aggregator of the
+                aggregate module.
+            writer : OutputWriter
+                Writer to which the entries are written out.
+            max_entries : int
+                Number of keys above which the table is written out.
+            max_bytes : int
+                Approximate size in bytes above which the table is written out.
+        """
+        if isinstance(aggregator_fct, aggregate.Aggregator):
+            aggregator_fct = aggregator_fct.combine
+        self.aggregator_fct = aggregator_fct
+        self.writer = writer
+        self.max_entries = max_entries or config.aggregator_entries
+        self.max_bytes = max_bytes or config.aggregator_bytes
+        self.table = {}
+        self.size = 0
+
+    def add(self, key, value):
+        """Aggregate a value with the other values of the same key."""
+        table = self.table
+        if key in table:
+            table[key] = self.aggregator_fct(table[key], value)
+        else:
+            table[key] = value
+            self.size += sys.getsizeof(key) + sys.getsizeof(value)
+            if len(table) >= self.max_entries or self.size >= self.max_bytes:
+                self.flush()
+
+    def flush(self):
+        """Write out all the entries of the table, and empty it."""
+        self.writer.write_pairs(self.table.iteritems())
+        self.table.clear()
+        self.size = 0
+
+
+def mapper_wrapper(mapper_fct, separator='\t', aggregator_fct=None,
+                   aggregator_entries=None, aggregator_bytes=None, buffer_size=None,
+                   keycodec=None, valuecodec=None, io='text',
+                   input=None, output=None, bad_records=None):
     """
     General mapper function, that call mapper_fct() to perform
-    the mapping job on a single item.
+    the mapping job on a single item. The records and bytes read and written
+    and the time spent in mapper_fct() are counted, see report_task().
 
     :Parameters:
         mapper_fct : method
-            Mapper method to call on each tuple (<key>, <value>).
+            Mapper method to call on each tuple (<key>, <value>), or on
+            lists of values if it is declared with batch_mapper().
         separator : string
             Character or string used to split the key from the value.
+        aggregator_fct : method
+            Associative method aggregate(value1, value2). If given, the
+            output of the mapper is aggregated by key in memory before it is
+            printed, see MapperAggregator.
+        aggregator_entries : int
+            Maximum number of keys kept in memory by the aggregation.
+        aggregator_bytes : int
+            Approximate maximum size in bytes of the aggregation table.
+        buffer_size : int
+            Number of lines of the output buffer.
+        keycodec : Codec
+            Codec used to encode the keys of the output, if any.
+        valuecodec : Codec
+            Codec used to encode the values of the output, if any.
+        io : string
+            Format of the data exchanged with Hadoop streaming, either
+            'text' or 'typedbytes'. With 'typedbytes', the mapper method is
+            called with the key and value of the input items, and its output
+            is written without codecs.
+        input : file descriptor or iterable of lines
+            Input of the task, default is the standard input.
+        output : file descriptor
+            Output of the task, default is the standard output.
+        bad_records : BadRecords
+            If given, the records on which mapper_fct() fails are skipped and
+            added to bad_records, see skip_records(), until there are too
+            many of them. A batch mapper skips a whole batch.
     """
+    writer = create_writer(io, separator, buffer_size, keycodec, valuecodec, output)
+    if aggregator_fct:
+        aggregator = MapperAggregator(aggregator_fct, writer,
+                                      aggregator_entries, aggregator_bytes)
+
     # As Prince uses Hadoop streaming, input data come from the standard input
-    data = read_input_mapper(sys.stdin)
-    key = 0
-    for line in data:
-        pairs = mapper_fct(str(key), line.rstrip())
-        if pairs:
-            if isinstance(pairs, tuple):
-                # Simple tuple, so we make it a tuple in a list
-                pairs = [pairs]
+    binary = (io == 'typedbytes')
+    if input is None: input = sys.stdin
+    sizes = [0, 0]
+    if binary:  data = typedbytes.read_pairs(input)
+    else:       data = read_lines(input, sizes)
+
+    (mapper_fct, close_fct) = start_task(mapper_fct, 'map')
+
+    def write_pairs(pairs, key):
+        """Write the output of the mapper, and return the next sequential key"""
+        if isinstance(pairs, tuple):
+            # Simple tuple, so we make it a tuple in a list
+            pairs = [pairs]
+        if aggregator_fct:
             for (key_m, value_m) in pairs:
                 # Special case to get sequential keys
-                if key_m == None:   key_m = key
-                print '%s%s%s' % (str(key_m), separator, str(value_m).rstrip())
+                if key_m == None:   writer.write(key, value_m)
+                else:               aggregator.add(key_m, value_m)
                 key += 1
+            return key
+        # Items with a None key get sequential keys
+        return key + writer.write_pairs(pairs, key)
+
+    # Batch mappers are called on lists of values
+    batch_size = getattr(mapper_fct, 'batch_size', None)
+    if batch_size:
+        batch_numpy = getattr(mapper_fct, 'batch_numpy', False)
+        data = read_batches(data, batch_size)
+    if bad_records:
+        mapper_fct = skip_records(mapper_fct, bad_records, -1, 'Map bad records')
+
+    clock = time.time
+    duration = 0.0
+    key = 0
+    for line in data:
+        start = clock()
+        if batch_size:
+            if binary:
+                sizes[0] += len(line)
+                values = [value for (key_i, value) in line]
+            else:
+                values = [l.rstrip() for l in line]
+            if batch_numpy: values = numeric_array(values)
+            pairs = mapper_fct(values)
+        elif binary:
+            sizes[0] += 1
+            pairs = mapper_fct(line[0], line[1])
+        else:
+            pairs = mapper_fct(str(key), line.rstrip())
+        if pairs:
+            key = write_pairs(pairs, key)
+        duration += clock() - start
+    start = clock()
+    pairs = close_fct()
+    if pairs:
+        write_pairs(pairs, key)
+    duration += clock() - start
+
+    if aggregator_fct:
+        aggregator.flush()
+    writer.close()
+    report_task('Map', sizes[0], sizes[1], writer, duration)
@@ -0,0 +1,421 @@
+"""
+Prince local execution module.
+
+Run MapReduce tasks on the local machine, with a pool of processes, instead
+of running them on Hadoop. The same mapper, reducer and combiner wrappers
+as in Hadoop streaming are used, so that tasks behave identically.
+"""
+__docformat__ = "restructuredtext en"
+
+## Copyright (c) 2010 Emmanuel Goossaert 
+##
+## This file is part of Prince, an extra-light Python module to run
+## MapReduce tasks in the Hadoop framework. MapReduce is a patented
+## software framework introduced by Google, and Hadoop is a registered
+## trademark of the Apache Software Foundation.
+##
+## Prince is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## Prince is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Prince.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import glob
+import shutil
+import tempfile
+import multiprocessing
+
+import job
+import config
+import prince
+import report
+import shuffle
+import partition
+
+
+class PartitionWriter(object):
+    """
+    File-like object dispatching the lines written to it over several files,
+    depending on the partition of the key of each line.
+    """
+
+    def __init__(self, files, separator='\t', partitioner=None):
+        """
+        :Parameters:
+            files : list of file descriptors
+                Files of the partitions.
+            separator : string
+                Character or string used to split the key from the value.
+            partitioner : partition.Partitioner
+                Partitioner of the keys, default is on the hash of the keys.
+        """
+        self.files = files
+        self.separator = separator
+        self.partitioner = partitioner or partition.HashPartitioner()
+
+    def writelines(self, lines):
+        """Write lines to the files of their partitions."""
+        files = self.files
+        nb_files = len(files)
+        separator = self.separator
+        partition = self.partitioner.partition
+        for line in lines:
+            index = line.find(separator)
+            key = line[:index] if index >= 0 else line.rstrip('\n')
+            files[partition(key, nb_files)].write(line)
+
+    def write(self, content):
+        """Write lines, given as a single string."""
+        self.writelines(content.splitlines(True))
+
+    def flush(self):
+        """Flush the files of the partitions."""
+        for file in self.files:
+            file.flush()
+
+
+def get_splits(inputs, split_size=None):
+    """
+    Divide the input files into splits of at most split_size bytes.
+
+    :Parameters:
+        inputs : list of strings
+            Paths or glob patterns of the input files.
+        split_size : int
+            Maximum size of a split in bytes. Default is
+            config.local_split_size.
+
+    :Return:
+        Splits as tuples (filename, start, end), 'end' being excluded.
+
+    :ReturnType:
+        List of tuples
+    """
+    split_size = split_size or config.local_split_size
+    filenames = []
+    for pattern in inputs:
+        filenames.extend(sorted(glob.glob(pattern)) or [pattern])
+
+    splits = []
+    for filename in filenames:
+        size = os.path.getsize(filename)
+        for start in range(0, size, split_size):
+            splits.append((filename, start, min(start + split_size, size)))
+    return splits
+
+
+def read_split(filename, start, end):
+    """
+    Read the lines of a split. A line belongs to the split in which it
+    begins, and the first partial line of a split belongs to the previous one.
+
+    :Parameters:
+        filename : string
+            File to read from.
+        start : int
+            Offset of the beginning of the split.
+        end : int
+            Offset of the end of the split, excluded.
+
+    :Return:
+        Lines of the split.
+
+    :ReturnType:
+        Generator of strings.
+    """
+    with open(filename) as file:
+        if start > 0:
+            file.seek(start - 1)
+            file.readline() # the end of a line of the previous split
+        position = file.tell()
+        while position < end:
+            line = file.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line
+
+
+def read_sample(inputs, nb_lines, seed=None):
+    """
+    Read a sample of the input lines, the first line beginning at or after
+    each of random offsets of the input files, see partition.sample_offsets().
+
+    :Parameters:
+        inputs : list of strings
+            Paths or glob patterns of the local input files.
+        nb_lines : int
+            Approximate number of lines to read.
+        seed : hashable
+            Seed of the random generator, for a reproducible sample.
+
+    :Return:
+        Lines of the sample.
+
+    :ReturnType:
+        List of strings
+    """
+    filenames = [filename for pattern in inputs for filename in (sorted(glob.glob(pattern)) or [pattern])]
+    sizes = [os.path.getsize(filename) for filename in filenames]
+    lines = []
+    for (filename, offsets) in zip(filenames, partition.sample_offsets(sizes, nb_lines, seed)):
+        with open(filename) as file:
+            for offset in offsets:
+                # The first line beginning at the offset or after it, as
+                # for the beginning of a split in read_split()
+                if offset > 0:
+                    file.seek(offset - 1)
+                    file.readline()
+                else:
+                    file.seek(0)
+                line = file.readline()
+                if line:
+                    lines.append(line)
+    return lines
+
+
+def init_worker(argv):
+    """
+    Initialize a worker process of the pool, so that get_parameters() and
+    prince.params find the parameters of the job in the tasks, and that the
+    counters of the tasks are totalled instead of being reported.
+
+    :Parameters:
+        argv : list of strings
+            Command line of the tasks.
+    """
+    sys.argv = argv
+    prince.load_parameters()
+    report.reporter.streaming = False
+
+
+def get_bad_records(options):
+    """
+    Get the options of the wrapper of a task with a side output of its own
+    for the records it skips, so that the tasks run by a process do not
+    count and write the records of each other.
+
+    :Parameters:
+        options : dictionary
+            Options of the wrapper of the task, in which the side output of
+            the skipped records is given by its limit, directory and
+            maximum size.
+
+    :Return:
+        Options of the wrapper of the task.
+
+    :ReturnType:
+        Dictionary
+    """
+    options = dict(options)
+    if options.get('bad_records'):
+        options['bad_records'] = job.BadRecords(*options['bad_records'])
+    return options
+
+
+def write_bad_records(options, name):
+    """
+    Write the records skipped by a task in their local directory, if any.
+
+    :Parameters:
+        options : dictionary
+            Options of the wrapper of the task, see get_bad_records().
+        name : string
+            Name of the file of the task.
+    """
+    bad_records = options.get('bad_records')
+    if bad_records and bad_records.lines:
+        with open(os.path.join(bad_records.directory, name), 'w') as file:
+            bad_records.write(file)
+
+
+def map_task(args):
+    """
+    Run a mapper task on a split. The output is partitioned by key into one
+    file per reducer task, and each partition is sorted and passed through
+    the combiner if any.
+
+    :Parameters:
+        args : tuple
+            Index of the task, split, mapper method, combiner method,
+            options of the wrappers, partitioner, number of partitions,
+            directory of the temporary files, memory budget of the sort,
+            compression of the sorted files and sort key of the lines.
+
+    :Return:
+        Paths to the sorted files of the partitions, statistics of the sort,
+        and totals of the counters of the mapper and combiner.
+
+    :ReturnType:
+        Tuple (list of strings, shuffle.ShuffleStats, dictionary)
+    """
+    (index, split, mapper, combiner, options, partitioner, nb_partitions,
+     directory, memory, compress, sort_key) = args
+    options_mapper = get_bad_records(options[config.option_mapper])
+    options_combiner = get_bad_records(options[config.option_combiner])
+    filenames = [os.path.join(directory, 'map-%05d-part-%05d' % (index, p)) for p in range(nb_partitions)]
+    files = [open(filename, 'w') for filename in filenames]
+    try:
+        output = PartitionWriter(files, config.separator, partitioner)
+        job.mapper_wrapper(mapper, input=read_split(*split), output=output,
+                           **options_mapper)
+    finally:
+        for file in files:
+            file.close()
+        write_bad_records(options_mapper, 'map-%05d' % index)
+
+    stats = shuffle.ShuffleStats()
+    for filename in filenames:
+        with open(filename) as input:
+            lines = shuffle.sort_lines(input, directory, memory, compress, stats, sort_key)
+            output = shuffle.open_run(filename + '.sorted', 'w', compress)
+            try:
+                if combiner:
+                    job.combiner_wrapper(combiner, input=lines, output=output,
+                                         **options_combiner)
+                else:
+                    output.writelines(lines)
+            finally:
+                output.close()
+        os.rename(filename + '.sorted', filename)
+    write_bad_records(options_combiner, 'combine-%05d' % index)
+    return filenames, stats, report.reporter.pop_totals()
+
+
+def reduce_task(args):
+    """
+    Run a reducer task on the output of all the mapper tasks for its
+    partition, merging the sorted files of the partition.
+
+    :Parameters:
+        args : tuple
+            Index of the partition, paths to the files of the partition,
+            reducer method, options of the wrappers, path to the output
+            file, compression of the sorted files and sort key of the lines.
+
+    :Return:
+        Statistics of the task, and totals of its counters.
+
+    :ReturnType:
+        Tuple (shuffle.ShuffleStats, dictionary)
+    """
+    (index, filenames, reducer, options, filename_output, compress, sort_key) = args
+    options_reducer = get_bad_records(options[config.option_reducer])
+    lines = shuffle.read_runs(filenames, compress, key=sort_key)
+    try:
+        with open(filename_output, 'w') as output:
+            job.reducer_wrapper(reducer, input=lines, output=output,
+                                **options_reducer)
+    finally:
+        write_bad_records(options_reducer, 'reduce-%05d' % index)
+    stats = shuffle.ShuffleStats()
+    stats.update_peak_rss()
+    return stats, report.reporter.pop_totals()
+
+
+def run(mapper, reducer, inputs, output, combiner=None, options=None,
+        argv=None, processes=None, memory=None, compress=False,
+        partitioner=None, reducers=None, sort_key=None):
+    """
+    Run a MapReduce task locally: mapper tasks on each split of the input,
+    partitioning and sort of their output, and reducer tasks on each
+    partition, with a pool of processes.
+
+    :Parameters:
+        mapper : method
+            Mapper method.
+        reducer : method or aggregate.Aggregator
+            Reducer method.
+        inputs : list of strings
+            Paths or glob patterns of the local input files.
+        output : string
+            Local directory where to write the output, one file 'part-NNNNN'
+            per reducer task. It must not exist.
+        combiner : method
+            Combiner method, optional.
+        options : dictionary
+            Keyword arguments of the wrapper of each type of task, see
+            prince.get_task_options().
+        argv : list of strings
+            Command line of the tasks, for get_parameters().
+        processes : int
+            Number of processes. Default is the number of CPUs.
+        memory : int
+            Approximate size in bytes of the lines sorted in memory by each
+            mapper task before they are spilled to disk. Default is
+            config.shuffle_memory.
+        compress : boolean
+            If True, the spill files and sorted output of the mapper tasks
+            are compressed with gzip.
+        partitioner : partition.Partitioner
+            Partitioner of the keys output by the mapper tasks. Default is on
+            the hash of the keys.
+        reducers : int
+            Number of reducer tasks. Default is the number of processes.
+        sort_key : shuffle.FieldKey
+            Sort key of the lines output by the mapper tasks. Default is to
+            sort them as strings.
+
+    :Return:
+        Paths to the output files, with the counters of the job and the
+        statistics of its shuffle.
+
+    :ReturnType:
+        report.JobFiles
+    """
+    options = dict(options or {})
+    for tasktype in [config.option_mapper, config.option_reducer, config.option_combiner]:
+        options[tasktype] = dict(options.get(tasktype, {}))
+        # The tasks are sent by chunks to the processes, each task then
+        # creates its own side output of the skipped records
+        bad_records = options[tasktype].get('bad_records')
+        if bad_records:
+            options[tasktype]['bad_records'] = (bad_records.limit, bad_records.directory,
+                                                bad_records.max_bytes)
+    if options[config.option_mapper].get('io', 'text') != 'text':
+        raise ValueError('Only the text format can be used with the local engine')
+    processes = processes or multiprocessing.cpu_count()
+    reducers = reducers or processes
+
+    splits = get_splits(inputs)
+    os.makedirs(output)
+    bad_records = options[config.option_mapper].get('bad_records')
+    if bad_records:
+        (limit, directory_bad_records, max_bytes) = bad_records
+        os.makedirs(directory_bad_records)
+    directory = tempfile.mkdtemp(prefix='prince-')
+    pool = multiprocessing.Pool(processes, init_worker, [argv or sys.argv[:1]])
+    try:
+        tasks = [(index, split, mapper, combiner, options, partitioner, reducers,
+                  directory, memory, compress, sort_key)
+                 for index, split in enumerate(splits)]
+        results = pool.map(map_task, tasks)
+
+        filenames_output = [os.path.join(output, 'part-%05d' % p) for p in range(reducers)]
+        tasks = [(p, [filenames[p] for (filenames, stats, totals) in results], reducer, options,
+                  filenames_output[p], compress, sort_key)
+                 for p in range(reducers)]
+        results_reduce = pool.map(reduce_task, tasks)
+        pool.close()
+        pool.join()
+
+        results = [(stats_map, totals) for (filenames, stats_map, totals) in results] + results_reduce
+        stats = shuffle.ShuffleStats()
+        for (stats_task, totals) in results:
+            stats.add(stats_task)
+        counters = report.group_totals([totals for (stats_task, totals) in results])
+        sys.stderr.write('SHUFFLE: %s\n' % stats.report())
+        sys.stderr.write('COUNTERS: %s\n' % counters)
+    finally:
+        pool.terminate()
+        shutil.rmtree(directory, ignore_errors=True)
+    return report.JobFiles(filenames_output, counters, stats)
@@ -0,0 +1,389 @@
+"""
+Prince partition module.
+
+Partitioners assign the keys output by the mapper tasks to the reducer tasks.
+Each partitioner is used by the local engine, and translated into the
+options of the equivalent Java partitioner of Hadoop streaming.
+"""
+__docformat__ = "restructuredtext en"
+
+## Copyright (c) 2010 Emmanuel Goossaert 
+##
+## This file is part of Prince, an extra-light Python module to run
+## MapReduce tasks in the Hadoop framework. MapReduce is a patented
+## software framework introduced by Google, and Hadoop is a registered
+## trademark of the Apache Software Foundation.
+##
+## Prince is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## Prince is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Prince.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import struct
+import bisect
+import cStringIO
+
+import job
+import config
+import report
+
+
+class Partitioner(object):
+    """
+    Assignment of the keys output by the mapper tasks to the reducer tasks.
+    Keys are given as the strings written by the mapper tasks.
+    """
+
+    name = None
+
+    def partition(self, key, nb_partitions):
+        """
+        Return the index of the partition of a key.
+
+        :Parameters:
+            key : string
+                Key, as written by the mapper task.
+            nb_partitions : int
+                Number of partitions, that is of reducer tasks.
+
+        :Return:
+            Index of the partition, between 0 and nb_partitions - 1.
+
+        :ReturnType:
+            int
+        """
+        raise NotImplementedError
+
+    def hadoop_options(self):
+        """
+        Return the options of Hadoop streaming selecting the partitioner.
+
+        :Return:
+            Options for the command line of Hadoop streaming.
+
+        :ReturnType:
+            string
+        """
+        return ''
+
+
+class HashPartitioner(Partitioner):
+    """Partition on the hash of the whole key. This is the default."""
+
+    name = 'hash'
+
+    def partition(self, key, nb_partitions):
+        return hash(key) % nb_partitions
+
+
+class KeyFieldPartitioner(Partitioner):
+    """
+    Partition on the hash of the first fields of the key, fields being
+    separated by config.key_field_separator, so that all keys sharing the
+    same first fields are sent to the same reducer task.
+    """
+
+    name = 'keyfield'
+
+    def __init__(self, fields=1):
+        """
+        :Parameters:
+            fields : int
+                Number of fields of the key used for the partition.
+        """
+        self.fields = fields
+
+    def partition(self, key, nb_partitions):
+        fields = key.split(config.key_field_separator, self.fields)[:self.fields]
+        return hash(config.key_field_separator.join(fields)) % nb_partitions
+
+    def hadoop_options(self):
+        return ('-partitioner org.apache.hadoop.mapred.lib.KeyFieldBasedPartitioner'
+                ' -jobconf \'map.output.key.field.separator=%s\''
+                ' -jobconf mapred.text.key.partitioner.options=-k1,%d'
+                % (config.key_field_separator, self.fields))
+
+
+class TotalOrderPartitioner(Partitioner):
+    """
+    Partition on ranges of keys, so that all keys of a reducer task sort
+    before the keys of the next reducer task, and that the concatenation of
+    the output files is globally sorted. Keys are compared as byte strings,
+    as in Hadoop: integer keys have to be encoded with an order-preserving
+    codec such as 'sortint'.
+    """
+
+    name = 'totalorder'
+
+    def __init__(self, boundaries, path=None):
+        """
+        :Parameters:
+            boundaries : list of strings
+                Sorted keys starting each partition but the first one. Keys
+                equal to a boundary go to the partition it starts.
+            path : string
+                Path of the partition file on the DFS, for Hadoop.
+        """
+        self.boundaries = boundaries
+        self.path = path
+
+    def partition(self, key, nb_partitions):
+        return bisect.bisect_right(self.boundaries, key)
+
+    def hadoop_options(self):
+        return ('-partitioner org.apache.hadoop.mapred.lib.TotalOrderPartitioner'
+                ' -jobconf total.order.partitioner.path=%s' % self.path)
+
+
+def get(name, fields=None, boundaries=None):
+    """
+    Get a partitioner from its name.
+
+    :Parameters:
+        name : string
+            Name of the partitioner, 'hash', 'keyfield' or 'totalorder'.
+        fields : int
+            Number of fields of the key for the 'keyfield' partitioner.
+            Default is 1.
+        boundaries : list of strings
+            Boundaries of the partitions for the 'totalorder' partitioner.
+
+    :Return:
+        The partitioner.
+
+    :ReturnType:
+        Partitioner
+    """
+    if name == HashPartitioner.name:
+        return HashPartitioner()
+    elif name == KeyFieldPartitioner.name:
+        return KeyFieldPartitioner(fields or 1)
+    elif name == TotalOrderPartitioner.name:
+        return TotalOrderPartitioner(boundaries or [])
+    raise ValueError('Unknown partitioner: %s' % name)
+
+
+def sample_offsets(sizes, nb_lines, seed=None):
+    """
+    Draw random byte offsets in files, in number proportional to the size of
+    each file, so that a sample of lines is spread over the whole input
+    instead of being taken at the beginning of the files, like the
+    RandomSampler of Hadoop.
+
+    :Parameters:
+        sizes : list of ints
+            Sizes of the files in bytes.
+        nb_lines : int
+            Approximate number of offsets to draw over all the files.
+        seed : hashable
+            Seed of the random generator, for a reproducible sample.
+
+    :Return:
+        Sorted offsets of each file.
+
+    :ReturnType:
+        List of lists of ints
+    """
+    import random
+    generator = random.Random(seed)
+    total = sum(sizes)
+    offsets = []
+    for size in sizes:
+        nb_offsets = int(round(nb_lines * size / float(total))) if total else 0
+        if size and not nb_offsets:
+            nb_offsets = 1
+        offsets.append(sorted(generator.randrange(size) for i in xrange(nb_offsets)))
+    return offsets
+
+
+def read_lines_at(lines, offsets):
+    """
+    Select the first line beginning at or after each byte offset, as for
+    the beginning of a split, without reading the lines after the last one.
+
+    :Parameters:
+        lines : iterable of strings
+            Lines of a file, ending with a newline.
+        offsets : list of ints
+            Sorted byte offsets in the file.
+
+    :Return:
+        Lines selected, a line being repeated if it is selected by several
+        offsets.
+
+    :ReturnType:
+        Generator of strings
+    """
+    index = 0
+    position = 0    # offset of the beginning of the line
+    for line in lines:
+        while index < len(offsets) and offsets[index] <= position:
+            yield line
+            index += 1
+        if index >= len(offsets):
+            break
+        position += len(line)
+
+
+def sample_dfs(inputs, nb_lines, seed=None):
+    """
+    Read a sample of lines of input files on the DFS, the first line
+    beginning at or after each of random offsets of the files, see
+    sample_offsets() and read_lines_at(). Directories are replaced by their
+    files, except the hidden ones whose names start with '_' or '.', as
+    Hadoop does. Each file is streamed up to its last offset.
+
+    :Parameters:
+        inputs : list of strings
+            Paths or glob patterns of the input files on the DFS.
+        nb_lines : int
+            Approximate number of lines to read.
+        seed : hashable
+            Seed of the random generator, for a reproducible sample.
+
+    :Return:
+        Lines of the sample.
+
+    :ReturnType:
+        List of strings
+    """
+    import posixpath
+    import dfs
+    statuses = []
+    for path in dfs.expand(inputs):
+        for status in dfs.listdir(path):
+            if not status.isdir() and posixpath.basename(status.path)[0] not in '_.':
+                statuses.append(status)
+    lines = []
+    sizes = [status.size for status in statuses]
+    for (status, offsets) in zip(statuses, sample_offsets(sizes, nb_lines, seed)):
+        if offsets:
+            with dfs.open(status.path) as file:
+                lines.extend(read_lines_at(file, offsets))
+    return lines
+
+
+def sample_keys(mapper, lines, options, argv):
+    """
+    Run a mapper method on sample input lines, and return the keys it outputs
+    as they would be written by the mapper tasks.
+
+    :Parameters:
+        mapper : method
+            Mapper method.
+        lines : list of strings
+            Sample of the input lines.
+        options : dictionary
+            Options of the wrapper of the mapper task.
+        argv : list of strings
+            Command line of the tasks, from which the mapper method reads
+            its parameters.
+
+    :Return:
+        Keys output by the mapper method.
+
+    :ReturnType:
+        List of strings
+    """
+    import prince
+    output = cStringIO.StringIO()
+    argv_saved = sys.argv
+    sys.argv = argv
+    prince.load_parameters()
+    # The counters of the sample are not counters of the job
+    report.reporter.streaming = False
+    try:
+        job.mapper_wrapper(mapper, input=lines, output=output, **options)
+    finally:
+        sys.argv = argv_saved
+        prince.load_parameters()
+        report.reporter.pop_totals()
+        report.reporter.streaming = True
+    return [line.split('\t', 1)[0] for line in output.getvalue().splitlines()]
+
+
+def get_boundaries(keys, nb_partitions):
+    """
+    Compute the boundaries of partitions of about the same number of keys,
+    in the same way as the InputSampler of Hadoop.
+
+    :Parameters:
+        keys : list of strings
+            Sample of the keys.
+        nb_partitions : int
+            Number of partitions.
+
+    :Return:
+        The nb_partitions - 1 boundaries, strictly increasing.
+
+    :ReturnType:
+        List of strings
+    """
+    keys = sorted(keys)
+    step = len(keys) / float(nb_partitions)
+    boundaries = []
+    for index in range(1, nb_partitions):
+        position = int(round(step * index))
+        # Boundaries must be distinct, so duplicate keys are skipped
+        while boundaries and position < len(keys) and keys[position] <= boundaries[-1]:
+            position += 1
+        if position >= len(keys):
+            raise ValueError('Not enough distinct keys in the sample for %d partitions' % nb_partitions)
+        boundaries.append(keys[position])
+    return boundaries
+
+
+def encode_vint(number):
+    """Encode an integer in the variable-length format of Hadoop's WritableUtils"""
+    if -112 <= number <= 127:
+        return struct.pack('>b', number)
+    length = -112
+    if number < 0:
+        number = ~number
+        length = -120
+    data = []
+    while number:
+        data.insert(0, chr(number & 0xff))
+        number >>= 8
+    return struct.pack('>b', length - len(data)) + ''.join(data)
+
+
+def encode_text(string):
+    """Encode a string as a serialized org.apache.hadoop.io.Text"""
+    return encode_vint(len(string)) + string
+
+
+def write_partition_file(file, boundaries):
+    """
+    Write boundaries in the partition file format of Hadoop's
+    TotalOrderPartitioner: an uncompressed SequenceFile of Text keys and
+    NullWritable values.
+
+    :Parameters:
+        file : file descriptor
+            File to write to, opened in binary mode.
+        boundaries : list of strings
+            Boundaries of the partitions.
+    """
+    sync = os.urandom(16)
+    file.write('SEQ\x06')
+    file.write(encode_text('org.apache.hadoop.io.Text'))
+    file.write(encode_text('org.apache.hadoop.io.NullWritable'))
+    file.write('\x00\x00')             # No compression, no block compression
+    file.write(struct.pack('>i', 0))   # No metadata
+    file.write(sync)
+    for key in boundaries:
+        key = encode_text(key)
+        # Record length, key length, key, and empty NullWritable value
+        file.write(struct.pack('>ii', len(key), len(key)))
+        file.write(key)
@@ -29,37 +29,164 @@ import sys
 
 import dfs
 import job
+import codec
 import config
+import aggregate
+import partition
+import report
 
 
+def is_parameter_value(argument):
+    """
+    Test if an argument of the command line is the value of the option
+    before it, and not the name of another option. Negative numbers, such
+    as the values of numeric parameters, are values.
+    """
+    if not argument.startswith('-'):
+        return True
+    try:
+        float(argument)
+    except ValueError:
+        return False
+    return True
+
+
+parameters_all = {}      # parse of the command line
+parameters_all_argv = None
 def get_parameters_all():
     """
-    Return a dictionary of ALL parameters of the command line.
+    Return a dictionary of ALL parameters of the command line. The command
+    line is parsed again only if sys.argv has changed since the last call.
 
     :Return:
         All parameters of the command line, *including* the API's internal
-        parameters. Each entry is a list of strings, each string being one
-        of the values for a parameter.
+        parameters. Each entry is a string, or a list of strings if the
+        parameter has several values. The dictionary must not be modified.
 
     :ReturnType:
-        Dictionary of list of strings.
+        Dictionary of strings or lists of strings.
     """
+    global parameters_all, parameters_all_argv
+    if parameters_all_argv == sys.argv:
+        return parameters_all
+
     params = {}
     is_value = False
     for index, value in enumerate(sys.argv):
         if value.startswith('--'):
-            if (index + 1) < len(sys.argv) and not sys.argv[index + 1].startswith('-'):
+            if (index + 1) < len(sys.argv) and is_parameter_value(sys.argv[index + 1]):
                 content = sys.argv[index + 1]
             else:
                 content = None
-            params[value[2:]] = content
+            name = value[2:]
+            if name not in params:
+                params[name] = content
+            elif isinstance(params[name], list):
+                params[name].append(content)
+            else:
+                params[name] = [params[name], content]
             is_value = True
         elif is_value:
             is_value = False
+    parameters_all = params
+    parameters_all_argv = list(sys.argv)
     return params
 
 
-params = {} # global to mimic static variable behavior
+class Parameters(object):
+    """
+    Parameters passed to the tasks through run(), as attributes decoded into
+    the types of the values given to run(): int, long, float, bool or
+    string. The parameters with several values are lists. The object is
+    populated when the task starts, so that the parameters are not parsed
+    again for each item.
+
+    :Examples:
+        damping = prince.params.damping
+        factor = prince.params.get('factor', 1)
+    """
+
+    def get(self, name, default=None):
+        """Return the value of a parameter, or 'default' if it is not set."""
+        return self.__dict__.get(name, default)
+
+    def __contains__(self, name):
+        return name in self.__dict__
+
+    def __repr__(self):
+        return 'Parameters(%r)' % self.__dict__
+
+
+# Types of the parameters which are decoded, the others being strings. bool
+# must be tested before int, as booleans are integers
+parameter_types = [('bool',  bool,  lambda value: value == 'True'),
+                   ('int',   int,   int),
+                   ('long',  long,  long),
+                   ('float', float, float)]
+
+
+def encode_parameter(value):
+    """Format the value of a parameter for the command line"""
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def get_parameter_types(parameters):
+    """
+    Return the types of parameters, to be decoded by the tasks.
+
+    :Parameters:
+        parameters : dictionary
+            Parameters, as given to run().
+
+    :Return:
+        Types of the parameters, as a string 'name:type,name:type'.
+        Parameters of which the values are strings are not listed.
+
+    :ReturnType:
+        String
+    """
+    types = []
+    for (name, value) in sorted(parameters.items()):
+        if isinstance(value, list):
+            value = value[0] if value else ''
+        for (type_name, type, decode) in parameter_types:
+            if isinstance(value, type):
+                types.append('%s:%s' % (name, type_name))
+                break
+    return ','.join(types)
+
+
+params = Parameters()    # parameters of the task, decoded
+parameters_task = {}     # parameters of the task, as strings
+parameters_task_argv = None
+def load_parameters():
+    """
+    Parse the parameters of the command line, hiding the API's internal
+    parameters, and populate prince.params in place.
+    """
+    global parameters_task, parameters_task_argv
+    parameters = dict(get_parameters_all())
+    types = {}
+    if parameters.get(config.option_parameter_types):
+        types = dict([item.split(':', 1) for item in parameters[config.option_parameter_types].split(',')])
+    for name in config.options_internal:
+        if name in parameters:
+            del parameters[name]
+    decoders = dict([(type_name, decode) for (type_name, type, decode) in parameter_types])
+
+    params.__dict__.clear()
+    for (name, value) in parameters.items():
+        decode = decoders.get(types.get(name))
+        if decode and value != None:
+            if isinstance(value, list):
+                value = [decode(v) for v in value]
+            else:
+                value = decode(value)
+        setattr(params, name, value)
+    parameters_task = parameters
+    parameters_task_argv = list(sys.argv)
+
+
 def get_parameters(*args):
     """
     Return the parameters passed to the mapper and reducer tasks through
@@ -80,66 +207,86 @@ def get_parameters(*args):
     :Examples:
         param1_value = get_parameters('param1')
         (param1_value, param2_value) = get_parameters('param1', 'param2')
+
+    NOTE: prince.params gives the parameters already decoded into their types.
     """
-    global params
-    if not params:
-        params = get_parameters_all()
-        for name in [config.option_mapper, config.option_reducer]:
-            if name in params:
-                del params[name]
- 
+    if parameters_task_argv != sys.argv:
+        load_parameters()
+
     ret = []
     for arg in args:
-        if arg in params:
-            ret.append(params[arg])
+        if arg in parameters_task:
+            ret.append(parameters_task[arg])
         else:
             ret.append(None)
 
     return ret[0] if len(ret) == 1 else tuple(ret)
 
 
-def inspect_methods(filename):
+def get_method_name(method, modulename):
     """
-    Return a generator of all functions of a given file.
+    Return the name under which a task finds a method.
 
     :Parameters:
-        filename : string
-            Name of the file in which to inspect.
+        method : method, class or aggregate.Aggregator
+            Method to name.
+        modulename : string
+            Name of the module of the method.
 
     :Return:
-        Methods found in the given file.
+        Name of the method, qualified by its module as 'module:method',
+        except for aggregators of the aggregate module.
 
     :ReturnType:
-        Generator of methods.
+        String
     """
-    import inspect
-    file = __import__(inspect.getmodulename(filename))
-    for name in dir(file):
-        obj = getattr(file, name)
-        if inspect.isfunction(obj):
-            yield obj
+    if isinstance(method, aggregate.Aggregator):
+        return method.__name__
+    return '%s:%s' % (modulename, method.__name__)
 
 
 def find_method(filename, methodname):
     """
-    Search for a method in a given file.
+    Search for a method in a given file. The module is imported, unless it
+    is the main program, and the method is found among the methods of the
+    module registered with register_task(), or else as an attribute of the
+    module. Classes of class-based tasks are found as methods, and
+    aggregators of the aggregate module are found from their name, such as
+    'aggregate.sum'.
 
     :Parameters:
         filename : string
             Name of the file in which to search for.
         methodname : string
-            Name of the method to look for.
+            Name of the method to look for, which can be qualified by the
+            name of its module as 'module:method', in which case 'filename'
+            is not used.
 
     :Return:
         The method if it is found, None otherwise.
 
     :ReturnType:
-        method
+        method, class or aggregate.Aggregator
     """
-    for method in inspect_methods(os.path.basename(filename)):
-        if method.__name__ == methodname:
-            return method
-    return None
+    if methodname.startswith('aggregate.'):
+        return aggregate.get(methodname)
+    if ':' in methodname:
+        (modulename, methodname) = methodname.split(':', 1)
+    else:
+        modulename = os.path.splitext(os.path.basename(filename))[0]
+
+    main = sys.modules.get('__main__')
+    filename_main = getattr(main, '__file__', None)
+    if filename_main and os.path.splitext(os.path.basename(filename_main))[0] == modulename:
+        module = main
+    else:
+        __import__(modulename)
+        module = sys.modules[modulename]
+    # The methods of the module are registered when it is imported
+    qualified = '%s:%s' % (module.__name__, methodname)
+    if qualified in job.tasks:
+        return job.tasks[qualified]
+    return getattr(module, methodname, None)
  
 
 def get_task():
@@ -147,57 +294,152 @@ def get_task():
     Return task type and name from the parameters of the command line.
 
     :Return:
-        Task type and name if one of the tasks mapper or reducer is found
-        in the parameters, None otherwise.
+        Task type and name if one of the tasks mapper, reducer or combiner is
+        found in the parameters, None otherwise.
 
     :ReturnType:
         Tuple of two strings, the task type and the task name.
     """
     params = get_parameters_all()
-    for task in [config.option_mapper, config.option_reducer]:
+    for task in [config.option_mapper, config.option_reducer, config.option_combiner]:
         if task in params:
             return task, params[task]
     return None, None
 
 
 
-def get_errorfile(tracefile=None):
+def get_task_options(tasktype, params=None):
+    """
+    Return the options of the wrapper of a task from the parameters of the
+    command line.
+
+    :Parameters:
+        tasktype : string
+            Type of the task, as returned by get_task().
+        params : dictionary
+            Parameters to use instead of the ones of the command line.
+
+    :Return:
+        Keyword arguments to pass to the wrapper method of the task.
+
+    :ReturnType:
+        Dictionary
+    """
+    if params == None: params = get_parameters_all()
+    options = {}
+    if tasktype == config.option_mapper and params.get(config.option_aggregator):
+        options['aggregator_fct'] = find_method(filename_caller, params[config.option_aggregator])
+        if params.get(config.option_aggregator_entries):
+            options['aggregator_entries'] = int(params[config.option_aggregator_entries])
+        if params.get(config.option_aggregator_bytes):
+            options['aggregator_bytes'] = int(params[config.option_aggregator_bytes])
+    if params.get(config.option_buffer_size):
+        options['buffer_size'] = int(params[config.option_buffer_size])
+    if params.get(config.option_keycodec):
+        options['keycodec'] = codec.get(params[config.option_keycodec])
+    if params.get(config.option_valuecodec):
+        options['valuecodec'] = codec.get(params[config.option_valuecodec])
+    if params.get(config.option_io):
+        options['io'] = params[config.option_io]
+    if tasktype == config.option_reducer and params.get(config.option_group_fields):
+        options['group_fields'] = int(params[config.option_group_fields])
+    if params.get(config.option_skip_bad_records):
+        options['bad_records'] = job.BadRecords(int(params[config.option_skip_bad_records]),
+                                                params.get(config.option_bad_records))
+    return options
+
+
+def get_errorfile(tracefile=None, tasktype=None):
     """
-    Get an available error path on the DFS.
+    Get a unique error path on the DFS, named after the attempt of the task
+    and the time, see job.get_task_name(). No access to the DFS is needed,
+    so that many tasks failing at once do not check which names are taken.
 
     :Parameters:
         tracefile : string
             Basename for the trace file
+        tasktype : string
+            Type of the task, if known.
 
     :Return:
-        Available file name where to put the trace
+        File name where to put the trace
     
     :ReturnType:
         String
     """
-    errno = 0
-    while True:
-        filepath = '%s%d' % (tracefile, errno)
-        if not dfs.exists(filepath):
-            return filepath
-        errno += 1
+    return '%s%s' % (tracefile, job.get_task_name(tasktype))
 
 
-def handle_exception(tracefile):
+def handle_exception(tracefile, tasktype=None):
     """
     Write the last traceback to the given file on the DFS.
 
     :Parameters:
         tracefile : string
-            Name of the file where to save the traceback on the DFS
+            Basename of the file where to save the traceback on the DFS
+        tasktype : string
+            Type of the task, if known.
     """
     import traceback
     type, value, trace = sys.exc_info()
     message = traceback.format_exception(type, value, trace)
-    errorfile = get_errorfile(tracefile)
+    errorfile = get_errorfile(tracefile, tasktype)
     dfs.write(errorfile, ''.join(message))
 
 
+def collect_traces(tracefile=None, job=None):
+    """
+    Read the traces written by the failed tasks of the jobs run with the
+    option '--trace', copying them from the DFS at once.
+
+    :Parameters:
+        tracefile : string
+            Basename of the trace files, default is the one given with
+            '--trace' to the program.
+        job : string or report.JobOutput
+            Id of a Hadoop job, such as 'job_201001011200_0003', or the
+            output returned by run() for the job. Only the traces of the
+            attempts of this job are read, while by default the traces of
+            all the jobs run with the basename are read.
+
+    :Return:
+        Traceback of each failed task, by name of its trace file.
+
+    :ReturnType:
+        Dictionary {string: string}
+
+    :Examples:
+        output = prince.run(mapper, reducer, inputs, output)
+        traces = prince.collect_traces(job=output)
+    """
+    import shutil
+    import tempfile
+    tracefile = tracefile or filename_trace
+    if not tracefile:
+        raise ValueError('No trace file given, with --trace or as argument')
+    pattern = tracefile + '*'
+    if job != None:
+        job = getattr(job, 'job', job)
+        if not job or not job.startswith('job_'):
+            raise ValueError('Invalid id of Hadoop job: %r' % job)
+        # The files are named after the attempts, 'attempt_<id>_m_000001_0'
+        # for the job 'job_<id>'
+        pattern = '%sattempt_%s_*' % (tracefile, job[len('job_'):])
+    directory_local = tempfile.mkdtemp(prefix='prince-traces-')
+    try:
+        # Hadoop fails to get a pattern matching no file
+        filenames = dfs.expand(pattern)
+        if filenames:
+            dfs.get(filenames, directory_local)
+        traces = {}
+        for name in os.listdir(directory_local):
+            with open(os.path.join(directory_local, name)) as file:
+                traces[os.path.join(os.path.dirname(tracefile), name)] = file.read()
+    finally:
+        shutil.rmtree(directory_local, ignore_errors=True)
+    return traces
+
+
 def cleanup_parameters(names):
     """
     Cleanup sys.argv from certain parameters to that program behavior remain
@@ -228,27 +470,74 @@ def init():
     NOTE: The function is called 'init' so that people who don't want to get
     into these details won't get confused with fancy method names.
     """
-    global filename_caller, filename_trace
+    global filename_caller, filename_trace, directory_profile
     filename_caller = sys.argv[0]
     filename_trace  = get_parameters('trace')
     if filename_trace: # Must be done before the test of task type
         cleanup_parameters('trace')
+    directory_profile = get_parameters('profile')
+    if directory_profile:
+        cleanup_parameters('profile')
 
+    load_parameters()
     tasktype, taskname = get_task()
     if not tasktype: return # This is the main program
 
-    
     method = find_method(filename_caller, taskname)
     if method:
-        tasks = {config.option_mapper:  job.mapper_wrapper,
-                 config.option_reducer: job.reducer_wrapper }
-        try:
-            tasks[tasktype](method)
-        except:
-            if filename_trace:
-                handle_exception(filename_trace)
-            raise # re-raise the exception so that the task fail
-        sys.exit(0)
+        run_task(tasktype, method)
+
+
+def run_task(tasktype, method):
+    """
+    Run a task on the standard input and output, and exit. With the option
+    '--profile', the task is run under cProfile, see the module profile.
+
+    :Parameters:
+        tasktype : string
+            Type of the task, as returned by get_task().
+        method : method, class or aggregate.Aggregator
+            Method of the task.
+    """
+    tasks = {config.option_mapper:   job.mapper_wrapper,
+             config.option_reducer:  job.reducer_wrapper,
+             config.option_combiner: job.combiner_wrapper }
+    options = get_task_options(tasktype)
+    try:
+        if directory_profile:
+            import profile
+            profile.run(directory_profile, tasktype, tasks[tasktype],
+                        method, **options)
+        else:
+            tasks[tasktype](method, **options)
+    except:
+        if filename_trace:
+            handle_exception(filename_trace, tasktype)
+        raise # re-raise the exception so that the task fail
+    finally:
+        if options.get('bad_records'):
+            write_bad_records(options['bad_records'], tasktype)
+    sys.exit(0)
+
+
+def write_bad_records(bad_records, tasktype):
+    """
+    Write the records skipped by a task in their directory on the DFS, if
+    any.
+
+    :Parameters:
+        bad_records : job.BadRecords
+            Records skipped by the task.
+        tasktype : string
+            Type of the task.
+    """
+    if not bad_records.lines:
+        return
+    import tempfile
+    with tempfile.NamedTemporaryFile() as file:
+        bad_records.write(file)
+        file.flush()
+        dfs.put(file.name, job.get_task_filename(bad_records.directory, tasktype))
 
 
 def run_program(commandline, options=None):
@@ -272,6 +561,45 @@ def run_program(commandline, options=None):
     return child.read()
 
 
+def run_job(commandline, options=None):
+    """
+    Run a Hadoop job with the given command line and options. The log of
+    the job, on its standard error, is printed as it runs, and the final
+    values of the counters are parsed from it.
+
+    :Parameters:
+        commandline : string
+            Command line to use for called the program.
+        options : dictionary
+            Dictionary of the options to use to complete the command line.
+
+    :Return:
+        The standard output of the job, with its counters and its id.
+
+    :ReturnType:
+        report.JobOutput
+    """
+    import subprocess
+    import threading
+    if options == None: options = {}
+    child = subprocess.Popen(commandline % options, shell=True,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # The standard output is read by a thread, so that the job does not block
+    # on a full pipe while its log is read
+    output = []
+    thread = threading.Thread(target=lambda: output.append(child.stdout.read()))
+    thread.start()
+    log = []
+    for line in iter(child.stderr.readline, ''):
+        sys.stderr.write(line)
+        log.append(line)
+    thread.join()
+    child.wait()
+    content = ''.join(output)
+    return report.JobOutput(content, report.parse_counters(log + content.splitlines()),
+                            report.parse_job_id(log))
+
+
 def quote_list(content, quote_mark='\''):
     """
     Quote the item of a list.
@@ -312,7 +640,7 @@ def parameter_dict_to_command(parameters, quote_mark='"'):
         if not isinstance(values, list): values = [values]
         for v in values:
             options_list.append('--' + key)
-            options_list.append(quote_mark + str(v) + quote_mark)
+            options_list.append(quote_mark + encode_parameter(v) + quote_mark)
     return ' '.join(options_list)
 
 
@@ -331,7 +659,26 @@ def run(mapper,
         files=None,
         parameters=None,
         inputformat='auto',
-        outputformat='auto'):
+        outputformat='auto',
+        combiner=None,
+        aggregator=None,
+        aggregator_entries=None,
+        aggregator_bytes=None,
+        buffer_size=None,
+        keycodec=None,
+        valuecodec=None,
+        io='text',
+        engine='hadoop',
+        processes=None,
+        shuffle_memory=None,
+        shuffle_compress=False,
+        partitioner='hash',
+        partition_fields=None,
+        partition_samples=None,
+        reducers=None,
+        group_fields=None,
+        sort_options=None,
+        skip_bad_records=None):
     """
     Run a MapReduce task using Hadoop Streaming.
 
@@ -339,11 +686,18 @@ def run(mapper,
         mapper : method
             Mapper method. The prototype has to be map(key, value), and 'key'
             and 'value' will be filled with the data read from the specified
-            input files. 'key' and 'value' are strings.
-        reducer : method
+            input files. 'key' and 'value' are strings. A subclass of
+            prince.Task defining the method map() can be given instead, of
+            which the setup() and close() methods are called at the beginning
+            and at the end of each mapper task.
+        reducer : method or aggregate.Aggregator
             Reducer method. The prototype has to be reduce(key, values),
             and 'key' and 'values' will be filled with the data read from the
             mapper task. 'key' is a string and 'values' is a list of strings.
+            A subclass of prince.Task defining the method reduce() can be
+            given instead, as for the mapper. An aggregator of the aggregate
+            module, such as prince.aggregate.sum, can also be given, in which
+            case it is also used as combiner if no combiner is given.
         inputs : string or list of strings
             Paths to the files for the mapper read from on the DFS.
         output : string
@@ -357,25 +711,147 @@ def run(mapper,
             Each key is the name of the parameter, and the value is value of
             the parameters. If a list of string is given as a value, then all
             these values will be passed to the mapper and reducer tasks.
+            The values are available in the tasks as attributes of
+            prince.params, with the type of the values given here if it is
+            int, long, float or bool, and as strings with get_parameters().
         inputformat : string
             Format of the input files. Can be either 'text' or 'auto', default
             is 'auto'.
         outputformat : string
             Format of the output file. Can be either 'text' or 'auto', default
             is 'auto'.
+        combiner : method
+            Combiner method, optional. The prototype is the same as for the
+            reducer, and it is run on the output of each mapper task to
+            pre-aggregate the values of same key before they are sent to the
+            reducers. The reducer method itself can often be used as combiner.
+        aggregator : method or aggregate.Aggregator
+            Aggregation method, optional. The prototype has to be
+            aggregate(value1, value2), and it has to be associative. When
+            given, the values output by each mapper task are aggregated by
+            key in memory before they are written out, which avoids both
+            the output of each single item and the cost of a combiner.
+            An aggregator of the aggregate module that can be its own
+            combiner, such as prince.aggregate.sum, can also be given.
+        aggregator_entries : int
+            Maximum number of keys kept in memory by the aggregation before
+            they are written out. Default is config.aggregator_entries.
+        aggregator_bytes : int
+            Approximate maximum size in bytes of the keys and values kept in
+            memory by the aggregation. Default is config.aggregator_bytes.
+        buffer_size : int
+            Number of lines of the buffer in which the mapper, reducer and
+            combiner tasks write their output. Default is
+            config.output_buffer_size.
+        keycodec : string
+            Name of the codec of the keys output by the mapper, see the codec
+            module. The keys are encoded in the mapper task and decoded in
+            the reducer task, so that both methods handle Python objects.
+            Can be 'str', 'int', 'float', 'ints', 'floats', 'json', 'binary'
+            or the name of a registered codec. Default is to convert keys
+            with str() and pass them as strings to the reducer.
+        valuecodec : string
+            Name of the codec of the values output by the mapper, as for
+            keycodec.
+        io : string
+            Format of the data exchanged between Hadoop streaming and the
+            tasks. Can be either 'text' or 'typedbytes', default is 'text'.
+            With 'typedbytes', keys and values are passed in binary form
+            as Python objects, and no codec is needed. This requires a
+            version of Hadoop streaming supporting the option '-io', and
+            is best used with the 'auto' input and output formats.
+        engine : string
+            Engine running the task. Can be either 'hadoop' or 'local',
+            default is 'hadoop'. With 'local', the task is run on the local
+            machine with a pool of processes, 'inputs' and 'output' being
+            local paths, and only the 'text' io can be used.
+        processes : int
+            Number of processes of the local engine. Default is the number
+            of CPUs.
+        shuffle_memory : int
+            Approximate size in bytes of the data sorted in memory by each
+            task of the local engine, above which sorted runs are spilled to
+            disk and merged afterwards. Default is config.shuffle_memory.
+        shuffle_compress : boolean
+            If True, the spill files of the local engine are compressed.
+        partitioner : string
+            Assignment of the keys output by the mapper to the reducer tasks.
+            Can be 'hash', on the hash of the keys, 'keyfield', on the hash of
+            the first fields of the keys, fields being separated by spaces, or
+            'totalorder', on ranges of keys computed from a sample of the
+            input, so that the output files are sorted one after the other.
+            Default is 'hash'. Keys are compared as strings with 'totalorder',
+            so integer keys have to use the 'sortint' codec, and only the
+            'text' io can be used.
+        partition_fields : int
+            Number of fields of the keys for the 'keyfield' partitioner.
+            Default is 1.
+        partition_samples : int
+            Number of input lines on which the mapper is run to compute the
+            ranges of the 'totalorder' partitioner. Default is
+            config.partition_samples. With Hadoop, the ranges are written in
+            the file 'output' + '_partitions' on the DFS.
+        reducers : int
+            Number of reducer tasks. Default is the number of processes with
+            the local engine, and the configuration of the cluster with
+            Hadoop. It is required by the 'totalorder' partitioner on Hadoop.
+        group_fields : int
+            Number of fields of the keys, separated by spaces, on which the
+            items are grouped for the reducer, for a secondary sort on the
+            other fields. Items are partitioned on these fields, and the
+            reducer is called once per group, with the key of the first item
+            of the group and the values of all the items in the order of
+            their keys, which it can stream without keeping them in memory.
+            Only the 'text' io can be used.
+        sort_options : string
+            Options of Hadoop's KeyFieldBasedComparator to sort the keys on
+            their fields, such as '-k1,1 -k2,2nr', supported by the local
+            engine for the '-k', '-n' and '-r' options. Default is to sort
+            the keys as strings. With group_fields, the grouping fields have
+            to be sorted first.
+        skip_bad_records : int
+            If given, the records on which the mapper, reducer or combiner
+            methods raise an exception are skipped, instead of failing the
+            task, and a task fails only when it skips more records than this
+            number. A record is an input line for the mapper, and a key with
+            its values for the reducer and combiner. The records skipped by
+            each task and their errors are written, up to
+            config.bad_records_bytes, in a file of the directory 'output' +
+            config.bad_records_suffix, and counted in the counters
+            '<Map|Reduce|Combine> bad records' of the group
+            config.counter_group.
 
     :Return:
-        Return of the Hadoop task called.
+        Return of the Hadoop task called. With the local engine, paths to
+        the output files. Both have the final values of the counters of the
+        job in their attribute 'counters', as a dictionary
+        {group: {counter: value}}, with the counters of Hadoop, the counters
+        of the tasks incremented with prince.counter(), and the counters
+        maintained by Prince in the group config.counter_group: the input and
+        output records and bytes of the tasks, the input groups of the
+        reducers, and the time spent in the methods, in milliseconds.
 
     :ReturnType:
-        String
+        report.JobOutput, or report.JobFiles with the local engine
     """
+    # Imported here so that the tasks do not have to load them
+    import local
+    import shuffle
+    import multiprocessing
+
     if files == None: files = []
-    if parameters == None: parameters = {}
+    parameters = dict(parameters or {})
+    types = get_parameter_types(parameters)
+    if types:
+        parameters[config.option_parameter_types] = types
+    if combiner == None and isinstance(reducer, aggregate.Aggregator):
+        combiner = reducer.combiner
 
     global filename_trace
     if filename_trace:
         parameters['trace'] = filename_trace
+    if directory_profile:
+        parameters['profile'] = directory_profile
 
     # TODO: Check if all necessary files exist?
     if not isinstance(inputs, list): inputs = [inputs]
@@ -383,6 +859,7 @@ def run(mapper,
 
     global filename_caller
     files.append(os.path.join(filename_caller))
+    filename_program = os.path.splitext(os.path.basename(filename_caller))[0]
     #filename_module = os.path.splitext(os.path.abspath(__file__))[0] + '.py'
     #files.append(os.path.join(filename_module))
 
@@ -390,32 +867,121 @@ def run(mapper,
     if path_package:
         files.append(path_package)
 
-    options = parameter_dict_to_command(parameters)
-
-    pattern_command  = '\'python -m %s --%s %s %s\'' 
-    filename_program = os.path.splitext(os.path.basename(filename_caller))[0]
-    command_mapper   = pattern_command % (filename_program, config.option_mapper, mapper.__name__, options)
-    command_reducer  = pattern_command % (filename_program, config.option_reducer, reducer.__name__, options)
-
-    options = {'path':         config.mapreduce_path,
-               'mapreduce':    config.mapreduce_program,
-               'streaming':    config.mapreduce_streaming,
+    options_task = {}
+    if buffer_size:
+        options_task[config.option_buffer_size] = buffer_size
+    if keycodec:
+        options_task[config.option_keycodec] = codec.get(keycodec).name
+    if valuecodec:
+        options_task[config.option_valuecodec] = codec.get(valuecodec).name
+    if io != 'text':
+        options_task[config.option_io] = io
+    if skip_bad_records:
+        options_task[config.option_skip_bad_records] = skip_bad_records
+        options_task[config.option_bad_records] = output + config.bad_records_suffix
+    options_mapper = dict(options_task)
+    options_reducer = dict(options_task)
+    if isinstance(aggregator, aggregate.Aggregator) and not aggregator.combiner:
+        raise TypeError('The aggregator %s cannot aggregate its own output, '
+                        'and cannot be used as aggregator of the mappers' % aggregator.name)
+    if aggregator:
+        options_mapper[config.option_aggregator] = get_method_name(aggregator, filename_program)
+        if aggregator_entries:
+            options_mapper[config.option_aggregator_entries] = aggregator_entries
+        if aggregator_bytes:
+            options_mapper[config.option_aggregator_bytes] = aggregator_bytes
+
+    argv = [filename_caller]
+    for (key, values) in parameters.items():
+        for v in (values if isinstance(values, list) else [values]):
+            argv.extend(['--' + key, encode_parameter(v)])
+
+    if (group_fields or sort_options) and io != 'text':
+        raise ValueError('Secondary sorts can only be used with the text io')
+    if group_fields:
+        options_reducer[config.option_group_fields] = group_fields
+        if partitioner == partition.HashPartitioner.name:
+            partitioner = partition.KeyFieldPartitioner.name
+            partition_fields = partition_fields or group_fields
+    sort_key = shuffle.FieldKey(sort_options) if sort_options else None
+
+    partitioner = partition.get(partitioner, partition_fields)
+    if partitioner.name == partition.TotalOrderPartitioner.name:
+        if io != 'text':
+            raise ValueError('The total order partitioner can only be used with the text io')
+        if sort_options:
+            raise ValueError('The total order partitioner can only be used with keys sorted as strings')
+        if engine == 'local':
+            reducers = reducers or processes or multiprocessing.cpu_count()
+            lines = local.read_sample(inputs, partition_samples or config.partition_samples)
+        else:
+            if not reducers:
+                raise ValueError('The number of reducers is required by the total order partitioner')
+            lines = partition.sample_dfs(inputs, partition_samples or config.partition_samples)
+        keys = partition.sample_keys(mapper, lines, get_task_options(config.option_mapper, options_mapper), argv)
+        if group_fields:
+            # Boundaries on the grouping fields only keep groups in a partition
+            separator = config.key_field_separator
+            keys = [separator.join(key.split(separator, group_fields)[:group_fields]) for key in keys]
+        partitioner.boundaries = partition.get_boundaries(keys, reducers)
+
+    if engine == 'local':
+        options = {config.option_mapper:   get_task_options(config.option_mapper, options_mapper),
+                   config.option_reducer:  get_task_options(config.option_reducer, options_reducer),
+                   config.option_combiner: get_task_options(config.option_combiner, options_task)}
+        sys.stderr.write('EXECUTE LOCAL: %s %s\n' % (inputs, output))
+        return local.run(mapper, reducer, inputs, output, combiner, options, argv, processes,
+                         shuffle_memory, shuffle_compress, partitioner, reducers, sort_key)
+
+    if partitioner.name == partition.TotalOrderPartitioner.name:
+        import tempfile
+        partitioner.path = output + '_partitions'
+        with tempfile.NamedTemporaryFile() as file:
+            partition.write_partition_file(file, partitioner.boundaries)
+            file.flush()
+            dfs.put(file.name, partitioner.path)
+
+    options = ' '.join([parameter_dict_to_command(parameters), parameter_dict_to_command(options_task)])
+    options_reducer = ' '.join([parameter_dict_to_command(parameters), parameter_dict_to_command(options_reducer)])
+    options_mapper = ' '.join([parameter_dict_to_command(parameters), parameter_dict_to_command(options_mapper)])
+
+    # The tasks are started by the lean entry point of the task module, which
+    # imports the program as a module and finds the methods by name
+    pattern_command  = '\'python -m prince.task --%s %s %s\''
+    command_mapper   = pattern_command % (config.option_mapper, get_method_name(mapper, filename_program), options_mapper)
+    command_reducer  = pattern_command % (config.option_reducer, get_method_name(reducer, filename_program), options_reducer)
+    if combiner:
+        command_combiner = pattern_command % (config.option_combiner, get_method_name(combiner, filename_program), options)
+
+    options = {'path':         config.get_mapreduce_path(),
+               'mapreduce':    config.get_mapreduce_program(),
+               'streaming':    config.get_mapreduce_streaming(),
                'inputs':       ' -input '.join([''] + inputs),
                'output':       ' -output ' + output,
                'mapper':       '-mapper ' + command_mapper,
                'reducer':      '-reducer ' + command_reducer,
+               'combiner':     '-combiner ' + command_combiner if combiner else '',
                'files':        ' -file '.join([''] + quote_list(files)),
                'env':          '-cmdenv PYTHONPATH=./%s' % os.path.basename(path_package),
                'inputformat':  '-inputformat \'%s\'' % config.inputformats[inputformat],
-               'outputformat': '-outputformat \'%s\'' % config.outputformats[outputformat]
+               'outputformat': '-outputformat \'%s\'' % config.outputformats[outputformat],
+               'io':           '-io %s' % io if io != 'text' else '',
+               'partitioner':  partitioner.hadoop_options(),
+               'reducers':     '-numReduceTasks %d' % reducers if reducers else '',
+               'sort':         '-jobconf mapred.output.key.comparator.class=org.apache.hadoop.mapred.lib.KeyFieldBasedComparator'
+                               ' -jobconf \'map.output.key.field.separator=%s\''
+                               ' -jobconf \'mapred.text.key.comparator.options=%s\''
+                               % (config.key_field_separator, sort_options) if sort_options else ''
               }
 
-    commandline = '%(mapreduce)s jar %(path)s%(streaming)s %(inputs)s %(output)s %(mapper)s %(reducer)s %(files)s %(env)s %(inputformat)s %(outputformat)s'
+    commandline = '%(mapreduce)s jar %(path)s%(streaming)s %(inputs)s %(output)s %(mapper)s %(reducer)s %(combiner)s %(files)s %(env)s %(inputformat)s %(outputformat)s %(io)s %(partitioner)s %(reducers)s %(sort)s'
 
-    # TODO: Put this in a logger
-    print 'EXECUTE:'
-    print commandline % options
+    sys.stderr.write('EXECUTE:\n%s\n' % (commandline % options))
 
-    content = run_program(commandline, options)
+    try:
+        content = run_job(commandline, options)
+    finally:
+        # The tasks write the output, traces and skipped records on the DFS
+        dfs.invalidate()
     return content
 
@@ -0,0 +1,133 @@
+"""
+Prince profiling module.
+
+With the option '--profile <directory>' on the command line of a program, in
+the same way as '--trace', every mapper, reducer and combiner task of its
+jobs is run under cProfile, and the statistics of each task are written in
+the directory on the DFS, in a file named after the attempt of the task.
+The tasks of the local engine are not profiled.
+merge() then aggregates the statistics of all the tasks, so that the hot
+spots of a job can be found on its production data:
+
+    $ ./wordcount.py input output --profile /profiles/wordcount
+    >>> stats = prince.profile.merge('/profiles/wordcount')
+    >>> stats.sort_stats('cumulative').print_stats(20)
+"""
+__docformat__ = "restructuredtext en"
+
+## Copyright (c) 2010 Emmanuel Goossaert 
+##
+## This file is part of Prince, an extra-light Python module to run
+## MapReduce tasks in the Hadoop framework. MapReduce is a patented
+## software framework introduced by Google, and Hadoop is a registered
+## trademark of the Apache Software Foundation.
+##
+## Prince is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## Prince is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Prince.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+import dfs
+import job
+
+
+def strip_directory(stats, directory):
+    """
+    Make the paths of the functions of statistics relative to a directory.
+    Each task runs in its own working directory, in which Hadoop copies the
+    files of the job, so that the paths have to be relative for the
+    functions to be merged across tasks.
+
+    :Parameters:
+        stats : pstats.Stats
+            Statistics to change.
+        directory : string
+            Directory from which the paths are made relative.
+    """
+    prefix = directory.rstrip(os.sep) + os.sep
+    def strip(function):
+        (filename, line, name) = function
+        if filename.startswith(prefix):
+            filename = filename[len(prefix):]
+        return filename, line, name
+    stats.stats = dict((strip(function), (cc, nc, tt, ct, dict((strip(caller), value)
+                                                               for (caller, value) in callers.iteritems())))
+                       for (function, (cc, nc, tt, ct, callers)) in stats.stats.iteritems())
+
+
+def run(directory, tasktype, function, *args, **kwargs):
+    """
+    Call a function under cProfile, and write the statistics on the DFS,
+    even if the function fails.
+
+    :Parameters:
+        directory : string
+            Directory of the statistics on the DFS.
+        tasktype : string
+            Type of the task.
+        function : method
+            Function to call, with the other arguments.
+
+    :Return:
+        Return of the function.
+    """
+    import cProfile
+    import pstats
+    import tempfile
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args, **kwargs)
+    finally:
+        (handle, filename) = tempfile.mkstemp(suffix='.prof')
+        os.close(handle)
+        try:
+            stats = pstats.Stats(profiler)
+            strip_directory(stats, os.getcwd())
+            stats.dump_stats(filename)
+            dfs.put(filename, job.get_task_filename(directory, tasktype, '.prof'))
+        finally:
+            os.remove(filename)
+
+
+def merge(directory, filename=None):
+    """
+    Aggregate the statistics of all the tasks profiled in a directory.
+
+    :Parameters:
+        directory : string
+            Directory of the statistics on the DFS.
+        filename : string
+            Local file where to save the aggregated statistics, if any, to
+            be read later with pstats or a profile viewer.
+
+    :Return:
+        Statistics of all the tasks.
+
+    :ReturnType:
+        pstats.Stats
+    """
+    import pstats
+    import shutil
+    import tempfile
+    directory_local = tempfile.mkdtemp(prefix='prince-profile-')
+    try:
+        dfs.get(directory.rstrip('/') + '/*', directory_local)
+        filenames = [os.path.join(directory_local, name) for name in sorted(os.listdir(directory_local))]
+        if not filenames:
+            raise IOError('No statistics found in %s' % directory)
+        stats = pstats.Stats(*filenames)
+    finally:
+        shutil.rmtree(directory_local, ignore_errors=True)
+    if filename:
+        stats.dump_stats(filename)
+    return stats
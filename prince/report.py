@@ -0,0 +1,260 @@
+"""
+Counters and status of the tasks, reported to Hadoop streaming.
+
+A task reports to Hadoop streaming by writing lines
+'reporter:counter:<group>,<counter>,<amount>' and 'reporter:status:<message>'
+on its standard error. The Reporter sums the increments of the counters and
+keeps the last status, and writes them out at most once every
+config.report_interval seconds, so that a counter can be incremented in the
+inner loop of a task.
+"""
+__docformat__ = "restructuredtext en"
+
+## Copyright (c) 2010 Emmanuel Goossaert 
+##
+## This file is part of Prince, an extra-light Python module to run
+## MapReduce tasks in the Hadoop framework. MapReduce is a patented
+## software framework introduced by Google, and Hadoop is a registered
+## trademark of the Apache Software Foundation.
+##
+## Prince is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## Prince is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Prince.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+import sys
+import time
+
+import config
+
+
+class Reporter(object):
+    """
+    Batched reporter of the counters and status of a task.
+    """
+
+    def __init__(self, interval=None):
+        """
+        :Parameters:
+            interval : float
+                Minimum number of seconds between two reports. Default is
+                config.report_interval.
+        """
+        self.interval = config.report_interval if interval is None else interval
+        self.streaming = True   # if False, the reports are only totalled
+        self.counters = {}      # increments not reported yet
+        self.message = None     # status not reported yet
+        self.totals = {}        # total of the counters, by (group, counter)
+        self.deadline = 0       # time of the next report
+
+    def counter(self, group, name, inc=1):
+        """Increment a counter."""
+        key = (group, name)
+        counters = self.counters
+        counters[key] = counters.get(key, 0) + inc
+        if time.time() >= self.deadline:
+            self.flush()
+
+    def status(self, message):
+        """Set the status of the task."""
+        self.message = message
+        if time.time() >= self.deadline:
+            self.flush()
+
+    def flush(self):
+        """Report the counters and the status now."""
+        lines = []
+        totals = self.totals
+        for ((group, name), inc) in self.counters.iteritems():
+            totals[(group, name)] = totals.get((group, name), 0) + inc
+            # Commas separate the fields of the line
+            lines.append('reporter:counter:%s,%s,%d\n' % (group.replace(',', ' '),
+                                                          name.replace(',', ' '), inc))
+        if self.message is not None:
+            lines.append('reporter:status:%s\n' % ' '.join(str(self.message).splitlines()))
+        if self.streaming and lines:
+            sys.stderr.writelines(lines)
+            sys.stderr.flush()
+        self.counters.clear()
+        self.message = None
+        self.deadline = time.time() + self.interval
+
+    def pop_totals(self):
+        """
+        Report the counters, and take their totals since the last call.
+
+        :Return:
+            Totals of the counters.
+
+        :ReturnType:
+            Dictionary {(group, counter): total}
+        """
+        self.flush()
+        totals = self.totals
+        self.totals = {}
+        return totals
+
+
+reporter = Reporter()   # reporter of the current task
+
+
+def counter(group, name, inc=1):
+    """
+    Increment a counter of the job. The increments are summed by the task
+    and reported to Hadoop at regular intervals, and the final value of the
+    counters is returned by prince.run().
+
+    :Parameters:
+        group : string
+            Group of the counter.
+        name : string
+            Name of the counter.
+        inc : int
+            Increment of the counter, default is 1.
+    """
+    reporter.counter(group, name, inc)
+
+
+def status(message):
+    """
+    Set the status of the task, shown by Hadoop. Only the last status is
+    reported at each interval.
+
+    :Parameters:
+        message : string
+            Status of the task, on a single line.
+    """
+    reporter.status(message)
+
+
+def flush():
+    """Report the counters and the status of the task now."""
+    reporter.flush()
+
+
+def group_totals(totals):
+    """
+    Arrange totals of counters by group.
+
+    :Parameters:
+        totals : iterable of dictionaries {(group, counter): total}
+            Totals of the counters, for instance of each task.
+
+    :Return:
+        Sum of the totals, by group and counter.
+
+    :ReturnType:
+        Dictionary {group: {counter: total}}
+    """
+    counters = {}
+    for total in totals:
+        for ((group, name), value) in total.iteritems():
+            values = counters.setdefault(group, {})
+            values[name] = values.get(name, 0) + value
+    return counters
+
+
+def parse_counters(lines):
+    """
+    Parse the final counters of a job from the log of Hadoop, in which they
+    follow a line 'Counters: <number>', one group per line and one counter
+    per line '<counter>=<value>' below its group. The lines are either logged
+    by the same logger as this line or indented.
+
+    :Parameters:
+        lines : iterable of strings
+            Lines of the log of the job.
+
+    :Return:
+        Counters, by group and counter.
+
+    :ReturnType:
+        Dictionary {group: {counter: value}}
+    """
+    counters = {}
+    logger = None
+    values = None
+    for line in lines:
+        if 'Counters: ' in line:
+            # The lines of the counters are logged by the same logger, if any,
+            # or are only indented
+            words = line[:line.index('Counters: ')].split()
+            logger = words[-1] if words else ''
+            continue
+        if logger is None:
+            continue
+        if logger and logger in line:
+            line = line[line.index(logger) + len(logger):]
+        elif not line[:1].isspace():
+            logger = None
+            continue
+        (name, equal, value) = line.strip().rpartition('=')
+        if not equal:
+            values = counters.setdefault(value, {})
+        elif values is not None:
+            try:
+                values[name] = int(value)
+            except ValueError:
+                values[name] = value
+    return counters
+
+
+def parse_job_id(lines):
+    """
+    Parse the id of a job from the log of Hadoop, such as
+    'job_201001011200_0003' in the line 'Running job: job_201001011200_0003'.
+
+    :Parameters:
+        lines : iterable of strings
+            Lines of the log of the job.
+
+    :Return:
+        Id of the job, or None if it is not in the log.
+
+    :ReturnType:
+        String
+    """
+    pattern = re.compile(r'\b(job_\d+_\d+)\b')
+    for line in lines:
+        match = pattern.search(line)
+        if match:
+            return match.group(1)
+    return None
+
+
+class JobOutput(str):
+    """
+    Output of a Hadoop job, with the final values of its counters in the
+    attribute 'counters', as a dictionary {group: {counter: value}}, and the
+    id of the job in the attribute 'job'.
+    """
+
+    def __new__(cls, content, counters=None, job=None):
+        output = str.__new__(cls, content)
+        output.counters = counters or {}
+        output.job = job
+        return output
+
+
+class JobFiles(list):
+    """
+    Paths to the output files of a job run by the local engine, with the
+    final values of its counters in the attribute 'counters', as a
+    dictionary {group: {counter: value}}, and the statistics of the sorts
+    and merges of all its tasks in the attribute 'shuffle', as a
+    shuffle.ShuffleStats.
+    """
+
+    def __init__(self, filenames, counters=None, shuffle=None):
+        list.__init__(self, filenames)
+        self.counters = counters or {}
+        self.shuffle = shuffle
@@ -0,0 +1,335 @@
+"""
+Prince shuffle module.
+
+External merge sort of the intermediate data of the tasks run outside of
+Hadoop: lines are sorted in memory up to a budget, spilled to disk as sorted
+runs, and the runs are merged.
+"""
+__docformat__ = "restructuredtext en"
+
+## Copyright (c) 2010 Emmanuel Goossaert 
+##
+## This file is part of Prince, an extra-light Python module to run
+## MapReduce tasks in the Hadoop framework. MapReduce is a patented
+## software framework introduced by Google, and Hadoop is a registered
+## trademark of the Apache Software Foundation.
+##
+## Prince is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## Prince is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Prince.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import re
+import gzip
+import heapq
+import time
+import tempfile
+
+import config
+
+
+class ShuffleStats(object):
+    """Statistics of the sorts and merges of a task."""
+
+    def __init__(self):
+        self.lines = 0
+        self.bytes = 0
+        self.runs = 0
+        self.seconds = 0.0
+        self.peak_rss = 0
+
+    def add(self, other):
+        """Add the statistics of another task."""
+        self.lines += other.lines
+        self.bytes += other.bytes
+        self.runs += other.runs
+        self.seconds += other.seconds
+        self.peak_rss = max(self.peak_rss, other.peak_rss)
+
+    def update_peak_rss(self):
+        """Record the peak resident set size of the current process."""
+        import resource
+        # ru_maxrss is in kilobytes on Linux
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        self.peak_rss = max(self.peak_rss, rss)
+
+    def report(self):
+        """Return a one-line summary of the statistics."""
+        megabytes = self.bytes / (1024.0 * 1024.0)
+        throughput = megabytes / self.seconds if self.seconds else 0.0
+        return '%d lines, %.1f MB sorted, %d spill files, %.1f MB/s, peak RSS %.1f MB' % \
+               (self.lines, megabytes, self.runs, throughput, self.peak_rss / (1024.0 * 1024.0))
+
+
+class Reversed(object):
+    """Wrapper of a value reversing its order."""
+
+    __slots__ = ['value']
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __ne__(self, other):
+        return self.value != other.value
+
+
+class FieldKey(object):
+    """
+    Sort key of lines on fields of their keys, following the options of
+    Hadoop's KeyFieldBasedComparator. Each option '-k<start>[,<end>][n][r]'
+    compares the fields 'start' to 'end' of the keys, numerically with 'n'
+    and in reverse order with 'r', and the options '-n' and '-r' apply to
+    all of them. Lines of which all fields are equal are compared as strings.
+    """
+
+    def __init__(self, options, separator='\t', field_separator=None):
+        """
+        :Parameters:
+            options : string
+                Options of the comparator, such as '-k1,1 -k2,2nr'.
+            separator : string
+                Character or string used to split the key from the value.
+            field_separator : string
+                Separator of the fields of the keys. Default is
+                config.key_field_separator.
+        """
+        self.separator = separator
+        self.field_separator = field_separator or config.key_field_separator
+        self.specs = []
+        flags = ''
+        for option in options.split():
+            match = re.match(r'^-k(\d+)(?:,(\d+))?([nr]*)$', option)
+            if match:
+                (start, end, flags_spec) = match.groups()
+                self.specs.append([int(start) - 1, int(end) if end else None, flags_spec])
+            elif re.match(r'^-[nr]+$', option):
+                flags += option[1:]
+            else:
+                raise ValueError('Unsupported sort option: %s' % option)
+        if not self.specs:
+            self.specs.append([0, None, ''])
+        for spec in self.specs:
+            spec[2] = ('n' in spec[2] + flags, 'r' in spec[2] + flags)
+
+    def __call__(self, line):
+        index = line.find(self.separator)
+        key = line[:index] if index >= 0 else line.rstrip('\n')
+        fields = key.split(self.field_separator)
+        values = []
+        for (start, end, (numeric, reverse)) in self.specs:
+            value = self.field_separator.join(fields[start:end])
+            if numeric:
+                try:                value = float(value)
+                except ValueError:  value = 0.0
+            values.append(Reversed(value) if reverse else value)
+        values.append(line)
+        return values
+
+
+def decorate(lines, key):
+    """Generate tuples (key(line), line) from lines"""
+    for line in lines:
+        yield key(line), line
+
+
+def open_run(filename, mode='r', compress=False):
+    """
+    Open a file of sorted lines.
+
+    :Parameters:
+        filename : string
+            Path to the file.
+        mode : string
+            'r' to read or 'w' to write.
+        compress : boolean
+            If True, the file is compressed with gzip.
+
+    :Return:
+        File descriptor.
+    """
+    if compress:
+        return gzip.open(filename, mode + 'b', config.shuffle_compresslevel)
+    return open(filename, mode)
+
+
+def write_run(lines, directory, compress=False):
+    """
+    Write sorted lines to a new file.
+
+    :Parameters:
+        lines : list of strings
+            Sorted lines.
+        directory : string
+            Directory where to create the file.
+        compress : boolean
+            If True, the file is compressed with gzip.
+
+    :Return:
+        Path to the file.
+
+    :ReturnType:
+        String
+    """
+    (fd, filename) = tempfile.mkstemp(prefix='spill-', dir=directory)
+    os.close(fd)
+    file = open_run(filename, 'w', compress)
+    try:
+        file.writelines(lines)
+    finally:
+        file.close()
+    return filename
+
+
+def merge(runs, key=None):
+    """
+    Merge sorted iterables of lines.
+
+    :Parameters:
+        runs : list of iterables of strings
+            Sorted lines.
+        key : method
+            Sort key of the lines, if they are not sorted as strings.
+
+    :Return:
+        Sorted lines.
+
+    :ReturnType:
+        Iterator of strings.
+    """
+    if key == None:
+        return heapq.merge(*runs)
+    return (line for (value, line) in heapq.merge(*[decorate(run, key) for run in runs]))
+
+
+def read_runs(filenames, compress=False, remove=False, key=None, factor=None):
+    """
+    Merge files of sorted lines. At most 'factor' files are opened at once:
+    beyond that, groups of files are first merged into intermediate files,
+    written in the directory of the first file, until few enough are left.
+
+    :Parameters:
+        filenames : list of strings
+            Paths to the files.
+        compress : boolean
+            If True, the files are compressed with gzip.
+        remove : boolean
+            If True, the files are deleted once they have been merged.
+        key : method
+            Sort key of the lines, if they are not sorted as strings.
+        factor : int
+            Maximum number of files opened at once. Default is
+            config.shuffle_merge_factor.
+
+    :Return:
+        Sorted lines.
+
+    :ReturnType:
+        Generator of strings.
+    """
+    factor = max(2, factor or config.shuffle_merge_factor)
+    temporary = set(filenames) if remove else set()    # files to delete
+    files = []
+    try:
+        while len(filenames) > factor:
+            directory = os.path.dirname(filenames[0])
+            merged = []
+            for index in xrange(0, len(filenames), factor):
+                group = filenames[index:index + factor]
+                if len(group) > 1:
+                    run = write_run(read_runs(group, compress, False, key, factor), directory, compress)
+                    temporary.add(run)
+                    for filename in group:
+                        if filename in temporary:
+                            os.remove(filename)
+                            temporary.remove(filename)
+                    group = [run]
+                merged.extend(group)
+            filenames = merged
+        files = [open_run(filename, 'r', compress) for filename in filenames]
+        for line in merge(files, key):
+            yield line
+    finally:
+        for file in files:
+            file.close()
+        for filename in temporary:
+            os.remove(filename)
+
+
+def sort_lines(lines, directory=None, memory=None, compress=False, stats=None,
+               key=None):
+    """
+    Sort lines with a bounded amount of memory. Lines are sorted in memory
+    until their size reaches the budget, at which point they are spilled to
+    disk as a sorted run. The runs are merged at the end. As the separator
+    sorts before any printable character, sorting whole lines sorts them by
+    key first.
+
+    :Parameters:
+        lines : iterable of strings
+            Lines to sort.
+        directory : string
+            Directory of the spill files, default is the temporary directory.
+        memory : int
+            Approximate size in bytes of the lines kept in memory. Default
+            is config.shuffle_memory.
+        compress : boolean
+            If True, spill files are compressed with gzip.
+        stats : ShuffleStats
+            Statistics to update, if any. The time counted is the time spent
+            to read and sort the lines and to write the spill files.
+        key : method
+            Sort key of the lines, such as a FieldKey. Default is to sort
+            them as strings.
+
+    :Return:
+        Sorted lines.
+
+    :ReturnType:
+        Generator of strings.
+    """
+    memory = memory or config.shuffle_memory
+    start = time.time()
+    runs = []
+    buffer = []
+    size = nb_lines = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= memory:
+            buffer.sort(key=key)
+            runs.append(write_run(buffer, directory, compress))
+            nb_lines += len(buffer)
+            if stats: stats.bytes += size
+            buffer = []
+            size = 0
+    buffer.sort(key=key)
+    nb_lines += len(buffer)
+    if stats:
+        stats.bytes += size
+        stats.lines += nb_lines
+        stats.runs += len(runs)
+        stats.seconds += time.time() - start
+        stats.update_peak_rss()
+
+    if runs:
+        # The last run is kept in memory and merged with the spilled ones
+        merged = merge([iter(buffer), read_runs(runs, compress, True, key)], key)
+    else:
+        merged = iter(buffer)
+    for line in merged:
+        yield line
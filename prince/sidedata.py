@@ -0,0 +1,369 @@
+"""
+Prince side data module.
+
+Load the files shipped with the tasks through the 'files' argument of run()
+into compact structures: an adjacency index, a key index or a NumPy array.
+Each structure is built once from the text of the file, cached in a binary
+file on the local disk where all the tasks of the node can find it, and
+memory-mapped by the tasks, so that lookups do not parse any text.
+"""
+__docformat__ = "restructuredtext en"
+
+## Copyright (c) 2010 Emmanuel Goossaert 
+##
+## This file is part of Prince, an extra-light Python module to run
+## MapReduce tasks in the Hadoop framework. MapReduce is a patented
+## software framework introduced by Google, and Hadoop is a registered
+## trademark of the Apache Software Foundation.
+##
+## Prince is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## Prince is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Prince.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import mmap
+import struct
+
+import config
+
+
+# Structures already loaded by the current process
+loaded = {}
+
+
+def get_cache_directory():
+    """Return the directory of the cache files, creating it if needed."""
+    import tempfile
+    directory = config.sidedata_directory or os.path.join(tempfile.gettempdir(), 'prince-sidedata')
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            pass # created by another task in the meantime
+    return directory
+
+
+def get_cache_filename(kind, filename, options=''):
+    """
+    Return the path of the cache file of a structure built from a file. The
+    path depends on the real path, the size and the modification time of the
+    file, so that a file shipped with a job, which all the tasks of a node
+    share, is only built once per node, and that a file modified in place is
+    built again.
+
+    :Parameters:
+        kind : string
+            Kind of the structure.
+        filename : string
+            File from which the structure is built.
+        options : string
+            Options of the structure.
+
+    :Return:
+        Path of the cache file.
+
+    :ReturnType:
+        String
+    """
+    import hashlib
+    path = os.path.realpath(filename)
+    status = os.stat(path)
+    key = '%s:%s:%d:%d:%s' % (kind, path, status.st_size, int(status.st_mtime), options)
+    name = '%s-%s' % (kind, hashlib.md5(key).hexdigest())
+    return os.path.join(get_cache_directory(), name)
+
+
+def build_cache(filename_cache, build):
+    """
+    Build a cache file if it does not exist. The file is written under a
+    temporary name and renamed, so that tasks building it concurrently never
+    read a partial file.
+
+    :Parameters:
+        filename_cache : string
+            Path of the cache file.
+        build : method
+            Method writing the content of the cache to the file given as
+            parameter.
+    """
+    if os.path.exists(filename_cache):
+        return
+    import tempfile
+    (fd, filename_temp) = tempfile.mkstemp(dir=os.path.dirname(filename_cache))
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            build(file)
+        os.rename(filename_temp, filename_cache)
+    except:
+        os.remove(filename_temp)
+        raise
+
+
+def map_file(filename):
+    """Memory-map a file in read-only mode."""
+    with open(filename, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return ''
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def search(mm, start, count, value):
+    """
+    Search for a value in a sorted array of 64-bit integers of a memory map.
+
+    :Return:
+        Index of the value in the array, -1 if it is not found.
+
+    :ReturnType:
+        int
+    """
+    unpack = struct.unpack_from
+    (low, high) = (0, count)
+    while low < high:
+        middle = (low + high) // 2
+        if unpack('<q', mm, start + 8 * middle)[0] < value:
+            low = middle + 1
+        else:
+            high = middle
+    if low < count and unpack('<q', mm, start + 8 * low)[0] == value:
+        return low
+    return -1
+
+
+class Adjacency(object):
+    """
+    Adjacency lists of a graph, in compressed sparse row format: the sorted
+    ids of the nodes, the offsets of their adjacency lists, and the
+    concatenation of the adjacency lists.
+    """
+
+    header = struct.Struct('<4sqq')
+    magic = 'PADJ'
+
+    def __init__(self, filename_cache):
+        """
+        :Parameters:
+            filename_cache : string
+                Path of the cache file of the structure.
+        """
+        self.mm = map_file(filename_cache)
+        (magic, self.nb_nodes, self.nb_targets) = self.header.unpack_from(self.mm, 0)
+        self.start_nodes = self.header.size
+        self.start_offsets = self.start_nodes + 8 * self.nb_nodes
+        self.start_targets = self.start_offsets + 8 * (self.nb_nodes + 1)
+
+    @classmethod
+    def build(cls, filename, file):
+        """
+        Write the cache of the graph of a text file, each line of which is
+        the id of a node followed by the ids of its adjacent nodes, all ids
+        being integers separated by whitespaces.
+        """
+        graph = {}
+        with open(filename) as input:
+            for line in input:
+                ids = line.split()
+                if ids:
+                    graph.setdefault(int(ids[0]), []).extend([int(n) for n in ids[1:]])
+        nodes = sorted(graph)
+        offsets = [0]
+        for node in nodes:
+            offsets.append(offsets[-1] + len(graph[node]))
+        file.write(cls.header.pack(cls.magic, len(nodes), offsets[-1]))
+        file.write(struct.pack('<%dq' % len(nodes), *nodes))
+        file.write(struct.pack('<%dq' % len(offsets), *offsets))
+        for node in nodes:
+            file.write(struct.pack('<%dq' % len(graph[node]), *graph[node]))
+
+    def get(self, node, default=None):
+        """Return the adjacent nodes of a node, or 'default' if it is not found."""
+        index = search(self.mm, self.start_nodes, self.nb_nodes, node)
+        if index < 0:
+            return default
+        (start, end) = struct.unpack_from('<qq', self.mm, self.start_offsets + 8 * index)
+        return struct.unpack_from('<%dq' % (end - start), self.mm, self.start_targets + 8 * start)
+
+    def __getitem__(self, node):
+        adjacent = self.get(node)
+        if adjacent == None:
+            raise KeyError(node)
+        return adjacent
+
+    def __contains__(self, node):
+        return search(self.mm, self.start_nodes, self.nb_nodes, node) >= 0
+
+    def __len__(self):
+        return self.nb_nodes
+
+    def __iter__(self):
+        for index in xrange(self.nb_nodes):
+            yield struct.unpack_from('<q', self.mm, self.start_nodes + 8 * index)[0]
+
+
+class Index(object):
+    """
+    Index of the lines of a text file of (key, value) items: the offsets of
+    the lines sorted by key, the lines themselves being read from the
+    memory-mapped file.
+    """
+
+    header = struct.Struct('<4sq')
+    magic = 'PIDX'
+
+    def __init__(self, filename_cache, filename, separator='\t'):
+        """
+        :Parameters:
+            filename_cache : string
+                Path of the cache file of the structure.
+            filename : string
+                Indexed file.
+            separator : string
+                Character or string used to split the key from the value.
+        """
+        self.mm_index = map_file(filename_cache)
+        self.mm = map_file(filename)
+        self.separator = separator
+        (magic, self.nb_lines) = self.header.unpack_from(self.mm_index, 0)
+
+    @classmethod
+    def build(cls, filename, separator, file):
+        """Write the cache of the index of a text file of (key, value) items."""
+        items = []
+        offset = 0
+        with open(filename, 'rb') as input:
+            for line in input:
+                items.append((line.split(separator, 1)[0].rstrip('\r\n'), offset))
+                offset += len(line)
+        items.sort()
+        file.write(cls.header.pack(cls.magic, len(items)))
+        file.write(struct.pack('<%dq' % len(items), *[offset for (key, offset) in items]))
+
+    def read(self, index):
+        """Return the key and value of the line at a given rank in the index."""
+        offset = struct.unpack_from('<q', self.mm_index, self.header.size + 8 * index)[0]
+        end = self.mm.find('\n', offset)
+        if end < 0:
+            end = len(self.mm)
+        line = self.mm[offset:end].rstrip('\r')
+        (key, separator, value) = line.partition(self.separator)
+        return key, value
+
+    def get(self, key, default=None):
+        """Return the value of a key, or 'default' if it is not found."""
+        (low, high) = (0, self.nb_lines)
+        while low < high:
+            middle = (low + high) // 2
+            if self.read(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.nb_lines:
+            (key_found, value) = self.read(low)
+            if key_found == key:
+                return value
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value == None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) != None
+
+    def __len__(self):
+        return self.nb_lines
+
+
+def adjacency(filename):
+    """
+    Load the graph of a text file, each line of which is the id of a node
+    followed by the ids of its adjacent nodes, all ids being integers
+    separated by whitespaces.
+
+    :Parameters:
+        filename : string
+            Path of the file, such as the name of a file shipped with run().
+
+    :Return:
+        The graph, which gives the adjacent nodes of a node as a tuple of
+        integers with graph[node] or graph.get(node).
+
+    :ReturnType:
+        Adjacency
+
+    :Examples:
+        graph = prince.sidedata.adjacency(prince.get_parameters('graph'))
+        for node_adjacent in graph[node]:
+            ...
+    """
+    key = ('adjacency', filename)
+    if key not in loaded:
+        filename_cache = get_cache_filename('adjacency', filename)
+        build_cache(filename_cache, lambda file: Adjacency.build(filename, file))
+        loaded[key] = Adjacency(filename_cache)
+    return loaded[key]
+
+
+def index(filename, separator='\t'):
+    """
+    Load the index of a text file of (key, value) items, one per line.
+    Values are found with a binary search on the keys, and read from the
+    memory-mapped file. Keys are compared as strings, and for duplicated keys
+    only one of the values is found.
+
+    :Parameters:
+        filename : string
+            Path of the file, such as the name of a file shipped with run().
+        separator : string
+            Character or string used to split the key from the value.
+
+    :Return:
+        The index, which gives the value of a key as a string with
+        index[key] or index.get(key).
+
+    :ReturnType:
+        Index
+    """
+    key = ('index', filename, separator)
+    if key not in loaded:
+        filename_cache = get_cache_filename('index', filename, separator)
+        build_cache(filename_cache, lambda file: Index.build(filename, separator, file))
+        loaded[key] = Index(filename_cache, filename, separator)
+    return loaded[key]
+
+
+def array(filename, dtype='float64'):
+    """
+    Load a text file of numbers separated by whitespaces, with the same
+    number of columns on each line, into a NumPy array. NumPy is required.
+
+    :Parameters:
+        filename : string
+            Path of the file, such as the name of a file shipped with run().
+        dtype : string
+            NumPy type of the numbers.
+
+    :Return:
+        The array, with one row per line, memory-mapped in read-only mode.
+
+    :ReturnType:
+        numpy.ndarray
+    """
+    import numpy
+    key = ('array', filename, dtype)
+    if key not in loaded:
+        filename_cache = get_cache_filename('array', filename, dtype) + '.npy'
+        build_cache(filename_cache, lambda file: numpy.save(file, numpy.loadtxt(filename, dtype=dtype, ndmin=2)))
+        loaded[key] = numpy.load(filename_cache, mmap_mode='r')
+    return loaded[key]
@@ -0,0 +1,43 @@
+"""
+Prince task module.
+
+Lean entry point of the mapper, reducer and combiner tasks started by Hadoop
+streaming, used by run() as:
+
+    python -m prince.task --pmapper module:method [options]
+
+The module of the program is imported once, without running its main
+section, and the method is found by name, before the task reads its input.
+"""
+__docformat__ = "restructuredtext en"
+
+## Copyright (c) 2010 Emmanuel Goossaert 
+##
+## This file is part of Prince, an extra-light Python module to run
+## MapReduce tasks in the Hadoop framework. MapReduce is a patented
+## software framework introduced by Google, and Hadoop is a registered
+## trademark of the Apache Software Foundation.
+##
+## Prince is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## Prince is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Prince.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+
+import prince
+
+
+if __name__ == "__main__":
+    prince.init()
+    # init() exits once the task has run, so the method has not been found
+    (tasktype, taskname) = prince.get_task()
+    sys.exit('Method not found for the task: %s' % taskname)
@@ -0,0 +1,251 @@
+"""
+Prince typedbytes module.
+
+Reader and writer of the typedbytes binary format used by Hadoop streaming
+with the option "-io typedbytes".
+"""
+__docformat__ = "restructuredtext en"
+
+## Copyright (c) 2010 Emmanuel Goossaert 
+##
+## This file is part of Prince, an extra-light Python module to run
+## MapReduce tasks in the Hadoop framework. MapReduce is a patented
+## software framework introduced by Google, and Hadoop is a registered
+## trademark of the Apache Software Foundation.
+##
+## Prince is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## Prince is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Prince.  If not, see <http://www.gnu.org/licenses/>.
+
+import struct
+
+import config
+
+
+BYTES  = 0
+BYTE   = 1
+BOOL   = 2
+INT    = 3
+LONG   = 4
+FLOAT  = 5
+DOUBLE = 6
+STRING = 7
+VECTOR = 8
+LIST   = 9
+MAP    = 10
+MARKER = 255
+
+struct_int    = struct.Struct('>i')
+struct_long   = struct.Struct('>q')
+struct_float  = struct.Struct('>f')
+struct_double = struct.Struct('>d')
+struct_byte   = struct.Struct('>b')
+
+
+def encode(obj):
+    """
+    Encode a Python object in the typedbytes format.
+
+    :Parameters:
+        obj : str, unicode, bool, int, long, float, tuple, list or dict
+            Object to encode. Tuples are encoded as vectors, and lists as
+            lists.
+
+    :Return:
+        Encoded object.
+
+    :ReturnType:
+        String
+    """
+    cls = obj.__class__
+    if cls is str:
+        return '\x07' + struct_int.pack(len(obj)) + obj
+    elif cls is int or cls is long:
+        if -0x80000000 <= obj <= 0x7fffffff:
+            return '\x03' + struct_int.pack(obj)
+        return '\x04' + struct_long.pack(obj)
+    elif cls is float:
+        return '\x06' + struct_double.pack(obj)
+    elif cls is bool:
+        return '\x02' + ('\x01' if obj else '\x00')
+    elif cls is unicode:
+        obj = obj.encode('utf-8')
+        return '\x07' + struct_int.pack(len(obj)) + obj
+    elif cls is tuple:
+        return '\x08' + struct_int.pack(len(obj)) + ''.join([encode(item) for item in obj])
+    elif cls is list:
+        return '\x09' + ''.join([encode(item) for item in obj]) + '\xff'
+    elif cls is dict:
+        return '\x0a' + struct_int.pack(len(obj)) + \
+               ''.join([encode(k) + encode(v) for (k, v) in obj.iteritems()])
+    raise TypeError('Cannot encode %s in typedbytes' % cls.__name__)
+
+
+def read_object(file, code):
+    """
+    Read the object of a given type code from a file.
+
+    :Parameters:
+        file : file descriptor
+            File to read from, positioned just after the type code.
+        code : int
+            Type code of the object.
+
+    :Return:
+        Decoded object. The marker ending a list is returned as None.
+    """
+    read = file.read
+    if code == STRING or code == BYTES:
+        return read(struct_int.unpack(read(4))[0])
+    elif code == INT:
+        return struct_int.unpack(read(4))[0]
+    elif code == LONG:
+        return struct_long.unpack(read(8))[0]
+    elif code == DOUBLE:
+        return struct_double.unpack(read(8))[0]
+    elif code == FLOAT:
+        return struct_float.unpack(read(4))[0]
+    elif code == BOOL:
+        return read(1) != '\x00'
+    elif code == BYTE:
+        return struct_byte.unpack(read(1))[0]
+    elif code == VECTOR:
+        return tuple([read_object(file, ord(read(1))) for i in xrange(struct_int.unpack(read(4))[0])])
+    elif code == LIST:
+        items = []
+        while True:
+            code = ord(read(1))
+            if code == MARKER:
+                return items
+            items.append(read_object(file, code))
+    elif code == MAP:
+        items = {}
+        for i in xrange(struct_int.unpack(read(4))[0]):
+            key = read_object(file, ord(read(1)))
+            items[key] = read_object(file, ord(read(1)))
+        return items
+    elif code == MARKER:
+        return None
+    raise ValueError('Unknown typedbytes type code: %d' % code)
+
+
+def read(file):
+    """
+    Read one object from a file.
+
+    :Parameters:
+        file : file descriptor
+            File to read from.
+
+    :Return:
+        Decoded object.
+
+    :Exceptions:
+        EOFError
+            If the end of the file is reached.
+    """
+    code = file.read(1)
+    if not code:
+        raise EOFError
+    return read_object(file, ord(code))
+
+
+def read_pairs(file):
+    """
+    Create a generator of (key, value) items from a file.
+
+    :Parameters:
+        file : file descriptor
+            File to read from.
+
+    :Return:
+        Items read from the file.
+
+    :ReturnType:
+        Generator of two-item tuples.
+    """
+    read = file.read
+    while True:
+        code = read(1)
+        if not code:
+            return
+        key = read_object(file, ord(code))
+        yield (key, read_object(file, ord(read(1))))
+
+
+class TypedBytesWriter(object):
+    """
+    Buffered writer of (key, value) items in the typedbytes format, with the
+    same interface as job.OutputWriter.
+    """
+
+    def __init__(self, file, buffer_size=None):
+        """
+        :Parameters:
+            file : file descriptor
+                File to write to.
+            buffer_size : int
+                Number of items of the buffer. Default is
+                config.output_buffer_size.
+        """
+        self.file = file
+        self.buffer_size = buffer_size or config.output_buffer_size
+        self.buffer = []
+        self.count = 0      # number of items written
+        self.bytes = 0      # number of bytes written
+
+    def write_pairs(self, pairs, sequence=None):
+        """
+        Write items.
+
+        :Parameters:
+            pairs : iterable of two-item tuples
+                Items (key, value) to write.
+            sequence : int
+                If given, items with a None key are written with sequential
+                keys, starting at this number.
+
+        :Return:
+            Number of items written.
+
+        :ReturnType:
+            int
+        """
+        buffer = self.buffer
+        append = buffer.append
+        buffer_size = self.buffer_size
+        count = 0
+        for (key, value) in pairs:
+            if key is None and sequence is not None:
+                key = sequence + count
+            append(encode(key) + encode(value))
+            count += 1
+            if len(buffer) >= buffer_size:
+                self.flush()
+        self.count += count
+        return count
+
+    def write(self, key, value):
+        """Write a single item."""
+        self.write_pairs(((key, value),))
+
+    def flush(self):
+        """Write out the content of the buffer."""
+        content = ''.join(self.buffer)
+        self.bytes += len(content)
+        self.file.write(content)
+        del self.buffer[:]
+
+    def close(self):
+        """Write out the content of the buffer and flush the file."""
+        self.flush()
+        self.file.flush()
@@ -0,0 +1,81 @@
+"""
+Tests of the parameters passed to the tasks, decoded into prince.params:
+
+    $ python tests/test_parameters.py
+"""
+__docformat__ = "restructuredtext en"
+
+## Copyright (c) 2010 Emmanuel Goossaert
+##
+## This file is part of Prince, an extra-light Python module to run
+## MapReduce tasks in the Hadoop framework. MapReduce is a patented
+## software framework introduced by Google, and Hadoop is a registered
+## trademark of the Apache Software Foundation.
+##
+## Prince is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## Prince is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Prince.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prince
+from prince import config
+from prince import prince as api
+
+
+class ParametersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.argv_saved = sys.argv
+
+    def tearDown(self):
+        sys.argv = self.argv_saved
+        api.load_parameters()
+
+    def load(self, parameters):
+        """Load the parameters as the tasks receive them from run()"""
+        parameters = dict(parameters)
+        parameters[config.option_parameter_types] = api.get_parameter_types(parameters)
+        argv = ['task.py']
+        for (name, values) in parameters.items():
+            for value in (values if isinstance(values, list) else [values]):
+                argv.extend(['--' + name, api.encode_parameter(value)])
+        sys.argv = argv
+        api.load_parameters()
+
+    def test_types(self):
+        self.load({'count': 3, 'damping': 0.85, 'exact': True, 'name': 'pagerank'})
+        self.assertEqual(prince.params.count, 3)
+        self.assertEqual(prince.params.damping, 0.85)
+        self.assertEqual(prince.params.exact, True)
+        self.assertEqual(prince.params.name, 'pagerank')
+        self.assertEqual(prince.get_parameters('count'), '3')
+
+    def test_negative(self):
+        self.load({'shift': -1, 'scale': -0.5, 'large': -10 ** 20, 'offsets': [-2, 3]})
+        self.assertEqual(prince.params.shift, -1)
+        self.assertEqual(prince.params.scale, -0.5)
+        self.assertEqual(prince.params.large, -10 ** 20)
+        self.assertEqual(prince.params.offsets, [-2, 3])
+
+    def test_flag(self):
+        sys.argv = ['task.py', '--flag', '--name', 'value', '--other', '-x']
+        self.assertEqual(api.get_parameters_all(),
+                         {'flag': None, 'name': 'value', 'other': None})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+"""
+Tests of the WebHDFS client of the dfs module against the stand-in server
+of webhdfs_stub:
+
+    $ python tests/test_webhdfs.py
+"""
+__docformat__ = "restructuredtext en"
+
+## Copyright (c) 2010 Emmanuel Goossaert
+##
+## This file is part of Prince, an extra-light Python module to run
+## MapReduce tasks in the Hadoop framework. MapReduce is a patented
+## software framework introduced by Google, and Hadoop is a registered
+## trademark of the Apache Software Foundation.
+##
+## Prince is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## Prince is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Prince.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from prince import dfs
+from webhdfs_stub import WebHDFSStub
+
+
+class WebHDFSClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = WebHDFSStub()
+        self.client = dfs.WebHDFSClient(self.stub.address, 'prince')
+        self.client_saved = dfs.client
+        dfs.set_client(self.client)
+        dfs.invalidate()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        dfs.set_client(self.client_saved)
+        dfs.invalidate()
+        self.client.close()
+        self.stub.close()
+        shutil.rmtree(self.directory)
+
+    def test_write_read(self):
+        dfs.write('/data/pairs', ((i, i * i) for i in xrange(1000)))
+        content = ''.join('%d\t%d\n' % (i, i * i) for i in xrange(1000))
+        self.assertEqual(self.stub.fs.files['/data/pairs'], content)
+        self.assertEqual(dfs.read('/data/pairs'), content)
+        self.assertEqual(dfs.read('/data/pairs', first=2), '0\t0\n1\t1\n')
+        self.assertEqual(dfs.read('/data/pairs', last=1), '999\t998001\n')
+        self.assertEqual(list(dfs.iter_pairs('/data/pairs', first=2)), [('0', '0'), ('1', '1')])
+        # CREATE is sent to the NameNode without data, then to the DataNode
+        creates = [(server, path) for (method, server, operation, path) in self.stub.fs.requests
+                   if operation == 'CREATE']
+        self.assertEqual(creates, [('namenode', '/webhdfs/v1/data/pairs'),
+                                   ('datanode', '/webhdfs/v1/data/pairs')])
+
+    def test_write_existing(self):
+        dfs.write('/data/file', 'a')
+        self.assertRaises(IOError, dfs.write, '/data/file', 'b')
+        self.assertEqual(self.stub.fs.files['/data/file'], 'a\n')
+
+    def test_relative_path(self):
+        dfs.write('relative', 'a')
+        self.assertEqual(self.stub.fs.files['/user/prince/relative'], 'a\n')
+        self.assertEqual(dfs.read('relative'), 'a\n')
+
+    def test_put_get(self):
+        filename_local = os.path.join(self.directory, 'binary')
+        content = ''.join(chr(i % 256) for i in xrange(100000))
+        with open(filename_local, 'wb') as file:
+            file.write(content)
+        dfs.put(filename_local, '/data/binary')
+        self.assertEqual(self.stub.fs.files['/data/binary'], content)
+        os.remove(filename_local)
+        dfs.get('/data/binary', self.directory)
+        with open(filename_local, 'rb') as file:
+            self.assertEqual(file.read(), content)
+
+    def test_exists(self):
+        dfs.write('/data/part-00000', 'a')
+        self.assertTrue(dfs.exists('/data/part-00000'))
+        self.assertTrue(dfs.exists('/data'))
+        self.assertTrue(dfs.exists('/data/part-*'))
+        self.assertFalse(dfs.exists('/data/missing'))
+        self.assertFalse(dfs.exists('/missing/part-*'))
+        self.assertTrue(self.client.exists('/data/part-00000'))
+        self.assertFalse(self.client.exists('/data/missing'))
+
+    def test_glob(self):
+        for name in ['part-00001', 'part-00000', '_logs/history', 'other']:
+            dfs.write('/output/' + name, name)
+        self.assertEqual(dfs.expand('/output/part-*'), ['/output/part-00000', '/output/part-00001'])
+        self.assertEqual(self.client.expand('/out*/part-*'), ['/output/part-00000', '/output/part-00001'])
+        self.assertEqual(dfs.read('/output/part-*'), 'part-00000\npart-00001\n')
+        with dfs.open('/output/part-*') as file:
+            self.assertEqual(list(file), ['part-00000\n', 'part-00001\n'])
+        self.assertEqual(list(dfs.read_many('/output/part-*')),
+                         [('/output/part-00000', 'part-00000\n'), ('/output/part-00001', 'part-00001\n')])
+
+    def test_stat(self):
+        dfs.write('/data/file', 'abc')
+        status = dfs.stat('/data/file')
+        self.assertEqual((status.path, status.type, status.size), ('/data/file', 'file', 4))
+        self.assertTrue(dfs.stat('/data').isdir())
+        self.assertEqual([s.path for s in dfs.listdir('/data')], ['/data/file'])
+        self.assertRaises(IOError, dfs.stat, '/data/missing')
+
+    def test_missing(self):
+        self.assertRaises(IOError, self.client.read, ['/missing'])
+        # As with 'dfs -cat', the lines read before a missing file are returned
+        dfs.write('/data/file', 'a')
+        self.assertEqual(dfs.read('/missing'), '')
+        self.assertEqual(dfs.read('/missing', first=1), '')
+        self.assertEqual(dfs.read(['/data/file', '/missing'], first=2), 'a\n')
+        self.assertEqual(dfs.read(['/data/file', '/missing'], last=2), 'a\n')
+        try:
+            self.client.call('GET', '/missing', 'GETFILESTATUS')
+        except IOError, error:
+            self.assertEqual(error.errno, 404)
+            self.assertTrue('FileNotFoundException' in error.strerror)
+
+    def test_delete(self):
+        dfs.write('/data/a/file', 'a')
+        self.assertRaises(IOError, self.client.call, 'DELETE', '/data', 'DELETE')
+        self.assertEqual(json.loads(self.client.call('DELETE', '/data', 'DELETE', recursive='true')),
+                         {'boolean': True})
+        dfs.invalidate('/data')
+        self.assertFalse(dfs.exists('/data/a/file'))
+
+    def test_keep_alive(self):
+        dfs.write('/data/file', 'a')
+        for i in xrange(10):
+            self.assertTrue(self.client.exists('/data/file'))
+        # A connection to the NameNode and one to the DataNode are kept
+        self.assertEqual(sorted(len(connections) for connections in self.client.idle.values()), [1, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,237 @@
+"""
+Stand-in WebHDFS server for the tests of the WebHDFS client.
+
+A NameNode and a DataNode are served over HTTP/1.1 on local ports, in
+threads, with the files kept in memory. The NameNode answers the metadata
+operations and redirects OPEN and CREATE to the DataNode, in two steps as
+Hadoop does, so that the redirections and the pool of connections of the
+client are exercised.
+"""
+__docformat__ = "restructuredtext en"
+
+## Copyright (c) 2010 Emmanuel Goossaert
+##
+## This file is part of Prince, an extra-light Python module to run
+## MapReduce tasks in the Hadoop framework. MapReduce is a patented
+## software framework introduced by Google, and Hadoop is a registered
+## trademark of the Apache Software Foundation.
+##
+## Prince is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## Prince is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Prince.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import time
+import urllib
+import urlparse
+import posixpath
+import threading
+import SocketServer
+import BaseHTTPServer
+
+PREFIX = '/webhdfs/v1'
+
+
+class FileSystem(object):
+    """In-memory tree of files, shared by the NameNode and the DataNode."""
+
+    def __init__(self):
+        self.files = {}                 # content by path
+        self.directories = set(['/'])
+        self.mtimes = {'/': time.time()}
+        self.lock = threading.Lock()
+        self.requests = []              # (method, server, operation, path)
+
+    def status(self, path, suffix):
+        """Return the FileStatus object of a path, as WebHDFS does."""
+        directory = path in self.directories
+        return {'pathSuffix': suffix,
+                'type': 'DIRECTORY' if directory else 'FILE',
+                'length': 0 if directory else len(self.files[path]),
+                'modificationTime': int(self.mtimes[path] * 1000)}
+
+    def create(self, path, content):
+        """Create a file and its parent directories."""
+        with self.lock:
+            parent = posixpath.dirname(path)
+            while parent not in self.directories:
+                self.directories.add(parent)
+                self.mtimes[parent] = time.time()
+                parent = posixpath.dirname(parent)
+            self.files[path] = content
+            self.mtimes[path] = time.time()
+
+    def delete(self, path, recursive):
+        """Delete a path, returning False if it does not exist."""
+        with self.lock:
+            if path in self.files:
+                del self.files[path]
+                return True
+            if path not in self.directories or path == '/':
+                return False
+            children = [p for p in list(self.files) + list(self.directories)
+                        if p.startswith(path + '/')]
+            if children and not recursive:
+                raise ValueError('Directory is not empty: %s' % path)
+            for child in children:
+                self.files.pop(child, None)
+                self.directories.discard(child)
+            self.directories.discard(path)
+            return True
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Handler of the requests of the NameNode and of the DataNode."""
+
+    protocol_version = 'HTTP/1.1'   # connections are kept alive
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body='', headers=None, type='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', type)
+        self.send_header('Content-Length', str(len(body)))
+        for (name, value) in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def error(self, status, exception, message):
+        self.reply(status, json.dumps({'RemoteException': {'exception': exception,
+                                                           'message': message}}))
+
+    def read_body(self):
+        """Read the body of the request, chunked or not."""
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(';')[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return ''.join(chunks)
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def handle_request(self, method):
+        url = urlparse.urlsplit(self.path)
+        parameters = dict(urlparse.parse_qsl(url.query))
+        operation = parameters.get('op', '')
+        fs = self.server.fs
+        fs.requests.append((method, self.server.role, operation, url.path))
+        if not url.path.startswith(PREFIX):
+            return self.error(404, 'FileNotFoundException', 'Unknown URL: %s' % url.path)
+        path = posixpath.normpath(urllib.unquote(url.path[len(PREFIX):]) or '/')
+        body = self.read_body() if method == 'PUT' else ''
+        exists = path in fs.files or path in fs.directories
+
+        if self.server.role == 'datanode':
+            if method == 'GET' and operation == 'OPEN':
+                if path not in fs.files:
+                    return self.error(404, 'FileNotFoundException', 'File does not exist: %s' % path)
+                return self.reply(200, fs.files[path], type='application/octet-stream')
+            if method == 'PUT' and operation == 'CREATE':
+                fs.create(path, body)
+                return self.reply(201, headers={'Location': 'webhdfs://%s%s' % (self.server.namenode, path)})
+            return self.error(400, 'IllegalArgumentException', 'Invalid operation: %s' % operation)
+
+        redirect = 'http://%s%s' % (self.server.datanode, self.path)
+        if method == 'GET' and operation == 'OPEN':
+            if path not in fs.files:
+                return self.error(404, 'FileNotFoundException', 'File does not exist: %s' % path)
+            return self.reply(307, headers={'Location': redirect})
+        if method == 'PUT' and operation == 'CREATE':
+            if exists and parameters.get('overwrite', 'false') != 'true':
+                return self.error(403, 'FileAlreadyExistsException', '%s already exists' % path)
+            # The data is only sent to the DataNode, the body is ignored
+            return self.reply(307, headers={'Location': redirect})
+        if method == 'GET' and operation == 'GETFILESTATUS':
+            if not exists:
+                return self.error(404, 'FileNotFoundException', 'File does not exist: %s' % path)
+            return self.reply(200, json.dumps({'FileStatus': fs.status(path, '')}))
+        if method == 'GET' and operation == 'LISTSTATUS':
+            if not exists:
+                return self.error(404, 'FileNotFoundException', 'File does not exist: %s' % path)
+            if path in fs.files:
+                statuses = [fs.status(path, '')]
+            else:
+                children = sorted(p for p in list(fs.files) + list(fs.directories)
+                                  if p != path and posixpath.dirname(p) == path)
+                statuses = [fs.status(p, posixpath.basename(p)) for p in children]
+            return self.reply(200, json.dumps({'FileStatuses': {'FileStatus': statuses}}))
+        if method == 'DELETE' and operation == 'DELETE':
+            try:
+                deleted = fs.delete(path, parameters.get('recursive', 'false') == 'true')
+            except ValueError, error:
+                return self.error(403, 'PathIsNotEmptyDirectoryException', str(error))
+            return self.reply(200, json.dumps({'boolean': deleted}))
+        return self.error(400, 'IllegalArgumentException', 'Invalid operation: %s' % operation)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class WebHDFSStub(object):
+    """
+    NameNode and DataNode serving the same in-memory file system.
+
+    :Examples:
+        stub = WebHDFSStub()
+        client = dfs.WebHDFSClient(stub.address, 'prince')
+        ...
+        stub.close()
+    """
+
+    def __init__(self):
+        self.fs = FileSystem()
+        self.servers = []
+        for role in ['namenode', 'datanode']:
+            server = Server(('127.0.0.1', 0), Handler)
+            server.role = role
+            server.fs = self.fs
+            self.servers.append(server)
+        addresses = ['%s:%d' % server.server_address for server in self.servers]
+        for server in self.servers:
+            (server.namenode, server.datanode) = addresses
+        self.address = addresses[0]
+        self.threads = [threading.Thread(target=server.serve_forever) for server in self.servers]
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def close(self):
+        """Stop the servers."""
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    stub = WebHDFSStub()
+    print 'WebHDFS stub listening on %s, interrupt to stop' % stub.address
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stub.close()